@@ -0,0 +1,93 @@
+"""
+監視カテゴリのレジストリ（categoriesテーブル）
+初回起動時に scraper.CATEGORIES を登録し、以後はDBが正となる
+読み出しはプロセス内でCATEGORY_RELOAD秒キャッシュするので、APIでの追加・変更は
+別プロセスのワーカーにもその時間内に反映される（再起動不要）
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import update
+from database import SessionLocal
+from models import Category
+from scraper import CATEGORIES as DEFAULT_CATEGORIES
+
+CATEGORY_RELOAD = float(os.getenv("CATEGORY_RELOAD", "30"))
+FIELDS = ["key", "name", "url", "scan_interval", "max_pages", "priority", "enabled", "last_scanned_at"]
+
+_lock = threading.Lock()
+_cache = {"items": None, "expires": 0.0}
+
+
+def seed_defaults(db):
+    """テーブルが空なら既定カテゴリを登録（削除した既定カテゴリは復活させない）"""
+    if db.query(Category.key).first() is not None:
+        return
+    for i, (key, cat) in enumerate(DEFAULT_CATEGORIES.items()):
+        db.add(Category(key=key, name=cat["name"], url=cat["url"], priority=len(DEFAULT_CATEGORIES) - i))
+    db.commit()
+    print(f"Categories: seeded {len(DEFAULT_CATEGORIES)} defaults")
+
+
+def all_categories() -> List[Dict]:
+    """全カテゴリ（無効含む、優先度の高い順）"""
+    with _lock:
+        if _cache["items"] is None or _cache["expires"] <= time.monotonic():
+            _cache["items"] = _load()
+            _cache["expires"] = time.monotonic() + CATEGORY_RELOAD
+        return _cache["items"]
+
+
+def enabled() -> List[Dict]:
+    return [c for c in all_categories() if c["enabled"]]
+
+
+def get(key: str) -> Optional[Dict]:
+    for c in all_categories():
+        if c["key"] == key:
+            return c
+    return None
+
+
+def name_of(key: Optional[str]) -> str:
+    cat = get(key or "hobby")
+    return cat["name"] if cat else "不明"
+
+
+def mark_scanned(db, key: str, when: datetime):
+    """スキャン時刻を記録（commitは呼び出し側）"""
+    db.execute(update(Category).where(Category.key == key).values(last_scanned_at=when))
+
+
+def save_high_water(db, key: str, high_water: int, resume: Optional[Dict] = None):
+    """
+    新着スキャンの打ち切り位置と、読み切れなかったときの続きの位置（無ければNone）を記録
+    （commitは呼び出し側。取り込みと同じトランザクションで）
+    """
+    db.execute(update(Category).where(Category.key == key).values(
+        high_water=high_water,
+        resume_page=resume["page"] if resume else None,
+        resume_top=resume["top"] if resume else None,
+    ))
+
+
+def invalidate():
+    """次回の読み出しでDBから読み直させる"""
+    with _lock:
+        _cache["expires"] = 0.0
+
+
+def to_dict(row: Category) -> Dict:
+    return {name: getattr(row, name) for name in FIELDS}
+
+
+def _load() -> List[Dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(Category).order_by(Category.priority.desc(), Category.key).all()
+        return [to_dict(row) for row in rows]
+    finally:
+        db.close()
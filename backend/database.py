@@ -2,30 +2,206 @@
 データベース接続設定 - SQLite
 """
 import os
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text, inspect, insert, select
+from sqlalchemy.schema import CreateIndex, CreateTable
 from sqlalchemy.orm import sessionmaker
 from models import Base
+import metrics
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./fast_seller.db")
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+metrics.instrument_engine(engine)
+
+
+# 既存DBに後から追加したカラム: (テーブル名, カラム名, 追加のDDL句)
+_ADDED_COLUMNS = [
+    ("products", "category", "DEFAULT 'hobby'"),
+    ("products", "next_check_at", ""),
+    ("products", "price_yen", ""),
+    ("products", "shard", ""),
+    ("categories", "high_water", ""),
+    ("categories", "resume_page", ""),
+    ("categories", "resume_top", ""),
+]
+BACKFILL_CHUNK = 1000
 
 
 def init_db():
     """データベースの初期化（テーブル作成 + マイグレーション）"""
     Base.metadata.create_all(bind=engine)
-    # categoryカラムが無い既存DBへのマイグレーション
-    insp = inspect(engine)
-    if "products" in insp.get_table_names():
-        columns = [c["name"] for c in insp.get_columns("products")]
-        if "category" not in columns:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE products ADD COLUMN category VARCHAR(50) DEFAULT 'hobby'"))
-            print("Migration: added category column")
+    added = _migrate_columns()
+    _migrate_products_autoincrement()
+    _migrate_indexes()
+    if "price_yen" in added:
+        from scraper import parse_price_yen
+        _backfill_column("price_yen", "price", parse_price_yen)
+    # shard は追加時だけでなく毎回、NULLの行を埋める（途中で止まったバックフィル・導入前のプロセスが書いた行）
+    from shards import shard_of
+    _backfill_column("shard", "product_id", shard_of, only_null=True)
+    _seed_categories()
+    _build_keyword_terms()
     print("Database initialized")
 
 
+def _migrate_columns() -> set:
+    """モデルにあってテーブルに無いカラムを追加し、追加したカラム名を返す"""
+    added = set()
+    insp = inspect(engine)
+    tables = insp.get_table_names()
+    for table_name, column_name, extra in _ADDED_COLUMNS:
+        if table_name not in tables:
+            continue
+        columns = [c["name"] for c in insp.get_columns(table_name)]
+        if column_name in columns:
+            continue
+        column = Base.metadata.tables[table_name].c[column_name]
+        col_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {col_type} {extra}".strip()))
+        added.add(column_name)
+        print(f"Migration: added {column_name} column")
+    return added
+
+
+def _migrate_products_autoincrement():
+    """
+    SQLiteの既存 products を AUTOINCREMENT 付きで作り直す（導入前のDBは最大idが消えると再利用する）
+    採番は products_archive の最大idより後から始める。全体を1トランザクションで行い、
+    同時に起動した別プロセスはロックを待ってから作り直し済みかを見る
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    from models import Product
+
+    table = Product.__table__
+    columns = ", ".join(c.name for c in table.columns)
+    raw = engine.raw_connection()
+    conn = raw.driver_connection
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # BEGIN / COMMIT を自分で出す（DDLも同じトランザクションに入れる）
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'products'").fetchone()
+            if ddl is None or "AUTOINCREMENT" in ddl[0].upper():
+                conn.execute("COMMIT")
+                return
+            indexes = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'products' AND sql IS NOT NULL"
+            ).fetchall()
+            for (name,) in indexes:
+                conn.execute(f'DROP INDEX "{name}"')
+            conn.execute("ALTER TABLE products RENAME TO products_old")
+            conn.execute(str(CreateTable(table).compile(dialect=engine.dialect)))
+            for index in table.indexes:
+                conn.execute(str(CreateIndex(index).compile(dialect=engine.dialect)))
+            conn.execute(f"INSERT INTO products ({columns}) SELECT {columns} FROM products_old")
+            conn.execute("DROP TABLE products_old")
+            # INSERTで sqlite_sequence は products の最大idになっている。アーカイブ済みのidも避ける
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'products'")
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT 'products', MAX(COALESCE(MAX(p.id), 0), "
+                "COALESCE((SELECT MAX(id) FROM products_archive), 0)) FROM products p"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = isolation_level
+        raw.close()
+    print("Migration: rebuilt products with AUTOINCREMENT")
+
+
+def _migrate_indexes():
+    """既存テーブルに後から定義したインデックスを作成"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _backfill_column(column: str, source: str, compute, only_null: bool = False):
+    """
+    既存行の source カラムから compute() で column を埋める（id順にBACKFILL_CHUNK件ずつ）
+    only_null=True なら column が NULL の行だけ（compute() が None を返さない列に使う）
+    """
+    filled = 0
+    last_id = 0
+    null_only = f" AND {column} IS NULL" if only_null else ""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                f"SELECT id, {source} FROM products WHERE id > :last_id{null_only} ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BACKFILL_CHUNK}).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            params = []
+            for row_id, value in rows:
+                computed = compute(value)
+                if computed is not None:
+                    params.append({"id": row_id, "value": computed})
+            if params:
+                conn.execute(text(f"UPDATE products SET {column} = :value WHERE id = :id"), params)
+                filled += len(params)
+    if filled or not only_null:
+        print(f"Migration: backfilled {column} for {filled} rows")
+
+
+def _seed_categories():
+    from categories import seed_defaults
+
+    db = SessionLocal()
+    try:
+        seed_defaults(db)
+    finally:
+        db.close()
+
+
+def _build_keyword_terms():
+    """語の統計が空で商品がある（導入前のDB）なら、products とアーカイブから作る"""
+    from models import KeywordTerm, Product, ProductArchive
+    from keyword_engine import rebuild
+
+    db = SessionLocal()
+    try:
+        if db.query(KeywordTerm.term).first() is not None or db.query(Product.id).first() is None:
+            return
+        count = 0
+
+        def rows():
+            # 全件をリストにせず BACKFILL_CHUNK 件ずつ読む（語の集計だけをメモリに持つ）
+            nonlocal count
+            for table in (Product, ProductArchive):
+                stmt = select(table.name, table.minutes_to_sell).where(table.status != "removed")
+                for row in db.execute(stmt.execution_options(yield_per=BACKFILL_CHUNK)):
+                    count += 1
+                    yield row
+
+        terms = rebuild(db, rows())
+        db.commit()
+        print(f"Migration: built {terms} keyword terms from {count} products")
+    finally:
+        db.close()
+
+
+def insert_ignoring_duplicates(db, model, index_elements):
+    """
+    一意キー重複を無視するINSERT文（確認後に別プロセスが同じ行を入れても失敗しない）
+    SQLite/PostgreSQLはネイティブの ON CONFLICT DO NOTHING を使う
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(model)
+    return dialect_insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
 def get_db():
     """データベースセッションを取得"""
     db = SessionLocal()
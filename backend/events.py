@@ -0,0 +1,102 @@
+"""
+ダッシュボードへのプッシュ配信（Server-Sent Events）
+ワーカーのスレッドから publish() し、/api/events を購読中の各タブへ配信する
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import categories
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBroker:
+    """購読者ごとのasyncio.Queueへイベントを配る（publishはどのスレッドからでも可）"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._last_stats: Optional[Dict] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """購読開始（イベントループ内で呼ぶ）"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def has_subscribers(self) -> bool:
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, event: str, data: Dict):
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # ループが既に閉じている（切断済み）
+                self.unsubscribe(queue)
+
+    def publish_stats(self, stats: Dict):
+        """前回配信した統計から変わった項目だけを配信"""
+        with self._lock:
+            last = self._last_stats or {}
+            delta = {k: v for k, v in stats.items() if last.get(k) != v}
+            self._last_stats = dict(stats)
+        if delta:
+            self.publish("stats", delta)
+
+
+def _offer(queue: asyncio.Queue, message: str):
+    """キューが一杯なら古いものを捨てて入れる（遅いクライアントで詰まらせない）"""
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(message)
+
+
+broker = EventBroker()
+
+
+def fast_seller_event(row, minutes_to_sell: int, sold_at: datetime) -> Dict:
+    """/api/fast-sellers と同じ形の即売れ商品dict"""
+    category = row.category or "hobby"
+    return {
+        "id": row.id,
+        "product_id": row.product_id,
+        "name": row.name,
+        "price": row.price or "",
+        "price_yen": row.price_yen,
+        "url": row.url,
+        "image_url": row.image_url or "",
+        "category": category,
+        "category_name": categories.name_of(category),
+        "minutes_to_sell": minutes_to_sell,
+        "sold_at": sold_at.isoformat(),
+    }
+
+
+def keyword_event(kw) -> Dict:
+    """/api/keywords と同じ形のキーワードdict"""
+    return {
+        "id": kw.id,
+        "keyword": kw.keyword,
+        "exclude": kw.exclude or "",
+        "selected": kw.selected,
+        "source_product_name": kw.source_product_name or "手動追加",
+        "source_price": kw.source_price or "",
+        "minutes_to_sell": kw.minutes_to_sell,
+        "created_at": (kw.created_at or datetime.now()).isoformat(),
+    }
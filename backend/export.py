@@ -0,0 +1,190 @@
+"""
+エクスポート（キーワード・即売れ商品・商品履歴）
+並び順のキーでEXPORT_CHUNK件ずつキーセットページングし、CSV / NDJSON を逐次生成する（gzip圧縮も逐次）
+ページごとに短いセッションで読んで閉じるので、ダウンロード中に読み取りトランザクションを持ち続けない
+（SQLiteで遅いクライアントがチェックポイントや書き込みを止めない）。件数に関係なくメモリ使用量は一定
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, or_, select
+from database import SessionLocal
+from models import Product, ProductArchive, Keyword
+
+EXPORT_CHUNK = 1000
+FORMATS = ("csv", "ndjson")
+
+KEYWORD_EXPORT_COLUMNS = [
+    Keyword.id, Keyword.keyword, Keyword.exclude, Keyword.selected, Keyword.source_product_name,
+    Keyword.source_price, Keyword.minutes_to_sell, Keyword.created_at,
+]
+PRODUCT_EXPORT_COLUMNS = [
+    Product.id, Product.product_id, Product.name, Product.price, Product.price_yen, Product.url,
+    Product.image_url, Product.category, Product.status, Product.created_at, Product.sold_at,
+    Product.minutes_to_sell,
+]
+
+
+def keywords_query(selected: Optional[bool] = None, columns=None):
+    stmt = _keyset(select(*(columns or KEYWORD_EXPORT_COLUMNS)), Keyword.id)
+    if selected is not None:
+        stmt = stmt.where(Keyword.selected == selected)
+    return stmt
+
+
+def fast_sellers_query(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       category: Optional[str] = None, max_minutes: Optional[int] = None):
+    stmt = select(*PRODUCT_EXPORT_COLUMNS).where(
+        Product.status == "sold",
+        Product.minutes_to_sell != None,
+    )
+    stmt = _keyset(stmt, Product.sold_at, Product.id)
+    if since:
+        stmt = stmt.where(Product.sold_at >= since)
+    if until:
+        stmt = stmt.where(Product.sold_at < until)
+    if category:
+        stmt = stmt.where(Product.category == category)
+    if max_minutes is not None:
+        stmt = stmt.where(Product.minutes_to_sell <= max_minutes)
+    return stmt
+
+
+def products_query(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   category: Optional[str] = None, status: Optional[str] = None):
+    stmt = _keyset(select(*PRODUCT_EXPORT_COLUMNS), Product.id)
+    if since:
+        stmt = stmt.where(Product.created_at >= since)
+    if until:
+        stmt = stmt.where(Product.created_at < until)
+    if category:
+        stmt = stmt.where(Product.category == category)
+    if status:
+        stmt = stmt.where(Product.status == status)
+    return stmt
+
+
+ARCHIVE_EXPORT_COLUMNS = [
+    ProductArchive.id, ProductArchive.product_id, ProductArchive.name, ProductArchive.price,
+    ProductArchive.price_yen, ProductArchive.url, ProductArchive.image_url, ProductArchive.category,
+    ProductArchive.status, ProductArchive.created_at, ProductArchive.sold_at, ProductArchive.minutes_to_sell,
+    ProductArchive.archived_at,
+]
+
+
+def archive_query(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  category: Optional[str] = None, status: Optional[str] = None):
+    """アーカイブ済み商品（since/untilはarchived_at）"""
+    stmt = _keyset(select(*ARCHIVE_EXPORT_COLUMNS), ProductArchive.id)
+    if since:
+        stmt = stmt.where(ProductArchive.archived_at >= since)
+    if until:
+        stmt = stmt.where(ProductArchive.archived_at < until)
+    if category:
+        stmt = stmt.where(ProductArchive.category == category)
+    if status:
+        stmt = stmt.where(ProductArchive.status == status)
+    return stmt
+
+
+def stream(stmt, fmt: str = "csv", compress: bool = False) -> Iterator[bytes]:
+    """クエリ結果を指定形式のバイト列として逐次返す"""
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    chunks = encode(list(stmt.selected_columns.keys()), _iter_chunks(stmt))
+    data = (chunk.encode("utf-8") for chunk in chunks)
+    return _gzip(data) if compress else data
+
+
+def media_type(fmt: str, compress: bool) -> str:
+    if compress:
+        return "application/gzip"
+    return "text/csv" if fmt == "csv" else "application/x-ndjson"
+
+
+def filename(name: str, fmt: str, compress: bool) -> str:
+    return f"{name}.{fmt}" + (".gz" if compress else "")
+
+
+def _keyset(stmt, *keys):
+    """並び順のキー（一意になる組）を付ける。_iter_chunks はこのキーでページングする"""
+    return stmt.order_by(*keys).execution_options(export_keyset=keys)
+
+
+def _after(keys, values):
+    """(k1, k2, ...) > (v1, v2, ...) をOR/ANDに展開した条件"""
+    key, value = keys[0], values[0]
+    if len(keys) == 1:
+        return key > value
+    return or_(key > value, and_(key == value, _after(keys[1:], values[1:])))
+
+
+def _iter_chunks(stmt) -> Iterator[List]:
+    """
+    キーセットページングでEXPORT_CHUNK件ずつ行を読む
+    ページごとにセッションを開いて閉じ、yield する時点ではトランザクションを持っていない
+    キーが出力列に無ければ末尾に足して読み、出力からは外す
+    """
+    keys = stmt.get_execution_options()["export_keyset"]
+    width = len(stmt.selected_columns)
+    page = stmt.add_columns(*keys).limit(EXPORT_CHUNK)
+    last = None
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.execute(page if last is None else page.where(_after(keys, last))).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield [row[:width] for row in rows]
+        if len(rows) < EXPORT_CHUNK:
+            return
+        last = tuple(rows[-1][width:])
+
+
+def _encode_csv(header: List[str], chunks: Iterable[List]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for rows in chunks:
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _encode_ndjson(header: List[str], chunks: Iterable[List]) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(header, row)), ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        )
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"not serializable: {type(value)}")
+
+
+def _gzip(data: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzipヘッダ付き
+    for chunk in data:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
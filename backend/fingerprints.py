@@ -0,0 +1,105 @@
+"""
+一覧ページと商品の変更検出
+- ページ: script/style/コメント等を除いた本文のハッシュ（scraper.page_hash）。前回保存したハッシュと
+  同じならパースしない（ETagが無い・毎回変わる場合でも、中身が同じなら304と同じ扱いになる）
+- 商品: (価格, 商品名のcrc32) の指紋。既知の商品は指紋が変わったものだけを差分として返す
+
+どちらもメモリに持ち、ページのハッシュは listing_pages、商品の指紋は products の price_yen / name が
+DB側の実体（再起動後はそこから読み直す）。メモリの更新はDBへの保存がcommitされてから行う
+"""
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+from database import insert_ignoring_duplicates
+from models import ListingPage, Product
+from scraper import parse_price_yen
+
+FINGERPRINT_CACHE_SIZE = int(os.getenv("FINGERPRINT_CACHE_SIZE", "200000"))  # メモリに持つ商品指紋の上限
+FINGERPRINT_CHUNK = 500  # 指紋をDBから引くときのIN句の件数
+
+_lock = threading.Lock()
+_pages: Dict[str, str] = {}  # URL -> 保存済みの本文ハッシュ
+_pages_loaded = False
+_products: "OrderedDict[str, Tuple[Optional[int], int]]" = OrderedDict()  # product_id -> 指紋（LRU）
+
+
+def known_page_hash(url: str) -> Optional[str]:
+    with _lock:
+        return _pages.get(url)
+
+
+def load_pages(db):
+    """保存済みのページハッシュを読み込む（プロセスで最初の1回だけ）"""
+    global _pages_loaded
+    if _pages_loaded:
+        return
+    rows = db.execute(select(ListingPage.url, ListingPage.content_hash)).all()
+    with _lock:
+        for url, digest in rows:
+            _pages.setdefault(url, digest)
+        _pages_loaded = True
+
+
+def save_pages(db, pages: Dict[str, Tuple[str, int]], when: datetime):
+    """内容が変わったページ（URL -> (ハッシュ, 商品数)）を保存（commitは呼び出し側、commit後に remember を呼ぶ）"""
+    if not pages:
+        return
+    rows = [{"u": url, "h": digest, "n": count, "t": when} for url, (digest, count) in pages.items()]
+    db.execute(
+        insert_ignoring_duplicates(db, ListingPage, ["url"]),
+        [{"url": r["u"], "content_hash": r["h"], "product_count": r["n"], "changed_at": when} for r in rows],
+    )
+    table = ListingPage.__table__
+    db.execute(
+        update(table).where(table.c.url == bindparam("u"))
+        .values(content_hash=bindparam("h"), product_count=bindparam("n"), changed_at=bindparam("t")),
+        rows,
+    )
+
+
+def fingerprint(price_yen: Optional[int], name: str) -> Tuple[Optional[int], int]:
+    return price_yen, zlib.crc32((name or "").encode("utf-8"))
+
+
+def changed_products(db, items: Iterable[Dict]) -> List[Tuple[Dict, Optional[int]]]:
+    """
+    既知の商品のうち価格・商品名が前回と変わったもの（商品dict, 前回の価格）
+    メモリに無い指紋は products からまとめて引く（DBにも無い商品・価格が読めなかった商品は対象外）
+    """
+    items = [p for p in items if parse_price_yen(p.get("price")) is not None]
+    current = {p["product_id"]: fingerprint(parse_price_yen(p.get("price")), p["name"]) for p in items}
+    known: Dict[str, Tuple[Optional[int], int]] = {}
+    with _lock:
+        for pid in current:
+            fp = _products.get(pid)
+            if fp is not None:
+                known[pid] = fp
+    missing = [pid for pid in current if pid not in known]
+    for i in range(0, len(missing), FINGERPRINT_CHUNK):
+        chunk = missing[i:i + FINGERPRINT_CHUNK]
+        for pid, price_yen, name in db.execute(
+            select(Product.product_id, Product.price_yen, Product.name).where(Product.product_id.in_(chunk))
+        ):
+            known[pid] = fingerprint(price_yen, name)
+
+    return [
+        (p, known[p["product_id"]][0]) for p in items
+        if p["product_id"] in known and known[p["product_id"]] != current[p["product_id"]]
+    ]
+
+
+def remember(pages: Dict[str, Tuple[str, int]], products: Iterable[Dict]):
+    """保存がcommitされたページのハッシュと商品の指紋をメモリに反映"""
+    with _lock:
+        for url, (digest, _) in pages.items():
+            _pages[url] = digest
+        for p in products:
+            _products[p["product_id"]] = fingerprint(parse_price_yen(p.get("price")), p["name"])
+            _products.move_to_end(p["product_id"])
+        while len(_products) > FINGERPRINT_CACHE_SIZE:
+            _products.popitem(last=False)
@@ -0,0 +1,173 @@
+"""
+スクレイパー共通HTTPクライアント
+- スキャン/チェックの全スレッドで1つのSessionを共有（コネクションプール + keep-alive）
+- gzip/br 圧縮を受け入れる（brはbrotliが入っている場合のみ）
+- 429/5xx は get() 内でジッタ付き指数バックオフでリトライ（試行ごとにレート制限を通す、Retry-After を尊重）
+- アダプタ側のリトライは接続エラーのみ
+- ETag/Last-Modified による条件付きGET（304なら前回の結果を再利用）
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ratelimit import throttle
+import metrics
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "60"))  # Retry-After の上限（秒）
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CONDITIONAL_CACHE_SIZE = int(os.getenv("CONDITIONAL_CACHE_SIZE", "50000"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+def _accept_encoding() -> str:
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        return "gzip, deflate"
+
+
+def _build_session() -> requests.Session:
+    # 接続エラーだけアダプタでリトライ（まだ相手に届いていないのでレート制限の外でよい）
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,
+        status=0,
+        other=0,
+        allowed_methods=("GET", "HEAD"),
+        backoff_factor=HTTP_BACKOFF,
+        backoff_jitter=HTTP_BACKOFF,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=HTTP_POOL_SIZE,
+        pool_block=True,
+        max_retries=retry,
+    )
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": _accept_encoding(),
+    })
+    return s
+
+
+session = _build_session()
+
+
+def _retry_wait(r: requests.Response, attempt: int) -> float:
+    """次の試行までの待ち秒数: Retry-After があればそれ、無ければジッタ付き指数バックオフ"""
+    header = r.headers.get("Retry-After")
+    if header:
+        try:
+            wait = float(header)
+        except ValueError:
+            try:
+                wait = parsedate_to_datetime(header).timestamp() - time.time()
+            except (TypeError, ValueError):
+                wait = None
+        if wait is not None:
+            return min(max(wait, 0.0), HTTP_RETRY_AFTER_MAX)
+    return HTTP_BACKOFF * (2 ** attempt) + random.uniform(0, HTTP_BACKOFF)
+
+
+def get(url: str, timeout: float, **kwargs) -> requests.Response:
+    """
+    レート制限を守って共有セッションでGET（所要時間をエンドポイント・ステータス別に記録）
+    429/5xx は最大HTTP_RETRIES回リトライし、各試行の前に throttle() を通す。
+    リトライし尽くしたら最後のレスポンスをそのまま返す。
+    """
+    endpoint = metrics.endpoint_of(url)
+    attempt = 0
+    while True:
+        throttle(url)
+        started = time.perf_counter()
+        try:
+            r = session.get(url, timeout=timeout, **kwargs)
+        except Exception:
+            metrics.FETCH_SECONDS.labels(endpoint, "error").observe(time.perf_counter() - started)
+            raise
+        metrics.FETCH_SECONDS.labels(endpoint, str(r.status_code)).observe(time.perf_counter() - started)
+        if r.status_code not in RETRY_STATUSES or attempt >= HTTP_RETRIES:
+            return r
+        wait = _retry_wait(r, attempt)
+        r.close()
+        attempt += 1
+        time.sleep(wait)
+
+
+class _ValidatorCache:
+    """URL -> (ETag, Last-Modified, 前回の解析結果) のLRU"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items: "OrderedDict[str, Tuple[Optional[str], Optional[str], Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, url: str):
+        with self.lock:
+            entry = self.items.get(url)
+            if entry is not None:
+                self.items.move_to_end(url)
+            return entry
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], value: Any):
+        with self.lock:
+            self.items[url] = (etag, last_modified, value)
+            self.items.move_to_end(url)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def discard(self, url: str):
+        with self.lock:
+            self.items.pop(url, None)
+
+
+_validators = _ValidatorCache(CONDITIONAL_CACHE_SIZE)
+
+
+def conditional_get(url: str, parse: Callable[[requests.Response], Any], timeout: float, **kwargs) -> Any:
+    """
+    条件付きGET。304なら前回parseした結果をそのまま返す。
+    parseが例外を投げた場合は何もキャッシュせずに例外を伝える。
+    """
+    cached = _validators.get(url)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    r = get(url, timeout, headers=headers, **kwargs)
+    try:
+        if r.status_code == 304 and cached:
+            return cached[2]
+
+        value = parse(r)
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        if etag or last_modified:
+            _validators.put(url, etag, last_modified, value)
+        else:
+            _validators.discard(url)
+        return value
+    finally:
+        r.close()
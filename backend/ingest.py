@@ -0,0 +1,133 @@
+"""
+商品の一括登録（スキャン結果・新着通知ツールからの受信で共通）
+既存IDは IN (...) で一括確認し、新規分だけをまとめてINSERTする
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+from database import insert_ignoring_duplicates
+from models import Product, ProductEvent
+from scraper import parse_price_yen
+from shards import shard_of
+import keyword_engine
+import product_events
+
+INGEST_CHUNK = 500  # IN句・INSERT 1回あたりの件数
+
+
+def ingest_products(db, items: Iterable[Dict], default_category: str = "hobby") -> int:
+    """
+    商品dict（product_id, name, price, url, image_url, category）の列を登録し新規件数を返す。
+    commitは呼び出し側で行う。
+    """
+    # 同じバッチ内の重複は最初の1件だけ使う
+    by_id: Dict[str, Dict] = {}
+    for p in items:
+        by_id.setdefault(p["product_id"], p)
+    if not by_id:
+        return 0
+
+    ids = list(by_id)
+    existing = set()
+    for i in range(0, len(ids), INGEST_CHUNK):
+        chunk = ids[i:i + INGEST_CHUNK]
+        existing.update(
+            row[0] for row in db.query(Product.product_id).filter(Product.product_id.in_(chunk))
+        )
+
+    rows = [_to_row(by_id[pid], default_category) for pid in ids if pid not in existing]
+    stmt = insert_ignoring_duplicates(db, Product, ["product_id"])
+    # 確認後に別プロセスが入れた行は重複で飛ばされるので、実際に入った行だけを数える
+    returning = db.get_bind().dialect.insert_executemany_returning
+    if returning:
+        stmt = stmt.returning(Product.product_id)
+    now = datetime.now()
+    inserted = []
+    for i in range(0, len(rows), INGEST_CHUNK):
+        chunk = rows[i:i + INGEST_CHUNK]
+        result = db.execute(stmt, chunk)
+        # RETURNINGが使えないDBは素のINSERT（重複は例外になる）なので全件入っている
+        ids_in = set(result.scalars()) if returning else {row["product_id"] for row in chunk}
+        inserted.extend(row for row in chunk if row["product_id"] in ids_in)
+        product_events.record_listed(db, list(ids_in), now)
+    keyword_engine.record_listed(db, (row["name"] for row in inserted))
+    return len(inserted)
+
+
+def update_changed_products(db, changes: List[Tuple[Dict, Optional[int]]]) -> Dict:
+    """
+    一覧で価格・商品名が変わっていた既知の商品（fingerprints.changed_products の結果）を更新し、
+    価格の変化を product_events に記録して {"changed", "price_drops"} を返す。commitは呼び出し側で行う。
+    """
+    if not changes:
+        return {"changed": 0, "price_drops": 0}
+    table = Product.__table__
+    rows = [
+        {"pid": p["product_id"], "name": p["name"], "price": p.get("price", ""), "price_yen": parse_price_yen(p.get("price"))}
+        for p, _ in changes
+    ]
+    db.execute(
+        update(table).where(table.c.product_id == bindparam("pid"))
+        .values(name=bindparam("name"), price=bindparam("price"), price_yen=bindparam("price_yen")),
+        rows,
+    )
+
+    now = datetime.now()
+    refs = dict(db.execute(select(Product.product_id, Product.id).where(Product.product_id.in_([r["pid"] for r in rows]))).all())
+    events = []
+    for row, (_, old_price) in zip(rows, changes):
+        event_type = product_events.price_change_type(old_price, row["price_yen"])
+        if event_type and row["pid"] in refs:
+            events.append(product_events.event(refs[row["pid"]], event_type, now, row["price_yen"]))
+    product_events.record(db, events)
+    return {"changed": len(rows), "price_drops": sum(1 for e in events if e["event_type"] == product_events.PRICE_CUT)}
+
+
+def reactivate_relisted(db, items: Iterable[Dict]) -> Dict:
+    """
+    一覧に載っていた既知の商品のうち
+    - 削除済み（商品ページが404/410だった）もの: 販売中に戻して relisted を記録
+    - 売れたもの: 一覧の反映遅れもありうるので状態は変えず、売れてから初めて一覧で見えたときだけ reappeared を記録
+    {"relisted", "reappeared"} を返す。commitは呼び出し側で行う。
+    """
+    ids = list({p["product_id"] for p in items})
+    now = datetime.now()
+    relisted = []
+    reappeared = []
+    already = (
+        select(ProductEvent.id)
+        .where(ProductEvent.product_ref == Product.id, ProductEvent.event_type == product_events.REAPPEARED,
+               ProductEvent.ts >= Product.sold_at)
+        .exists()
+    )
+    for i in range(0, len(ids), INGEST_CHUNK):
+        chunk = ids[i:i + INGEST_CHUNK]
+        for ref, price_yen in db.execute(
+            select(Product.id, Product.price_yen)
+            .where(Product.product_id.in_(chunk), Product.status == "removed")
+        ):
+            relisted.append(product_events.event(ref, product_events.RELISTED, now, price_yen))
+        for ref, price_yen in db.execute(
+            select(Product.id, Product.price_yen)
+            .where(Product.product_id.in_(chunk), Product.status == "sold", ~already)
+        ):
+            reappeared.append(product_events.event(ref, product_events.REAPPEARED, now, price_yen))
+    if relisted:
+        db.execute(update(Product), [{"id": e["product_ref"], "status": "active", "next_check_at": None} for e in relisted])
+    product_events.record(db, relisted + reappeared)
+    return {"relisted": len(relisted), "reappeared": len(reappeared)}
+
+
+def _to_row(p: Dict, default_category: str) -> Dict:
+    return {
+        "product_id": p["product_id"],
+        "name": p["name"],
+        "price": p.get("price", ""),
+        "price_yen": parse_price_yen(p.get("price")),
+        "url": p["url"],
+        "image_url": p.get("image_url", ""),
+        "category": p.get("category") or default_category,
+        "status": "active",
+        "shard": shard_of(p["product_id"]),
+    }
@@ -0,0 +1,247 @@
+"""
+スキャン・チェックのジョブ管理
+ワーカー内ではバックグラウンドループも手動実行も submit() を通す
+- 同じ種類のジョブが実行中なら新しく起動せず、そのジョブに合流する
+- 進捗（done/total）から処理速度と残り時間を計算して /api/jobs/{id} で返す
+
+手動実行（/api/scan, /api/check）はAPIプロセスでは実行せず submit_request() で job_runs に依頼を書く。
+リース "scheduler" を持つワーカーだけが claim_requests() で受け取って submit() し、進捗・結果を
+sync_request() で書き戻す（APIプロセスが何個あっても、リース保持者のループと並行して走らない）
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from database import SessionLocal
+from lease import OWNER_ID
+from models import JobRun
+
+JOB_HISTORY = 50  # 保持する終了済みジョブ数
+JOB_QUEUE_TIMEOUT = int(os.getenv("JOB_QUEUE_TIMEOUT", "120"))  # この秒数ワーカーが受け取らない依頼は失敗にする
+JOB_RUN_DAYS = 7  # job_runs の保持日数
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """1回分のスキャン/チェック（進捗はワーカースレッドから progress() で更新）"""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = QUEUED
+        self.done = 0
+        self.total: Optional[int] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self._started = None
+        self._elapsed: Optional[float] = None  # 終了時に確定
+        self._finished = threading.Event()
+
+    def progress(self, done: int, total: Optional[int] = None):
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def is_active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> Dict:
+        if self._elapsed is not None:
+            elapsed = self._elapsed
+        else:
+            elapsed = time.monotonic() - self._started if self._started else 0.0
+        return _summary(self.id, self.kind, self.status, self.done, self.total, elapsed,
+                        self.created_at, self.finished_at, self.result, self.error)
+
+    def _run(self, fn: Callable):
+        self.status = RUNNING
+        self._started = time.monotonic()
+        try:
+            self.result = fn(progress=self.progress)
+            self.status = DONE
+        except Exception as e:
+            print(f"ジョブエラー ({self.kind} {self.id}): {e}")
+            self.error = str(e)
+            self.status = FAILED
+        finally:
+            self._elapsed = time.monotonic() - self._started
+            self.finished_at = datetime.now()
+            self._finished.set()
+
+
+class JobManager:
+    def __init__(self):
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable) -> Tuple[Job, bool]:
+        """ジョブを起動して (job, 新規か) を返す。同じ種類が実行中ならそれを返す"""
+        with self._lock:
+            active = self._active.get(kind)
+            if active is not None and active.is_active():
+                return active, False
+            job = Job(kind)
+            self._active[kind] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOB_HISTORY:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.is_active():
+                    break
+                self._jobs.popitem(last=False)
+
+        threading.Thread(target=job._run, args=(fn,), daemon=True, name=f"job-{kind}").start()
+        return job, True
+
+    def run(self, kind: str, fn: Callable) -> Job:
+        """submit() して終わるまで待つ（バックグラウンドループ用）"""
+        job, _ = self.submit(kind, fn)
+        job.wait()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self):
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+
+jobs = JobManager()
+
+
+def _summary(job_id, kind, status, done, total, elapsed, created_at, finished_at, result, error) -> Dict:
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = None
+    if status == RUNNING and total is not None and rate > 0:
+        eta = round(max(total - done, 0) / rate, 1)
+    return {
+        "id": job_id,
+        "kind": kind,
+        "status": status,
+        "done": done,
+        "total": total,
+        "rate": round(rate, 2),
+        "eta_seconds": eta,
+        "elapsed": round(elapsed, 1),
+        "created_at": created_at.isoformat(),
+        "finished_at": finished_at.isoformat() if finished_at else None,
+        "result": result,
+        "error": error,
+    }
+
+
+# ========== 手動実行の依頼（job_runs） ==========
+
+def submit_request(db, kind: str) -> Tuple[Dict, bool]:
+    """依頼を作って (ジョブ, 新規か) を返す。同じ種類が待機中・実行中ならそれを返す"""
+    now = datetime.now()
+    _expire_queued(db, now)
+    active = db.execute(
+        select(JobRun).where(JobRun.kind == kind, JobRun.status.in_((QUEUED, RUNNING)))
+        .order_by(JobRun.requested_at).limit(1)
+    ).scalar()
+    if active is not None:
+        db.commit()
+        return request_to_dict(active), False
+    db.execute(delete(JobRun).where(JobRun.requested_at < now - timedelta(days=JOB_RUN_DAYS)))
+    run = JobRun(id=uuid.uuid4().hex[:12], kind=kind, status=QUEUED, done=0, requested_at=now)
+    db.add(run)
+    db.commit()
+    return request_to_dict(run), True
+
+
+def get_request(db, job_id: str) -> Optional[Dict]:
+    _expire_queued(db, datetime.now())
+    db.commit()
+    run = db.get(JobRun, job_id)
+    return request_to_dict(run) if run else None
+
+
+def recent_requests(db, limit: int = JOB_HISTORY) -> List[Dict]:
+    _expire_queued(db, datetime.now())
+    db.commit()
+    rows = db.execute(select(JobRun).order_by(JobRun.requested_at.desc()).limit(limit)).scalars()
+    return [request_to_dict(run) for run in rows]
+
+
+def request_to_dict(run: JobRun) -> Dict:
+    if run.started_at is None:
+        elapsed = 0.0
+    else:
+        elapsed = ((run.finished_at or datetime.now()) - run.started_at).total_seconds()
+    result = json.loads(run.result) if run.result else None
+    return _summary(run.id, run.kind, run.status, run.done, run.total, elapsed,
+                    run.requested_at, run.finished_at, result, run.error)
+
+
+def _expire_queued(db, now: datetime):
+    """ワーカーが受け取らないまま JOB_QUEUE_TIMEOUT 秒たった依頼を失敗にする（commitは呼び出し側）"""
+    db.execute(
+        update(JobRun)
+        .where(JobRun.status == QUEUED, JobRun.requested_at < now - timedelta(seconds=JOB_QUEUE_TIMEOUT))
+        .values(status=FAILED, finished_at=now, error="ワーカーが依頼を受け取らなかった（python -m worker が動いているか確認）")
+    )
+
+
+def claim_requests(db) -> Dict[str, List[str]]:
+    """
+    待機中の依頼を受け取って {種類: [依頼id]} を返す（リース保持者だけが呼ぶ、commit済み）
+    同じ種類の依頼はまとめて1回の実行で済ませる。他のプロセスが実行中のまま残した依頼は失敗にする
+    """
+    now = datetime.now()
+    db.execute(
+        update(JobRun).where(JobRun.status == RUNNING, JobRun.owner != OWNER_ID)
+        .values(status=FAILED, finished_at=now, error="実行中のワーカーが停止した")
+    )
+    ids = list(db.execute(select(JobRun.id).where(JobRun.status == QUEUED)).scalars())
+    if ids:
+        db.execute(
+            update(JobRun).where(JobRun.id.in_(ids), JobRun.status == QUEUED)
+            .values(status=RUNNING, owner=OWNER_ID, started_at=now)
+        )
+    db.commit()
+    if not ids:
+        return {}
+    claimed: Dict[str, List[str]] = {}
+    for job_id, kind in db.execute(
+        select(JobRun.id, JobRun.kind).where(JobRun.id.in_(ids), JobRun.owner == OWNER_ID, JobRun.status == RUNNING)
+    ):
+        claimed.setdefault(kind, []).append(job_id)
+    return claimed
+
+
+def sync_request(ids: List[str], job: Job):
+    """実行中のジョブの進捗・結果を依頼の行に書き戻す（専用セッション）"""
+    # 受け取った依頼は待機中に戻さない（submit直後のジョブはまだ queued のことがある）
+    values = {"status": job.status if not job.is_active() else RUNNING, "done": job.done, "total": job.total}
+    if not job.is_active():
+        values.update(
+            result=json.dumps(job.result, ensure_ascii=False, default=str) if job.result is not None else None,
+            error=job.error, finished_at=job.finished_at,
+        )
+    db = SessionLocal()
+    try:
+        db.execute(update(JobRun).where(JobRun.id.in_(ids)).values(**values))
+        db.commit()
+    except Exception as e:
+        print(f"ジョブ進捗の保存エラー: {e}")
+        db.rollback()
+    finally:
+        db.close()
@@ -0,0 +1,232 @@
+"""
+キーワード抽出エンジン
+- tokenize(): 商品名を文字種（英数字・カタカナ・漢字）の境目で区切り、漢字は2文字のn-gram、
+  隣り合う語は2語の組も語にする（空白の無い日本語の商品名でも語が取れる）
+- keyword_terms: 語ごとの出品数（listed）と即売れ数（fast）。スキャン・チェックのたびに増分で更新する
+- score(): 即売れ商品での出現率と出品全体での出現率の比（リフト、事前分布で平滑化）× log(1+即売れ数)
+- suggest(): 即売れ商品ごとにスコア上位KEYWORD_TOP_K語をキーワード候補にする
+  語の統計・既存キーワードの確認はバッチ全体でそれぞれ1クエリ
+"""
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, select, update
+from database import insert_ignoring_duplicates
+from models import Keyword, KeywordTerm
+from scheduler import SELL_CHECK_MINUTES
+
+KEYWORD_TOP_K = int(os.getenv("KEYWORD_TOP_K", "3"))  # 即売れ商品1件から作るキーワードの上限
+KEYWORD_MIN_FAST = int(os.getenv("KEYWORD_MIN_FAST", "2"))  # 即売れ数がこれ未満の語は候補にしない
+KEYWORD_MIN_SCORE = float(os.getenv("KEYWORD_MIN_SCORE", "0.5"))
+PRIOR_WEIGHT = 5.0  # 平滑化の強さ（出品数がこの程度までの語は全体平均に寄せる）
+MAX_TERM_LENGTH = 100
+TOTAL_TERM = ""  # 全体の出品数・即売れ数を持つ行
+
+_NOISE_RE = re.compile(r"[\d,]+円|ジャンク品?|ランク[a-z]|中古|未開封|新品|送料無料|美品|現状品")
+_BRACKETS_RE = re.compile(r"[\[\]【】（）()「」『』〈〉《》<>]")
+_RUN_RE = re.compile(
+    r"(?P<latin>[a-z0-9](?:[a-z0-9.\-/+]*[a-z0-9])?)"
+    r"|(?P<kata>[ァ-ヴー]+)"
+    r"|(?P<kanji>[一-龯々〆ヶ]+)"
+    r"|(?P<hira>[ぁ-ゖ]+)"
+)
+_PRICE_OR_NUMBER_RE = re.compile(r"^[\d.,\-/]+$")
+
+
+def normalize(name: str) -> str:
+    """全角・半角を揃えて小文字にし、状態表記や括弧を取り除く"""
+    text = unicodedata.normalize("NFKC", name or "").lower()
+    text = _BRACKETS_RE.sub(" ", text)
+    return _NOISE_RE.sub(" ", text)
+
+
+def tokenize(name: str) -> List[str]:
+    """商品名から語の集合を作る（重複なし、出現順）"""
+    runs = []  # (語, 文字種)
+    text = normalize(name)
+    for match in _RUN_RE.finditer(text):
+        run, kind = match.group(), match.lastgroup
+        if kind == "hira":
+            continue  # 助詞など
+        if kind == "latin" and (len(run) < 2 or _PRICE_OR_NUMBER_RE.match(run) and "/" not in run):
+            continue  # 価格・数字だけの語（1/144 のようなスケールは残す）
+        if kind == "kata" and len(run.strip("ー")) < 2 or kind == "kanji" and len(run) < 2:
+            continue
+        runs.append((run, kind))
+
+    terms = []
+    for i, (run, kind) in enumerate(runs):
+        if kind == "kanji":
+            if len(run) <= 4:
+                terms.append(run)
+            terms.extend(run[j:j + 2] for j in range(len(run) - 1))
+        else:
+            terms.append(run)
+        if i > 0:
+            # 隣り合う2語の組（"hg 1/144"、"ガンダム ザク" など）
+            terms.append(f"{runs[i - 1][0]} {run}")
+
+    seen = set()
+    result = []
+    for term in terms:
+        if len(term) >= 2 and len(term) <= MAX_TERM_LENGTH and term not in seen:
+            seen.add(term)
+            result.append(term)
+    return result
+
+
+# ========== 語の統計（増分更新） ==========
+
+def record_listed(db, names: Iterable[str]):
+    """出品された商品名の語の出品数を増やす（commitは呼び出し側）"""
+    names = list(names)
+    if names:
+        _increment(db, "listed_count", names)
+
+
+def record_fast(db, names: Iterable[str]):
+    """即売れした商品名の語の即売れ数を増やす（commitは呼び出し側）"""
+    names = list(names)
+    if names:
+        _increment(db, "fast_count", names)
+
+
+def _increment(db, column: str, names: List[str]):
+    counts = Counter()
+    for name in names:
+        counts.update(tokenize(name))
+    counts[TOTAL_TERM] = len(names)
+    # 無い語は0で作ってから、語ごとに足し込む（どちらもexecutemany 1回）
+    db.execute(
+        insert_ignoring_duplicates(db, KeywordTerm, ["term"]),
+        [{"term": term, "listed_count": 0, "fast_count": 0} for term in counts],
+    )
+    table = KeywordTerm.__table__
+    col = table.c[column]
+    db.execute(
+        update(table).where(table.c.term == bindparam("t")).values({column: col + bindparam("n")}),
+        [{"t": term, "n": n} for term, n in counts.items()],
+    )
+
+
+def rebuild(db, rows: Iterable):
+    """(name, minutes_to_sell) の全件から語の統計を作り直す（初回マイグレーション用、commitは呼び出し側）"""
+    listed = Counter()
+    fast = Counter()
+    for name, minutes in rows:
+        terms = tokenize(name)
+        listed.update(terms)
+        listed[TOTAL_TERM] += 1
+        if minutes is not None and minutes <= SELL_CHECK_MINUTES:
+            fast.update(terms)
+            fast[TOTAL_TERM] += 1
+    db.query(KeywordTerm).delete()
+    items = [{"term": t, "listed_count": n, "fast_count": fast.get(t, 0)} for t, n in listed.items()]
+    for i in range(0, len(items), 1000):
+        db.execute(KeywordTerm.__table__.insert(), items[i:i + 1000])
+    return len(items)
+
+
+# ========== スコアとキーワード候補 ==========
+
+def score(listed: int, fast: int, total_listed: int, total_fast: int) -> float:
+    """即売れのしやすさ: log(平滑化したリフト) × log(1+即売れ数)。0以下は特徴なし"""
+    if total_listed <= 0 or total_fast <= 0 or fast <= 0:
+        return 0.0
+    base_rate = total_fast / total_listed
+    rate = (fast + PRIOR_WEIGHT * base_rate) / (listed + PRIOR_WEIGHT)
+    lift = math.log(rate / base_rate)
+    return max(0.0, lift) * math.log1p(fast)
+
+
+def term_stats(db, terms: Iterable[str]) -> Dict[str, KeywordTerm]:
+    """語の統計をまとめて1クエリで引く（全体の合計行も含む）"""
+    terms = set(terms) | {TOTAL_TERM}
+    rows = db.execute(select(KeywordTerm).where(KeywordTerm.term.in_(terms))).scalars()
+    return {row.term: row for row in rows}
+
+
+def rank_terms(name: str, stats: Dict[str, KeywordTerm]) -> List[Dict]:
+    """商品名の語をスコア順に並べる"""
+    total = stats.get(TOTAL_TERM)
+    if total is None:
+        return []
+    ranked = []
+    for term in tokenize(name):
+        row = stats.get(term)
+        if row is None or row.fast_count < KEYWORD_MIN_FAST:
+            continue
+        s = score(row.listed_count, row.fast_count, total.listed_count, total.fast_count)
+        if s >= KEYWORD_MIN_SCORE:
+            ranked.append({"term": term, "score": round(s, 3), "listed": row.listed_count, "fast": row.fast_count})
+    ranked.sort(key=lambda r: (-r["score"], -len(r["term"])))
+    return ranked
+
+
+def suggest(db, items: List[Dict], top_k: int = KEYWORD_TOP_K) -> List[Keyword]:
+    """
+    即売れ商品（name, price, minutes_to_sell のdict）からキーワードを追加して返す（flush済み、commitは呼び出し側）
+    語の統計と既存キーワードはバッチ全体でそれぞれ1クエリで引く
+    """
+    if not items:
+        return []
+    record_fast(db, [item["name"] for item in items])
+    stats = term_stats(db, (t for item in items for t in tokenize(item["name"])))
+
+    picks = []  # (item, term)
+    for item in items:
+        chosen: List[str] = []
+        for cand in rank_terms(item["name"], stats):
+            term = cand["term"]
+            # 既に選んだ語を含む・含まれる語は重ねない
+            if any(term in c or c in term for c in chosen):
+                continue
+            chosen.append(term)
+            if len(chosen) >= top_k:
+                break
+        picks.extend((item, term) for term in chosen)
+    if not picks:
+        return []
+
+    existing = set(db.execute(
+        select(Keyword.keyword).where(Keyword.keyword.in_({term for _, term in picks}))
+    ).scalars())
+    added = []
+    for item, term in picks:
+        if term in existing:
+            continue
+        existing.add(term)
+        kw = Keyword(
+            keyword=term,
+            selected=True,
+            source_product_name=item["name"],
+            source_price=item.get("price") or "",
+            minutes_to_sell=item.get("minutes_to_sell"),
+        )
+        db.add(kw)
+        added.append(kw)
+    # idを確定させる（配信用）
+    db.flush()
+    return added
+
+
+def top_terms(db, limit: int = 50, min_fast: Optional[int] = None) -> List[Dict]:
+    """即売れしやすい語のランキング"""
+    total = db.get(KeywordTerm, TOTAL_TERM)
+    if total is None:
+        return []
+    rows = db.execute(
+        select(KeywordTerm).where(KeywordTerm.term != TOTAL_TERM,
+                                  KeywordTerm.fast_count >= (min_fast or KEYWORD_MIN_FAST))
+    ).scalars()
+    ranked = [
+        {"term": r.term, "listed": r.listed_count, "fast": r.fast_count,
+         "score": round(score(r.listed_count, r.fast_count, total.listed_count, total.fast_count), 3)}
+        for r in rows
+    ]
+    ranked.sort(key=lambda r: -r["score"])
+    return ranked[:limit]
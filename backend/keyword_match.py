@@ -0,0 +1,187 @@
+"""
+キーワード（+除外ワード）の当たり方のプレビュー
+選択中のキーワードの語と除外ワードを全部まとめて1つのAho-Corasickオートマトンにし、
+商品履歴（products + アーカイブ）を1回なめるだけで全キーワードのヒット数・即売れ率を出す
+（キーワード数 × 商品数の部分文字列検索にしない）
+
+照合ルール（監視ツールと同じ）:
+- 全角・半角と大文字・小文字は区別しない
+- キーワードを空白で区切った語がすべて含まれればヒット
+- 除外ワード（空白・カンマ区切り）のどれかが含まれればヒットしない
+"""
+import re
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from models import Product, ProductArchive
+from scheduler import SELL_CHECK_MINUTES
+import metrics
+
+PREVIEW_CHUNK = 2000  # 商品履歴を読むときの1回あたりの件数
+_EXCLUDE_SPLIT_RE = re.compile(r"[\s,、，]+")
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+class AhoCorasick:
+    """複数パターンの同時検索（構築 O(パターン長の合計)、検索 O(文字数 + ヒット数)）"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        index: Dict[str, int] = {}
+        for pattern in patterns:
+            if pattern and pattern not in index:
+                index[pattern] = len(self.patterns)
+                self.patterns.append(pattern)
+                self._add(pattern, index[pattern])
+        self._index = index
+        self._link()
+
+    def id_of(self, pattern: str) -> Optional[int]:
+        return self._index.get(pattern)
+
+    def _add(self, pattern: str, pid: int):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(pid)
+
+    def _link(self):
+        """失敗リンクを幅優先で張り、出力を失敗先の分まで畳み込む"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[int]:
+        """text に含まれるパターンのid"""
+        found: Set[int] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class KeywordMatcher:
+    """キーワード群を1つのオートマトンにまとめたもの。match() はヒットしたキーワードの添字を返す"""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        includes = [[normalize(w) for w in (r["keyword"] or "").split()] for r in rules]
+        excludes = [[normalize(w) for w in _EXCLUDE_SPLIT_RE.split(r.get("exclude") or "") if w] for r in rules]
+        self.automaton = AhoCorasick(w for words in includes + excludes for w in words)
+
+        # パターンid -> (キーワードの添字) の逆引き
+        self._required = [len(set(words)) for words in includes]
+        self._include_of: Dict[int, List[int]] = {}
+        self._exclude_of: Dict[int, List[int]] = {}
+        for i, words in enumerate(includes):
+            for w in set(words):
+                self._include_of.setdefault(self.automaton.id_of(w), []).append(i)
+        for i, words in enumerate(excludes):
+            for w in set(words):
+                self._exclude_of.setdefault(self.automaton.id_of(w), []).append(i)
+
+    def match(self, name: str):
+        """(ヒットしたキーワードの添字, 除外ワードで外れたキーワードの添字)"""
+        found = self.automaton.find(normalize(name))
+        if not found:
+            return [], []
+        counts: Dict[int, int] = {}
+        excluded: Set[int] = set()
+        for pid in found:
+            for i in self._include_of.get(pid, ()):
+                counts[i] = counts.get(i, 0) + 1
+            excluded.update(self._exclude_of.get(pid, ()))
+        hits = [i for i, n in counts.items() if n == self._required[i]]
+        return [i for i in hits if i not in excluded], [i for i in hits if i in excluded]
+
+
+def preview(db, rules: List[Dict], since: datetime, category: Optional[str] = None,
+            include_archive: bool = True, sample_size: int = 3) -> Dict:
+    """
+    rules（id, keyword, exclude のdict）を since 以降に出品された商品に当てた結果
+    各キーワード: hits, sold, fast（SELL_CHECK_MINUTES以内に売れた数）, fast_rate, excluded（除外ワードで外れた数）, samples
+    """
+    started = time.monotonic()
+    matcher = KeywordMatcher(rules)
+    results = [
+        {"id": r.get("id"), "keyword": r["keyword"], "exclude": r.get("exclude") or "",
+         "hits": 0, "sold": 0, "fast": 0, "excluded": 0, "samples": []}
+        for r in rules
+    ]
+    scanned = 0
+    with metrics.stage("keyword_preview"):
+        for table in (Product, ProductArchive) if include_archive else (Product,):
+            stmt = select(
+                table.product_id, table.name, table.price, table.url, table.status,
+                table.minutes_to_sell, table.created_at,
+            ).where(table.created_at >= since)
+            if category:
+                stmt = stmt.where(table.category == category)
+            for row in db.execute(stmt.execution_options(yield_per=PREVIEW_CHUNK)):
+                scanned += 1
+                hits, excluded = matcher.match(row.name)
+                for i in excluded:
+                    results[i]["excluded"] += 1
+                for i in hits:
+                    _count(results[i], row, sample_size)
+
+    for r in results:
+        r["fast_rate"] = round(r["fast"] / r["hits"], 3) if r["hits"] else None
+    results.sort(key=lambda r: (-r["hits"], r["keyword"]))
+    return {
+        "since": since.isoformat(),
+        "scanned": scanned,
+        "keywords": results,
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+
+
+def _count(result: Dict, row, sample_size: int):
+    result["hits"] += 1
+    is_sold = row.status == "sold" and row.minutes_to_sell is not None
+    is_fast = is_sold and row.minutes_to_sell <= SELL_CHECK_MINUTES
+    result["sold"] += is_sold
+    result["fast"] += is_fast
+    samples = result["samples"]
+    # 即売れの例を優先して見せる（枠が埋まっていたら即売れでない例と入れ替える）
+    sample = {
+        "product_id": row.product_id, "name": row.name, "price": row.price, "url": row.url,
+        "status": row.status, "minutes_to_sell": row.minutes_to_sell,
+    }
+    if len(samples) < sample_size:
+        samples.append(sample)
+    elif is_fast:
+        for j, s in enumerate(samples):
+            if not (s["status"] == "sold" and s["minutes_to_sell"] is not None
+                    and s["minutes_to_sell"] <= SELL_CHECK_MINUTES):
+                samples[j] = sample
+                break
@@ -0,0 +1,142 @@
+"""
+DBリースによるリーダー選出
+leasesテーブルの行を「期限付きの所有権」として扱い、期限内に更新し続けたプロセスだけが保持する
+所有者が落ちて更新が止まれば、LEASE_TTL秒後に別プロセスが引き継ぐ
+"""
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from typing import Dict, Iterable
+
+from sqlalchemy import select, update, or_
+from database import SessionLocal, insert_ignoring_duplicates
+from models import Lease
+
+LEASE_TTL = int(os.getenv("LEASE_TTL", "60"))
+
+# このプロセスの識別子（ホスト名:PID:乱数）
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def try_acquire(db, name: str, owner: str = OWNER_ID, ttl: int = LEASE_TTL) -> bool:
+    """リースを取得または延長する。取れたらTrue（commit済み）"""
+    now = _utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    # 自分の物か期限切れなら引き継ぐ（条件付きUPDATEなので同時に取れるのは1プロセスだけ）
+    result = db.execute(
+        update(Lease)
+        .where(Lease.name == name, or_(Lease.owner == owner, Lease.expires_at < now))
+        .values(owner=owner, expires_at=expires_at)
+    )
+    if result.rowcount == 0:
+        db.execute(
+            insert_ignoring_duplicates(db, Lease, ["name"]),
+            [{"name": name, "owner": owner, "expires_at": expires_at}],
+        )
+    db.commit()
+    return db.query(Lease.owner).filter(Lease.name == name).scalar() == owner
+
+
+def release(db, name: str, owner: str = OWNER_ID):
+    """保持しているリースを手放す（次の候補がすぐ引き継げる）"""
+    db.execute(
+        update(Lease)
+        .where(Lease.name == name, Lease.owner == owner)
+        .values(expires_at=_utcnow() - timedelta(seconds=1))
+    )
+    db.commit()
+
+
+def renew_held(db, names: Iterable[str], owner: str = OWNER_ID, ttl: int = LEASE_TTL):
+    """保持中のリースをまとめて延長する（期限切れで他に取られたものは延長されない）"""
+    names = list(names)
+    if not names:
+        return
+    now = _utcnow()
+    db.execute(
+        update(Lease)
+        .where(Lease.name.in_(names), Lease.owner == owner, Lease.expires_at >= now)
+        .values(expires_at=now + timedelta(seconds=ttl))
+    )
+    db.commit()
+
+
+def held(db, name: str, owner: str = OWNER_ID) -> bool:
+    """リースを今も期限内で保持しているか（DBを直接見る。更新ループの結果を待たない）"""
+    current = db.query(Lease.owner).filter(Lease.name == name, Lease.expires_at >= _utcnow()).scalar()
+    return current == owner
+
+
+def live_leases(db, prefix: str) -> Dict[str, str]:
+    """名前が prefix で始まる有効なリースの {名前: 所有者}"""
+    rows = db.execute(
+        select(Lease.name, Lease.owner).where(Lease.name.startswith(prefix), Lease.expires_at >= _utcnow())
+    ).all()
+    return {name: owner for name, owner in rows}
+
+
+class LeaderElector:
+    """バックグラウンドでリースを取り続け、保持中かどうかを is_leader() で返す"""
+
+    def __init__(self, name: str, ttl: int = LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self._leader = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_leader(self) -> bool:
+        return self._leader.is_set()
+
+    def wait_until_leader(self):
+        while not self._stop.is_set():
+            if self._leader.wait(timeout=1):
+                return True
+        return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._leader.is_set():
+            db = SessionLocal()
+            try:
+                release(db, self.name)
+            finally:
+                db.close()
+            self._leader.clear()
+
+    def _loop(self):
+        # 期限の1/3ごとに更新（2回続けて失敗しても期限内）
+        interval = max(self.ttl / 3, 1)
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                held = try_acquire(db, self.name, ttl=self.ttl)
+            except Exception as e:
+                print(f"リース更新エラー ({self.name}): {e}")
+                db.rollback()
+                held = False
+            finally:
+                db.close()
+            if held and not self._leader.is_set():
+                print(f"リース取得: {self.name} ({OWNER_ID})")
+            elif not held and self._leader.is_set():
+                print(f"リース喪失: {self.name} ({OWNER_ID})")
+            if held:
+                self._leader.set()
+            else:
+                self._leader.clear()
+            self._stop.wait(interval)
@@ -2,22 +2,36 @@
 オフモール即売れ分析 - FastAPI メインアプリケーション
 """
 import os
-import io
-import csv
+import asyncio
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, List
 
-from fastapi import FastAPI, Depends, Query
+from fastapi import FastAPI, Depends, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse, JSONResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func as sqlfunc
-
-from database import init_db, get_db
-from models import Product, Keyword
-from worker import start_scan_worker, start_check_worker, run_scan, run_check
-from scraper import CATEGORIES
+from sqlalchemy import select, and_, or_
+
+from database import SessionLocal, init_db, get_db
+from models import Product, Keyword, Category
+from ingest import ingest_products
+import export
+import stats
+from events import broker
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, parse_fields, serialize, isoformat
+from worker import SCHEDULER_LEASE, start_scheduler, stop_scheduler
+from lease import LEASE_TTL, live_leases
+from shards import CHECK_SHARDING
+from relay import start_event_relay
+from jobs import jobs, JOB_HISTORY, submit_request, get_request, recent_requests
+from scheduler import SELL_CHECK_MINUTES
+import metrics
+import categories
+import rollups
+import keyword_match
+import product_events
 
 app = FastAPI(
     title="オフモール即売れ分析",
@@ -25,6 +39,12 @@ app = FastAPI(
     version="2.0.0",
 )
 
+EVENTS_KEEPALIVE = 15  # SSEのkeepalive間隔（秒）
+app.add_middleware(metrics.APIMetricsMiddleware)
+
+# 0にするのは単独ワーカー（python -m worker）を別に動かすときだけ（railway.toml のAPIサービスは0）
+EMBEDDED_WORKERS = os.getenv("EMBEDDED_WORKERS", "1").lower() in ("1", "true", "yes")
+
 # 静的ファイル配信
 FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
 app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
@@ -38,6 +58,26 @@ class IncomingProduct(BaseModel):
     price: str = ""
     url: str
     image_url: str = ""
+    category: str = "hobby"
+
+
+class CategoryCreate(BaseModel):
+    key: str
+    name: str
+    url: str
+    scan_interval: Optional[int] = None
+    max_pages: Optional[int] = None
+    priority: int = 0
+    enabled: bool = True
+
+
+class CategoryUpdate(BaseModel):
+    name: Optional[str] = None
+    url: Optional[str] = None
+    scan_interval: Optional[int] = None
+    max_pages: Optional[int] = None
+    priority: Optional[int] = None
+    enabled: Optional[bool] = None
 
 
 class KeywordCreate(BaseModel):
@@ -56,70 +96,136 @@ class KeywordUpdate(BaseModel):
 @app.on_event("startup")
 def startup():
     init_db()
-    start_scan_worker()
-    start_check_worker()
+    metrics.CHECK_BACKLOG_LIMIT.set(SELL_CHECK_MINUTES * 60)
+    # スキャン・チェックはAPIプロセス内で動かす（複数プロセスでもリースを持つ1つだけが実行する）
+    # EMBEDDED_WORKERS=0 なら単独ワーカー（python -m worker、railway.worker.toml）に任せる
+    if EMBEDDED_WORKERS:
+        app.state.elector = start_scheduler()
+    else:
+        # ワーカーが同時に起動中のこともあるので、リースが取られるまでの時間を待ってから確認する
+        timer = threading.Timer(LEASE_TTL, _warn_if_no_worker)
+        timer.daemon = True
+        timer.start()
+    elector = getattr(app.state, "elector", None)
+
+    def publishes_locally():
+        # シャード分割時は他ノードのチェック結果もあるので常にDBから中継する
+        return elector is not None and elector.is_leader() and not CHECK_SHARDING
+
+    start_event_relay(publishes_locally)
+
+
+def _warn_if_no_worker():
+    """EMBEDDED_WORKERS=0 なのにスケジューラのリースを持つワーカーがいなければ目立つように警告する"""
+    db = SessionLocal()
+    try:
+        if not live_leases(db, SCHEDULER_LEASE):
+            print("!" * 72)
+            print(f"警告: EMBEDDED_WORKERS=0 ですが、リース {SCHEDULER_LEASE} を持つワーカーがいません。")
+            print("      新着スキャンと売り切れチェックが止まっています（python -m worker を起動してください）")
+            print("!" * 72)
+    except Exception as e:
+        print(f"ワーカー確認エラー: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    elector = getattr(app.state, "elector", None)
+    if elector:
+        stop_scheduler(elector)
 
 
 # ========== API エンドポイント ==========
 
 @app.get("/api/stats")
-def get_stats(db: Session = Depends(get_db)):
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = today - timedelta(days=7)
+def get_stats(request: Request, db: Session = Depends(get_db)):
+    """ダッシュボード統計（ETag付き、変化が無ければ304）"""
+    data, etag = stats.cached_stats(db)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(data, headers=headers)
+
+
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """
+    ダッシュボード向けSSE
+    event: stats（変化した統計項目）/ fast_seller（即売れ商品）/ keyword（新キーワード）
+    """
+    queue = broker.subscribe()
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # プロキシに切られないよう定期的にコメント行を送る
+                    yield ": keepalive\n\n"
+                    continue
+                yield message
+        finally:
+            broker.unsubscribe(queue)
 
-    today_scanned = db.query(sqlfunc.count(Product.id)).filter(
-        Product.created_at >= today
-    ).scalar() or 0
-
-    today_sold = db.query(sqlfunc.count(Product.id)).filter(
-        Product.status == "sold",
-        Product.sold_at >= today,
-        Product.minutes_to_sell != None,
-    ).scalar() or 0
-
-    week_sold = db.query(sqlfunc.count(Product.id)).filter(
-        Product.status == "sold",
-        Product.sold_at >= week_ago,
-        Product.minutes_to_sell != None,
-    ).scalar() or 0
-
-    pending = db.query(sqlfunc.count(Product.id)).filter(
-        Product.status == "active"
-    ).scalar() or 0
-
-    keyword_count = db.query(sqlfunc.count(Keyword.id)).scalar() or 0
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    selected_count = db.query(sqlfunc.count(Keyword.id)).filter(
-        Keyword.selected == True
-    ).scalar() or 0
 
-    return {
-        "today_scanned": today_scanned,
-        "today_sold": today_sold,
-        "week_sold": week_sold,
-        "pending": pending,
-        "keyword_count": keyword_count,
-        "selected_count": selected_count,
-    }
+# /api/keywords で選べるフィールド（Core selectで取得する列）
+KEYWORD_COLUMNS = {
+    "id": Keyword.id,
+    "keyword": Keyword.keyword,
+    "exclude": Keyword.exclude,
+    "selected": Keyword.selected,
+    "source_product_name": Keyword.source_product_name,
+    "source_price": Keyword.source_price,
+    "minutes_to_sell": Keyword.minutes_to_sell,
+    "created_at": Keyword.created_at,
+}
+KEYWORD_FORMATTERS = {
+    "exclude": lambda r: r["exclude"] or "",
+    "source_product_name": lambda r: r["source_product_name"] or "手動追加",
+    "source_price": lambda r: r["source_price"] or "",
+    "created_at": lambda r: isoformat(r["created_at"]),
+}
 
 
 @app.get("/api/keywords")
-def get_keywords(db: Session = Depends(get_db)):
-    """キーワード一覧"""
-    keywords = db.query(Keyword).order_by(Keyword.id.desc()).all()
-    return [
-        {
-            "id": k.id,
-            "keyword": k.keyword,
-            "exclude": k.exclude or "",
-            "selected": k.selected,
-            "source_product_name": k.source_product_name or "手動追加",
-            "source_price": k.source_price or "",
-            "minutes_to_sell": k.minutes_to_sell,
-            "created_at": k.created_at.isoformat() if k.created_at else None,
-        }
-        for k in keywords
-    ]
+def get_keywords(
+    response: Response,
+    limit: int = Query(default=500, ge=1, le=2000),
+    cursor: Optional[str] = Query(default=None),
+    fields: Optional[str] = Query(default=None),
+    selected: Optional[bool] = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    """キーワード一覧（新しい順、続きがあれば X-Next-Cursor ヘッダにカーソル）"""
+    try:
+        names = parse_fields(fields, list(KEYWORD_COLUMNS))
+        after = decode_cursor(cursor, 1)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    # 並び順キー(id)はカーソル生成用に常に取得
+    selected_columns = {name: KEYWORD_COLUMNS[name] for name in ["id", *names]}
+    stmt = select(*[col.label(name) for name, col in selected_columns.items()])
+    if after:
+        stmt = stmt.where(Keyword.id < after[0])
+    if selected is not None:
+        stmt = stmt.where(Keyword.selected == selected)
+    rows = db.execute(stmt.order_by(Keyword.id.desc()).limit(limit + 1)).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return [serialize(r, names, KEYWORD_FORMATTERS) for r in rows]
 
 
 @app.post("/api/keywords")
@@ -134,6 +240,7 @@ def add_keyword(data: KeywordCreate, db: Session = Depends(get_db)):
     db.add(kw)
     db.commit()
     db.refresh(kw)
+    stats.refresh(db)
     return {"id": kw.id, "status": "ok"}
 
 
@@ -152,6 +259,7 @@ def update_keyword(keyword_id: int, data: KeywordUpdate, db: Session = Depends(g
         kw.selected = data.selected
 
     db.commit()
+    stats.refresh(db)
     return {"status": "ok"}
 
 
@@ -164,6 +272,7 @@ def delete_keyword(keyword_id: int, db: Session = Depends(get_db)):
 
     db.delete(kw)
     db.commit()
+    stats.refresh(db)
     return {"status": "ok"}
 
 
@@ -172,105 +281,313 @@ def select_all_keywords(selected: bool = True, db: Session = Depends(get_db)):
     """全選択/全解除"""
     db.query(Keyword).update({Keyword.selected: selected})
     db.commit()
+    stats.refresh(db)
     return {"status": "ok"}
 
 
-@app.get("/api/keywords/export")
-def export_keywords(db: Session = Depends(get_db)):
-    """選択済みキーワードをCSVエクスポート（監視ツール互換）"""
-    keywords = db.query(Keyword).filter(Keyword.selected == True).all()
+@app.get("/api/keywords/preview")
+def preview_keywords(
+    days: int = Query(default=30, ge=1, le=365),
+    since: Optional[datetime] = Query(default=None),
+    category: Optional[str] = Query(default=None),
+    keyword: Optional[str] = Query(default=None),
+    exclude: Optional[str] = Query(default=None),
+    archive: bool = Query(default=True),
+    samples: int = Query(default=3, ge=0, le=20),
+    db: Session = Depends(get_db),
+):
+    """
+    選択中のキーワード（keyword指定時はその1件だけ、未保存でも可）を過去の出品に当てた結果
+    各キーワード: hits, sold, fast, fast_rate（fast/hits）, excluded（除外ワードで外れた数）, samples
+    """
+    if keyword is not None:
+        rules = [{"id": None, "keyword": keyword, "exclude": exclude or ""}]
+    else:
+        rules = [
+            {"id": r.id, "keyword": r.keyword, "exclude": r.exclude or ""}
+            for r in db.execute(
+                select(Keyword.id, Keyword.keyword, Keyword.exclude).where(Keyword.selected == True)
+            )
+        ]
+    since = since or datetime.now() - timedelta(days=days)
+    return keyword_match.preview(db, rules, since, category, include_archive=archive, sample_size=samples)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["keyword", "exclude"])
-    for kw in keywords:
-        writer.writerow([kw.keyword, kw.exclude or ""])
 
-    output.seek(0)
+@app.get("/api/keywords/export")
+def export_keywords():
+    """選択済みキーワードをCSVエクスポート（監視ツール互換）"""
+    stmt = export.keywords_query(selected=True, columns=[Keyword.keyword, Keyword.exclude])
     return StreamingResponse(
-        iter([output.getvalue()]),
+        export.stream(stmt),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=keywords.csv"},
     )
 
 
+@app.get("/api/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(default=False),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+    category: Optional[str] = Query(default=None),
+    status: Optional[str] = Query(default=None),
+    selected: Optional[bool] = Query(default=None),
+    max_minutes: Optional[int] = Query(default=None, ge=0),
+):
+    """
+    ストリーミングエクスポート
+    dataset: keywords / fast-sellers / products（商品履歴そのまま）/ archive（保持期間を過ぎた商品）
+    format: csv / ndjson、gzip=true で gzip 圧縮
+    """
+    if dataset == "keywords":
+        stmt = export.keywords_query(selected=selected)
+    elif dataset == "fast-sellers":
+        stmt = export.fast_sellers_query(since=since, until=until, category=category, max_minutes=max_minutes)
+    elif dataset == "products":
+        stmt = export.products_query(since=since, until=until, category=category, status=status)
+    elif dataset == "archive":
+        stmt = export.archive_query(since=since, until=until, category=category, status=status)
+    else:
+        return {"error": "unknown dataset"}
+
+    name = export.filename(dataset, format, gzip)
+    return StreamingResponse(
+        export.stream(stmt, format, gzip),
+        media_type=export.media_type(format, gzip),
+        headers={"Content-Disposition": f"attachment; filename={name}"},
+    )
+
+
 @app.post("/api/incoming-products")
 def receive_products(products: List[IncomingProduct], db: Session = Depends(get_db)):
     """新着通知ツールから商品リストを受信してDBに保存"""
-    new_count = 0
-    for p in products:
-        existing = db.query(Product).filter(Product.product_id == p.id).first()
-        if not existing:
-            product = Product(
-                product_id=p.id,
-                name=p.name,
-                price=p.price,
-                url=p.url,
-                image_url=p.image_url,
-                status="active",
-            )
-            db.add(product)
-            new_count += 1
-
+    new_count = ingest_products(db, [
+        {
+            "product_id": p.id,
+            "name": p.name,
+            "price": p.price,
+            "url": p.url,
+            "image_url": p.image_url,
+            "category": p.category,
+        }
+        for p in products
+    ])
     db.commit()
+    stats.refresh(db)
     return {"received": len(products), "new": new_count}
 
 
+# /api/fast-sellers で選べるフィールド（category_nameはcategoryから作る）
+FAST_SELLER_COLUMNS = {
+    "id": Product.id,
+    "product_id": Product.product_id,
+    "name": Product.name,
+    "price": Product.price,
+    "price_yen": Product.price_yen,
+    "url": Product.url,
+    "image_url": Product.image_url,
+    "category": Product.category,
+    "minutes_to_sell": Product.minutes_to_sell,
+    "sold_at": Product.sold_at,
+}
+FAST_SELLER_FIELDS = [*FAST_SELLER_COLUMNS, "category_name"]
+FAST_SELLER_FORMATTERS = {
+    "price": lambda r: r["price"] or "",
+    "image_url": lambda r: r["image_url"] or "",
+    "category": lambda r: r["category"] or "hobby",
+    "category_name": lambda r: categories.name_of(r["category"]),
+    "sold_at": lambda r: isoformat(r["sold_at"]),
+}
+
+
 @app.get("/api/fast-sellers")
 def get_fast_sellers(
+    response: Response,
     days: int = Query(default=7, ge=1, le=90),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
     limit: int = Query(default=100, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None),
+    fields: Optional[str] = Query(default=None),
     category: Optional[str] = Query(default=None),
+    min_price: Optional[int] = Query(default=None, ge=0),
+    max_price: Optional[int] = Query(default=None, ge=0),
     db: Session = Depends(get_db),
 ):
-    """即売れ商品一覧"""
-    since = datetime.now() - timedelta(days=days)
-
-    q = db.query(Product).filter(
+    """
+    即売れ商品一覧（売れるまでの分数が短い順）
+    期間は since/until（未指定なら直近days日）、続きがあれば X-Next-Cursor ヘッダにカーソル
+    """
+    try:
+        names = parse_fields(fields, FAST_SELLER_FIELDS)
+        after = decode_cursor(cursor, 2)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    # 並び順キー（minutes_to_sell, id）と派生フィールドの元になる列は常に取得
+    needed = ["minutes_to_sell", "id", *names]
+    if "category_name" in names:
+        needed.append("category")
+    selected_columns = {name: FAST_SELLER_COLUMNS[name] for name in needed if name in FAST_SELLER_COLUMNS}
+
+    stmt = select(*[col.label(name) for name, col in selected_columns.items()]).where(
         Product.status == "sold",
         Product.minutes_to_sell != None,
-        Product.sold_at >= since,
+        Product.sold_at >= (since or datetime.now() - timedelta(days=days)),
     )
+    if until:
+        stmt = stmt.where(Product.sold_at < until)
     if category:
-        q = q.filter(Product.category == category)
+        stmt = stmt.where(Product.category == category)
+    if min_price is not None:
+        stmt = stmt.where(Product.price_yen >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(Product.price_yen <= max_price)
+    if after:
+        minutes, last_id = after
+        stmt = stmt.where(or_(
+            Product.minutes_to_sell > minutes,
+            and_(Product.minutes_to_sell == minutes, Product.id > last_id),
+        ))
+
+    rows = db.execute(
+        stmt.order_by(Product.minutes_to_sell.asc(), Product.id.asc()).limit(limit + 1)
+    ).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].minutes_to_sell, rows[-1].id)
+    return [serialize(r, names, FAST_SELLER_FORMATTERS) for r in rows]
+
+
+@app.get("/api/price-cuts")
+def get_price_cuts(
+    minutes: int = Query(default=60, ge=1, le=60 * 24 * 30),
+    since: Optional[datetime] = Query(default=None),
+    category: Optional[str] = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    値下げされた商品（新しい順、product_events から）
+    各行: 値下げ時刻・値下げ後/前の価格・現在の状態・売れていれば値下げから売れるまでの分数
+    """
+    since = since or datetime.now() - timedelta(minutes=minutes)
+    return product_events.price_cuts(db, since, category, limit)
+
+
+@app.get("/api/analytics")
+def get_analytics(
+    period: str = Query(default="day", pattern="^(hour|day)$"),
+    days: int = Query(default=30, ge=1, le=365),
+    since: Optional[datetime] = Query(default=None),
+    until: Optional[datetime] = Query(default=None),
+    category: Optional[str] = Query(default=None),
+    price_band: Optional[str] = Query(default=None),
+    group_by: str = Query(default="bucket", pattern="^(bucket|category|price_band|hour_of_day)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    売れ行き分析（集計テーブル sell_rollups だけを読む）
+    group_by: bucket（時系列）/ category / price_band / hour_of_day（出品・売れた時刻別）
+    各行: listed, sold, fast, sell_through（sold/listed）, avg/median/p90_minutes
+    """
+    since = since or rollups.bucket_start(datetime.now() - timedelta(days=days), period)
+    rows = rollups.analytics(db, period, since, until, category, price_band, group_by)
+    return {"period": "hour" if group_by == "hour_of_day" else period, "group_by": group_by, "rows": rows}
 
-    sellers = q.order_by(Product.minutes_to_sell.asc()).limit(limit).all()
 
-    return [
-        {
-            "id": s.id,
-            "product_id": s.product_id,
-            "name": s.name,
-            "price": s.price or "",
-            "url": s.url,
-            "image_url": s.image_url or "",
-            "category": s.category or "hobby",
-            "category_name": CATEGORIES.get(s.category or "hobby", {}).get("name", "不明"),
-            "minutes_to_sell": s.minutes_to_sell,
-            "sold_at": s.sold_at.isoformat() if s.sold_at else None,
-        }
-        for s in sellers
-    ]
+@app.get("/api/categories")
+def get_categories(all: bool = False):
+    """監視中のカテゴリ一覧（優先度順、all=trueなら無効なものも含む）"""
+    items = categories.all_categories() if all else categories.enabled()
+    return [{**c, "last_scanned_at": isoformat(c["last_scanned_at"])} for c in items]
+
+
+@app.post("/api/categories")
+def add_category(data: CategoryCreate, db: Session = Depends(get_db)):
+    """カテゴリ追加（スキャンワーカーには CATEGORY_RELOAD 秒以内に反映）"""
+    if not data.url.startswith(("http://", "https://")):
+        return {"error": "invalid url"}
+    if db.query(Category).filter(Category.key == data.key).first():
+        return {"error": "already exists"}
+    db.add(Category(**data.model_dump()))
+    db.commit()
+    categories.invalidate()
+    return {"key": data.key, "status": "ok"}
 
 
-@app.get("/api/categories")
-def get_categories():
-    """監視中のカテゴリ一覧"""
-    return [{"key": k, "name": v["name"]} for k, v in CATEGORIES.items()]
+@app.put("/api/categories/{key}")
+def update_category(key: str, data: CategoryUpdate, db: Session = Depends(get_db)):
+    """カテゴリ更新（名前・URL・スキャン間隔・ページ数・優先度・有効/無効）"""
+    cat = db.query(Category).filter(Category.key == key).first()
+    if not cat:
+        return {"error": "not found"}
+    changes = data.model_dump(exclude_unset=True)
+    if "url" in changes and not (changes["url"] or "").startswith(("http://", "https://")):
+        return {"error": "invalid url"}
+    for name, value in changes.items():
+        setattr(cat, name, value)
+    db.commit()
+    categories.invalidate()
+    return {"status": "ok"}
+
+
+@app.delete("/api/categories/{key}")
+def delete_category(key: str, db: Session = Depends(get_db)):
+    """カテゴリ削除（取得済みの商品は残る）"""
+    cat = db.query(Category).filter(Category.key == key).first()
+    if not cat:
+        return {"error": "not found"}
+    db.delete(cat)
+    db.commit()
+    categories.invalidate()
+    return {"status": "ok"}
+
+
+@app.post("/api/scan", status_code=202)
+def manual_scan(db: Session = Depends(get_db)):
+    """手動スキャン（リースを持つワーカーへ依頼してすぐ返す。待機中・実行中ならその依頼に合流）"""
+    return _request_job(db, "scan")
+
+
+@app.post("/api/check", status_code=202)
+def manual_check(db: Session = Depends(get_db)):
+    """手動チェック（リースを持つワーカーへ依頼してすぐ返す。待機中・実行中ならその依頼に合流）"""
+    return _request_job(db, "check")
+
+
+def _request_job(db: Session, kind: str):
+    job, created = submit_request(db, kind)
+    return {**job, "coalesced": not created}
+
+
+@app.get("/api/jobs")
+def list_jobs(db: Session = Depends(get_db)):
+    """最近のジョブ一覧（手動実行の依頼 + このプロセスで動いたジョブ、新しい順）"""
+    items = recent_requests(db) + [job.to_dict() for job in jobs.recent()]
+    items.sort(key=lambda job: job["created_at"], reverse=True)
+    return items[:JOB_HISTORY]
 
 
-@app.post("/api/scan")
-def manual_scan():
-    """手動スキャン"""
-    result = run_scan()
-    return result
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """ジョブの進捗（done/total, rate, eta_seconds）"""
+    job = jobs.get(job_id)
+    if job:
+        return job.to_dict()
+    data = get_request(db, job_id)
+    if not data:
+        return JSONResponse(status_code=404, content={"error": "not found"})
+    return data
 
 
-@app.post("/api/check")
-def manual_check():
-    """手動チェック"""
-    result = run_check()
-    return result
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheusのスクレイプ用（PROMETHEUS_MULTIPROC_DIR があれば同じホストの全プロセス分を合算）"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/sw.js")
@@ -0,0 +1,172 @@
+"""
+Prometheus メトリクス
+- APIプロセス: /metrics で公開
+- 単独ワーカー（python -m worker）: METRICS_PORT で公開
+
+どこが遅いかを切り分けるための内訳:
+  offmall_fetch_seconds{endpoint,status}    HTTP取得（リトライ込み、ヘッダ受信まで）
+  offmall_parse_seconds{engine}             一覧ページ1枚のパース
+  offmall_listing_pages_total{result}       取得した一覧ページ（unchanged はパース省略）
+  offmall_db_query_seconds{stage}           DBクエリ（スキャン/チェック/API など処理段階別）
+  offmall_pass_seconds / _db_queries{stage} 1回のスキャン・チェック全体とその間のクエリ数
+  offmall_items_total{stage}                処理件数（rate() で件数/秒）
+  offmall_check_backlog / _age_seconds      期限到来済みの未チェック件数と最古の遅れ
+  offmall_api_request_seconds{method,route,status}
+
+チェックの遅れが即売れ判定の窓を超えたらアラート:
+  offmall_check_backlog_age_seconds > offmall_check_backlog_limit_seconds
+
+複数プロセス（uvicorn --workers N、同じホストの埋め込みワーカー）では PROMETHEUS_MULTIPROC_DIR に
+空のディレクトリを指定して起動する（起動前に中身を消す）。各プロセスの値がそこに書かれ、/metrics は
+全プロセスを合算して返す（Gaugeは最後に書いたプロセスの値）。未指定ならプロセスごとのメトリクス
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+    multiprocess, start_http_server,
+)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+FETCH_SECONDS = Histogram(
+    "offmall_fetch_seconds", "オフモールへのHTTPリクエスト時間", ["endpoint", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+PARSE_SECONDS = Histogram(
+    "offmall_parse_seconds", "一覧ページ1枚のパース時間", ["engine"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+LISTING_PAGES = Counter("offmall_listing_pages_total", "取得した一覧ページ（本文が前回と同じならunchanged）", ["result"])
+DB_QUERY_SECONDS = Histogram(
+    "offmall_db_query_seconds", "DBクエリ1回の実行時間", ["stage"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+PASS_SECONDS = Histogram(
+    "offmall_pass_seconds", "スキャン・チェック1回の所要時間", ["stage"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+PASS_DB_QUERIES = Histogram(
+    "offmall_pass_db_queries", "スキャン・チェック1回あたりのDBクエリ数", ["stage"],
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+ITEMS = Counter("offmall_items_total", "処理した商品数", ["stage"])
+PASS_RATE = Gauge(
+    "offmall_pass_items_per_second", "直近のスキャン・チェックの処理速度", ["stage"], multiprocess_mode="mostrecent",
+)
+CHECK_BACKLOG = Gauge("offmall_check_backlog", "チェック期限が来ているactive商品数", multiprocess_mode="mostrecent")
+CHECK_BACKLOG_AGE = Gauge(
+    "offmall_check_backlog_age_seconds", "最も古いチェック期限からの経過秒数", multiprocess_mode="mostrecent",
+)
+CHECK_BACKLOG_LIMIT = Gauge(
+    "offmall_check_backlog_limit_seconds", "即売れ判定の窓（SELL_CHECK_MINUTES）の秒数", multiprocess_mode="max",
+)
+API_SECONDS = Histogram(
+    "offmall_api_request_seconds", "APIハンドラの応答時間（レスポンス開始まで）", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+_local = threading.local()
+
+
+def endpoint_of(url: str) -> str:
+    """URLを低カーディナリティなラベルにする（一覧 / 商品ページ）"""
+    path = urlsplit(url).path
+    if path.startswith("/product/"):
+        return "product"
+    if path.startswith("/cate/"):
+        return "listing"
+    return "other"
+
+
+def current_stage() -> str:
+    return getattr(_local, "stage", "other")
+
+
+@contextmanager
+def stage(name: str):
+    """このスレッドで実行されるDBクエリを name 段階として数え、終了時に1回分の時間・クエリ数を記録"""
+    previous = current_stage()
+    previous_queries = getattr(_local, "queries", 0)
+    _local.stage = name
+    _local.queries = 0
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PASS_SECONDS.labels(name).observe(time.perf_counter() - started)
+        PASS_DB_QUERIES.labels(name).observe(_local.queries)
+        _local.stage = previous
+        _local.queries = previous_queries
+
+
+def record_items(stage_name: str, count: int, elapsed: float):
+    ITEMS.labels(stage_name).inc(count)
+    PASS_RATE.labels(stage_name).set(count / elapsed if elapsed > 0 else 0.0)
+
+
+def record_backlog(count: int, oldest_due, now):
+    CHECK_BACKLOG.set(count)
+    CHECK_BACKLOG_AGE.set(max(0.0, (now - oldest_due.replace(tzinfo=None)).total_seconds()) if oldest_due else 0.0)
+
+
+def instrument_engine(engine):
+    """SQLAlchemyのエンジンにクエリ計測のイベントを付ける"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_SECONDS.labels(current_stage()).observe(time.perf_counter() - context._metrics_started)
+        _local.queries = getattr(_local, "queries", 0) + 1
+
+
+class APIMetricsMiddleware:
+    """ASGIミドルウェア: ルートのパス（/api/jobs/{job_id} など）単位で応答時間を記録（SSEも壊さない）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                API_SECONDS.labels(
+                    scope["method"], getattr(route, "path", "unmatched"), str(message["status"])
+                ).observe(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _registry():
+    """公開するレジストリ（マルチプロセスモードなら PROMETHEUS_MULTIPROC_DIR の全プロセス分を合算）"""
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render():
+    """/metrics のレスポンス本文とContent-Type"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def serve(port: int = METRICS_PORT):
+    """単独ワーカー用のメトリクスHTTPサーバーを開始"""
+    start_http_server(port, registry=_registry())
+    print(f"メトリクス: http://0.0.0.0:{port}/metrics")
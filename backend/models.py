@@ -1,7 +1,7 @@
 """
 データベースモデル定義 - 即売れチェッカー
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, Text, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -15,14 +15,55 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(String(50), unique=True, nullable=False, index=True)
     name = Column(Text, nullable=False)
-    price = Column(String(50), nullable=True)
+    price = Column(String(50), nullable=True)  # 表示用 "1,980円"
+    price_yen = Column(Integer, nullable=True)  # 集計・絞り込み用の数値
     url = Column(Text, nullable=False)
     image_url = Column(Text, nullable=True)
     category = Column(String(50), default="hobby")  # "hobby" / "fishing" etc.
-    status = Column(String(20), default="active")  # "active" / "sold"
+    status = Column(String(20), default="active")  # "active" / "sold" / "removed"
     sold_at = Column(DateTime(timezone=True), nullable=True)
     minutes_to_sell = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    next_check_at = Column(DateTime(timezone=True), nullable=True)  # 次回SOLDチェック予定（NULL=即時）
+    shard = Column(Integer, nullable=True)  # チェック担当の振り分け先（shards.shard_of）
+
+    __table_args__ = (
+        Index("ix_products_status_next_check", "status", "next_check_at"),
+        # シャード分割チェック（担当シャードの期限到来分）
+        Index("ix_products_status_shard_next_check", "status", "shard", "next_check_at"),
+        # 統計・即売れ一覧の絞り込み（status + sold_at範囲、カテゴリ指定時は + category）
+        Index("ix_products_status_sold_at", "status", "sold_at"),
+        Index("ix_products_status_category_sold_at", "status", "category", "sold_at"),
+        # 今日のスキャン件数（created_at範囲）
+        Index("ix_products_created_at", "created_at"),
+        # SQLiteでも最大idを再利用させない（アーカイブへ移した行のidが products_archive / product_events と衝突する）
+        {"sqlite_autoincrement": True},
+    )
+
+
+class ProductArchive(Base):
+    """保持期間を過ぎて products から移した商品（retention参照）"""
+    __tablename__ = "products_archive"
+
+    id = Column(Integer, primary_key=True)  # products.id をそのまま引き継ぐ
+    product_id = Column(String(50), nullable=False, index=True)
+    name = Column(Text, nullable=False)
+    price = Column(String(50), nullable=True)
+    price_yen = Column(Integer, nullable=True)
+    url = Column(Text, nullable=False)
+    image_url = Column(Text, nullable=True)
+    category = Column(String(50), nullable=True)
+    status = Column(String(20), nullable=False)  # "sold" / "removed" / "expired"（チェック打ち切り）
+    sold_at = Column(DateTime(timezone=True), nullable=True)
+    minutes_to_sell = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        # 売れ行き集計（rollups）の時間帯ごとの読み出し: 出品（created_at範囲）と売れた商品（status + sold_at範囲）
+        Index("ix_products_archive_created_at", "created_at"),
+        Index("ix_products_archive_status_sold_at", "status", "sold_at"),
+    )
 
 
 class Keyword(Base):
@@ -30,10 +71,117 @@ class Keyword(Base):
     __tablename__ = "keywords"
 
     id = Column(Integer, primary_key=True, index=True)
-    keyword = Column(String(255), nullable=False)
+    keyword = Column(String(255), nullable=False, index=True)
     exclude = Column(Text, nullable=True)
     selected = Column(Boolean, default=True)
     source_product_name = Column(Text, nullable=True)
     source_price = Column(String(50), nullable=True)
     minutes_to_sell = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class KeywordTerm(Base):
+    """商品名の語ごとの出品数・即売れ数（keyword_engineの転置インデックス。term="" は全体の合計）"""
+    __tablename__ = "keyword_terms"
+
+    term = Column(String(100), primary_key=True)
+    listed_count = Column(Integer, nullable=False, default=0)
+    fast_count = Column(Integer, nullable=False, default=0)
+
+
+class Lease(Base):
+    """プロセス間の排他用リース（期限切れなら他プロセスが引き継ぐ）"""
+    __tablename__ = "leases"
+
+    name = Column(String(100), primary_key=True)  # "scheduler" など
+    owner = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # UTC
+
+
+class Category(Base):
+    """監視カテゴリ（/api/categories で追加・変更すると、再起動なしでスキャン対象に反映）"""
+    __tablename__ = "categories"
+
+    key = Column(String(50), primary_key=True)  # products.category に入る値
+    name = Column(String(100), nullable=False)
+    url = Column(Text, nullable=False)  # 一覧ページのURL（新着順パラメータは付けない）
+    scan_interval = Column(Integer, nullable=True)  # スキャン間隔（秒、NULL=SCAN_INTERVAL）
+    max_pages = Column(Integer, nullable=True)  # 1回に遡るページ数（NULL=SCAN_MAX_PAGES）
+    priority = Column(Integer, default=0)  # 大きいほど先にスキャン
+    enabled = Column(Boolean, default=True)
+    last_scanned_at = Column(DateTime, nullable=True)
+    high_water = Column(BigInteger, nullable=True)  # 新着スキャンを最後まで読めた時点の最新商品ID（打ち切り位置）
+    resume_page = Column(Integer, nullable=True)  # max_pages 内に読み切れなかった新着スキャンの続き（最後に読んだページ）
+    resume_top = Column(BigInteger, nullable=True)  # その時点までに見た最新商品ID（続きを読み切ったら high_water になる）
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ProductEvent(Base):
+    """商品の価格・状態の変化の履歴（追記のみ。product_events参照）"""
+    __tablename__ = "product_events"
+
+    id = Column(Integer, primary_key=True)
+    product_ref = Column(Integer, nullable=False)  # products.id（アーカイブ後も products_archive.id で引ける）
+    ts = Column(DateTime, nullable=False)
+    event_type = Column(String(12), nullable=False)  # "listed" / "price_cut" / "price_raise" / "relisted" / "reappeared" / "sold" / "removed"
+    price_yen = Column(Integer, nullable=True)  # その時点の価格
+
+    __table_args__ = (
+        # 直近の値下げ一覧（event_type + ts範囲）
+        Index("ix_product_events_type_ts", "event_type", "ts"),
+        # 商品ごとの履歴（値下げから売れるまでの時間など）
+        Index("ix_product_events_product_ts", "product_ref", "ts"),
+    )
+
+
+class JobRun(Base):
+    """手動スキャン・チェックの依頼（APIが queued で作り、リースを持つワーカーが実行して進捗・結果を書く）"""
+    __tablename__ = "job_runs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(20), nullable=False)  # "scan" / "check"
+    status = Column(String(20), nullable=False)  # "queued" / "running" / "done" / "failed"
+    done = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    owner = Column(String(100), nullable=True)  # 実行したワーカー（lease.OWNER_ID）
+    requested_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_job_runs_status_kind", "status", "kind"),
+    )
+
+
+class ListingPage(Base):
+    """一覧ページの本文ハッシュ（fingerprints参照。同じ内容ならパースしない）"""
+    __tablename__ = "listing_pages"
+
+    url = Column(String(500), primary_key=True)  # 新着順・ページ番号込みのURL
+    content_hash = Column(String(32), nullable=False)  # script等を除いた本文のblake2b
+    product_count = Column(Integer, nullable=True)
+    changed_at = Column(DateTime, nullable=False)  # 最後に内容が変わった（保存した）時刻
+
+
+class SellRollup(Base):
+    """時間帯・カテゴリ・価格帯ごとの出品数と売れ行きの集計（rollups参照）"""
+    __tablename__ = "sell_rollups"
+
+    id = Column(Integer, primary_key=True)
+    period = Column(String(10), nullable=False)  # "hour" / "day"
+    bucket_start = Column(DateTime, nullable=False)
+    category = Column(String(50), nullable=False)
+    price_band = Column(String(20), nullable=False)  # "1000-2999" など（rollups.PRICE_BANDS）
+    listed_count = Column(Integer, default=0)  # この時間帯に出品された数
+    sold_count = Column(Integer, default=0)  # この時間帯に売れた数
+    fast_count = Column(Integer, default=0)  # うちSELL_CHECK_MINUTES以内に売れた数
+    minutes_sum = Column(Integer, default=0)
+    median_minutes = Column(Integer, nullable=True)
+    p90_minutes = Column(Integer, nullable=True)
+    minutes_hist = Column(Text, nullable=True)  # 売れるまでの分数のヒストグラム（JSON、MINUTE_BINS区切り）
+
+    __table_args__ = (
+        UniqueConstraint("period", "bucket_start", "category", "price_band", name="uq_sell_rollups_bucket"),
+    )
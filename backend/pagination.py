@@ -0,0 +1,48 @@
+"""
+一覧APIのカーソル（keyset）ページングとフィールド指定
+- カーソルは並び順キーの値を "." でつないだ文字列（例: "12.3456" = 分数12, id 3456）
+- fields= はカンマ区切り。指定された列だけをCore selectで取得する
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: int) -> str:
+    return ".".join(str(v) for v in values)
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[int]]:
+    """カーソルを整数のリストに戻す。不正ならValueError"""
+    if not cursor:
+        return None
+    parts = cursor.split(".")
+    if len(parts) != size:
+        raise ValueError("invalid cursor")
+    return [int(p) for p in parts]
+
+
+def parse_fields(fields: Optional[str], available: Sequence[str]) -> List[str]:
+    """fields= を検証して返す（未指定なら全フィールド）。未知のフィールドはValueError"""
+    if not fields:
+        return list(available)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in available]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def serialize(row, fields: Sequence[str], formatters: Dict[str, Callable]) -> Dict:
+    """Core selectの結果行から指定フィールドだけのdictを作る"""
+    mapping = row._mapping
+    out = {}
+    for name in fields:
+        formatter = formatters.get(name)
+        out[name] = formatter(mapping) if formatter else mapping[name]
+    return out
+
+
+def isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
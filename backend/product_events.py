@@ -0,0 +1,109 @@
+"""
+商品の価格・状態の変化の履歴（product_events）
+products は最新の価格と状態しか持たないので、値下げ・再出品・売れた/消えたをここに追記する
+- スキャン: listed（新規登録、出品時の価格）、price_cut / price_raise（一覧の価格が変わった既知の商品）、
+  relisted（削除済みの商品が一覧に戻った）、reappeared（売れた商品が一覧に載っていた。反映遅れか
+  キャンセル後の再出品なので状態は sold のまま、売れてから最初の1回だけ）
+- チェック: sold / removed
+書き込みはスキャン・チェックのバッチごとに1回の executemany（commitは呼び出し側）
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, literal, or_, select
+from models import Product, ProductArchive, ProductEvent
+
+LISTED = "listed"
+PRICE_CUT = "price_cut"
+PRICE_RAISE = "price_raise"
+RELISTED = "relisted"
+REAPPEARED = "reappeared"
+SOLD = "sold"
+REMOVED = "removed"
+
+PRODUCT_EVENTS_DAYS = int(os.getenv("PRODUCT_EVENTS_DAYS", "90"))  # 保持日数（retentionで削除）
+
+
+def event(product_ref: int, event_type: str, ts: datetime, price_yen: Optional[int]) -> Dict:
+    return {"product_ref": product_ref, "event_type": event_type, "ts": ts, "price_yen": price_yen}
+
+
+def price_change_type(old_price: Optional[int], new_price: Optional[int]) -> Optional[str]:
+    if old_price is None or new_price is None or old_price == new_price:
+        return None
+    return PRICE_CUT if new_price < old_price else PRICE_RAISE
+
+
+def record(db, events: List[Dict]):
+    if events:
+        db.execute(insert(ProductEvent), events)
+
+
+def record_listed(db, product_ids: List[str], ts: datetime):
+    """登録した商品の listed を products から INSERT ... SELECT で作る（idを取りに行かない）"""
+    if product_ids:
+        db.execute(insert(ProductEvent).from_select(
+            ["product_ref", "event_type", "ts", "price_yen"],
+            select(Product.id, literal(LISTED), literal(ts), Product.price_yen)
+            .where(Product.product_id.in_(product_ids)),
+        ))
+
+
+def prune(db, now: datetime) -> int:
+    """保持日数を過ぎた履歴を削除（commitは呼び出し側）"""
+    result = db.execute(delete(ProductEvent).where(ProductEvent.ts < now - timedelta(days=PRODUCT_EVENTS_DAYS)))
+    return result.rowcount or 0
+
+
+def price_cuts(db, since: datetime, category: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """
+    since 以降の値下げ（新しい順）。値下げ前の価格と、その後に売れていれば値下げから売れるまでの分数付き
+    商品はアーカイブに移っていても引く（products_archive.id は products.id と同じ）
+    """
+    def column(name):
+        return func.coalesce(getattr(Product, name), getattr(ProductArchive, name)).label(name)
+
+    stmt = (
+        select(
+            ProductEvent.product_ref, ProductEvent.ts, ProductEvent.price_yen,
+            *(column(name) for name in ("product_id", "name", "url", "image_url", "category", "status")),
+        )
+        .outerjoin(Product, Product.id == ProductEvent.product_ref)
+        .outerjoin(ProductArchive, ProductArchive.id == ProductEvent.product_ref)
+        .where(ProductEvent.event_type == PRICE_CUT, ProductEvent.ts >= since,
+               or_(Product.id != None, ProductArchive.id != None))
+    )
+    if category:
+        stmt = stmt.where(func.coalesce(Product.category, ProductArchive.category) == category)
+    rows = db.execute(stmt.order_by(ProductEvent.ts.desc()).limit(limit)).all()
+
+    # 値下げ前の価格は同じ商品の直前のイベント（listed か前回の価格変更）
+    refs = [r.product_ref for r in rows]
+    history: Dict[int, List] = {}
+    if refs:
+        for ref, ts, event_type, price_yen in db.execute(
+            select(ProductEvent.product_ref, ProductEvent.ts, ProductEvent.event_type, ProductEvent.price_yen)
+            .where(ProductEvent.product_ref.in_(set(refs)))
+            .order_by(ProductEvent.product_ref, ProductEvent.ts)
+        ):
+            history.setdefault(ref, []).append((ts, event_type, price_yen))
+
+    result = []
+    for r in rows:
+        events = history.get(r.product_ref, [])
+        before = [e for e in events if e[0] < r.ts and e[2] is not None]
+        sold_at = next((e[0] for e in events if e[1] == SOLD and e[0] >= r.ts), None)
+        result.append({
+            "product_id": r.product_id,
+            "name": r.name,
+            "url": r.url,
+            "image_url": r.image_url or "",
+            "category": r.category or "hobby",
+            "cut_at": r.ts.isoformat(),
+            "price_yen": r.price_yen,
+            "previous_price_yen": before[-1][2] if before else None,
+            "status": r.status,
+            "minutes_to_sell_after_cut": int((sold_at - r.ts).total_seconds() // 60) if sold_at else None,
+        })
+    return result
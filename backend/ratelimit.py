@@ -0,0 +1,55 @@
+"""
+ホスト単位のレートリミッター（トークンバケット）
+スキャン・チェックの全リクエストが同じホスト別バケットを共有する
+"""
+import os
+import time
+import threading
+from typing import Dict
+from urllib.parse import urlparse
+
+HOST_RATE_LIMIT = float(os.getenv("HOST_RATE_LIMIT", "4"))  # 1ホストあたり毎秒リクエスト数
+HOST_BURST = int(os.getenv("HOST_BURST", "4"))
+
+
+class TokenBucket:
+    """トークンバケット: rate個/秒で補充、最大burst個まで溜まる"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ消費する。足りなければ補充されるまで待つ"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 先に予約してからロック外で待つ（待ち順に公平に払い出される）
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(url: str) -> TokenBucket:
+    """URLのホストに対応するバケットを返す（無ければ作成）"""
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(HOST_RATE_LIMIT, HOST_BURST)
+            _buckets[host] = bucket
+        return bucket
+
+
+def throttle(url: str):
+    """リクエスト前に呼ぶ: ホストのレート制限に従って待機"""
+    bucket_for(url).acquire()
@@ -0,0 +1,103 @@
+"""
+別プロセスのワーカーが書いた結果をSSEへ中継する
+ワーカーが単独プロセス（python -m worker）で動いているとき、APIプロセスの broker には
+publish されないので、購読者がいる間だけDBを短い間隔でポーリングして新着分を配信する
+このプロセス自身がリーダー（埋め込みワーカーが動いている）なら何もしない
+
+位置は連番（売れた商品は product_events の sold の id、キーワードは id）で持つ。
+sold_at は検出時刻なので、チェックのcommitが遅れると前回の位置より古い時刻の行が後から見えて漏れる。
+連番でも採番とcommitの順は前後しうるので、位置は RELAY_GAP_SECONDS 前に見えていた最大idまでしか
+進めず、その先は配信済みのidを覚えて読み直す（遅れてcommitされた小さいidも拾う）
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import func, select
+from database import SessionLocal
+from models import Product, ProductEvent, Keyword
+import stats
+from events import broker, fast_seller_event, keyword_event
+from scheduler import SELL_CHECK_MINUTES
+import product_events
+
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "3"))
+RELAY_BATCH = 100
+RELAY_GAP_SECONDS = float(os.getenv("RELAY_GAP_SECONDS", "60"))  # 遅れてcommitされる行を待つ秒数
+
+
+class IdCursor:
+    """
+    id > position の未配信行を読む位置。position は RELAY_GAP_SECONDS 前に見えていた最大id で、
+    それより後に読んだidは seen に持って二重に配信しない
+    """
+
+    def __init__(self, position: int):
+        self.position = position
+        self.seen = set()
+        self._marks = deque()  # (時刻, その時点で見えていた最大id)
+
+    def advance(self, ids: Iterable[int], now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self.seen.update(ids)
+        self._marks.append((now, max(self.seen, default=self.position)))
+        while self._marks and now - self._marks[0][0] >= RELAY_GAP_SECONDS:
+            self.position = max(self.position, self._marks.popleft()[1])
+        self.seen = {i for i in self.seen if i > self.position}
+
+    def unseen(self, column):
+        """位置より後で未配信の行の条件"""
+        cond = column > self.position
+        return cond & column.notin_(self.seen) if self.seen else cond
+
+
+def start_event_relay(is_local_leader: Callable[[], bool] = lambda: False):
+    """中継スレッドを開始"""
+    def loop():
+        keywords = sellers = None
+        while True:
+            time.sleep(EVENTS_POLL_INTERVAL)
+            if not broker.has_subscribers() or is_local_leader():
+                # 配信先が無い間・自前で配信している間は位置だけ捨てて、再開時に最新から始める
+                keywords = sellers = None
+                continue
+            db = SessionLocal()
+            try:
+                if keywords is None:
+                    keywords = IdCursor(db.scalar(select(func.max(Keyword.id))) or 0)
+                    sellers = IdCursor(db.scalar(select(func.max(ProductEvent.id))) or 0)
+                    continue
+                _relay_once(db, keywords, sellers)
+                # スキャンで増えた件数なども反映するため毎回（変化分だけが配信される）
+                stats.refresh(db)
+            except Exception as e:
+                print(f"イベント中継エラー: {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def _relay_once(db, keywords: IdCursor, sellers: IdCursor):
+    """前回以降に記録された即売れ商品（sold イベント）・キーワードを配信し、位置を進める"""
+    rows = db.execute(
+        select(ProductEvent.id, Product)
+        .join(Product, Product.id == ProductEvent.product_ref)
+        .where(ProductEvent.event_type == product_events.SOLD, sellers.unseen(ProductEvent.id))
+        .order_by(ProductEvent.id).limit(RELAY_BATCH)
+    ).all()
+    for _, p in rows:
+        if p.minutes_to_sell is not None and p.minutes_to_sell <= SELL_CHECK_MINUTES:
+            broker.publish("fast_seller", fast_seller_event(p, p.minutes_to_sell, p.sold_at))
+    sellers.advance(event_id for event_id, _ in rows)
+
+    rows = db.execute(
+        select(Keyword).where(keywords.unseen(Keyword.id)).order_by(Keyword.id).limit(RELAY_BATCH)
+    ).scalars().all()
+    for kw in rows:
+        broker.publish("keyword", keyword_event(kw))
+    keywords.advance(kw.id for kw in rows)
@@ -0,0 +1,106 @@
+"""
+商品の保持期間（products を小さく保つ）
+期間を過ぎた行を products_archive へ移し、products から消す
+- sold:    売れてから RETAIN_SOLD_DAYS 日（既定90日 = /api/fast-sellers の最大期間）
+- removed: 出品から RETAIN_REMOVED_DAYS 日
+- active:  出品から STALE_ACTIVE_DAYS 日たっても売れない商品はチェックを打ち切り、"expired" として移す
+アーカイブは /api/export/archive でCSV / NDJSON（gzip可）として取り出せる
+product_events は PRODUCT_EVENTS_DAYS 日を過ぎたものを削除する
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import and_, case, delete, insert, literal, or_, select
+from database import SessionLocal
+from models import Product, ProductArchive
+import metrics
+import product_events
+
+RETAIN_SOLD_DAYS = int(os.getenv("RETAIN_SOLD_DAYS", "90"))
+RETAIN_REMOVED_DAYS = int(os.getenv("RETAIN_REMOVED_DAYS", "7"))
+STALE_ACTIVE_DAYS = int(os.getenv("STALE_ACTIVE_DAYS", "30"))
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+ARCHIVE_CHUNK = 1000
+
+_ARCHIVED_COLUMNS = [
+    "id", "product_id", "name", "price", "price_yen", "url", "image_url", "category",
+    "sold_at", "minutes_to_sell", "created_at",
+]
+
+
+def expired_filter(now: datetime):
+    """保持期間を過ぎた products の条件"""
+    return or_(
+        and_(Product.status == "sold", Product.sold_at < now - timedelta(days=RETAIN_SOLD_DAYS)),
+        and_(Product.status == "removed", Product.created_at < now - timedelta(days=RETAIN_REMOVED_DAYS)),
+        and_(Product.status == "active", Product.created_at < now - timedelta(days=STALE_ACTIVE_DAYS)),
+    )
+
+
+def run_retention(progress=None, now: Optional[datetime] = None,
+                  should_continue: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    期限切れの行をARCHIVE_CHUNK件ずつアーカイブへ移す（1チャンクごとにcommit）
+    should_continue を渡すと、チャンクの前に呼んでFalseならそこで打ち切る（リースを失ったときなど）
+    """
+    with metrics.stage("retention"):
+        return _retention_pass(progress, now or datetime.now(), should_continue)
+
+
+def _retention_pass(progress, now: datetime, should_continue=None) -> Dict:
+    db = SessionLocal()
+    started = time.monotonic()
+    moved = {"sold": 0, "removed": 0, "expired": 0}
+    pruned = 0
+    stopped = False
+    try:
+        last_id = 0
+        while True:
+            if should_continue is not None and not should_continue():
+                print("アーカイブ中断")
+                stopped = True
+                break
+            rows = db.execute(
+                select(Product.id, Product.status)
+                .where(expired_filter(now), Product.id > last_id)
+                .order_by(Product.id).limit(ARCHIVE_CHUNK)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            ids = [row.id for row in rows]
+
+            # INSERT ... SELECT と DELETE を同じトランザクションで（途中で落ちても二重にも欠けもしない）
+            source = select(
+                *(getattr(Product, name) for name in _ARCHIVED_COLUMNS),
+                case((Product.status == "active", "expired"), else_=Product.status).label("status"),
+                literal(now).label("archived_at"),
+            ).where(Product.id.in_(ids))
+            db.execute(insert(ProductArchive).from_select([*_ARCHIVED_COLUMNS, "status", "archived_at"], source))
+            db.execute(delete(Product).where(Product.id.in_(ids)))
+            db.commit()
+
+            for row in rows:
+                moved["expired" if row.status == "active" else row.status] += 1
+            if progress:
+                progress(sum(moved.values()))
+        if not stopped:
+            pruned = product_events.prune(db, now)
+            db.commit()
+    except Exception as e:
+        print(f"アーカイブエラー: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+    total = sum(moved.values())
+    elapsed = time.monotonic() - started
+    metrics.record_items("retention", total, elapsed)
+    if total:
+        print(f"アーカイブ: {total}件 (sold {moved['sold']}, removed {moved['removed']}, "
+              f"チェック打ち切り {moved['expired']}) {elapsed:.1f}秒")
+    if pruned:
+        print(f"商品履歴: {pruned}件削除（{product_events.PRODUCT_EVENTS_DAYS}日超）")
+    return {**moved, "archived": total, "events_pruned": pruned, "elapsed": round(elapsed, 1)}
@@ -0,0 +1,270 @@
+"""
+売れ行きの時間別・日別集計（sell_rollups）
+run_check のあとに、前回集計した最新の時間帯の1つ前以降の時間別バケットだけを products（+アーカイブ）から作り直し、
+日別バケットはその日の時間別バケットを足し合わせて作る（商品を1日分読み直さない）
+/api/analytics はこの集計だけを読むので、90日分の推移でも数百行で済む
+
+中央値・p90 は時間別の行は正確な値を持つ。日別の行と、複数行をまとめるとき（カテゴリ合算・時刻別など）は
+分数のヒストグラム（MINUTE_BINS区切り）を足し合わせて求める（値はビンの上端）
+"""
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from sqlalchemy.dialects import sqlite
+from database import SessionLocal
+from models import Product, ProductArchive, SellRollup
+from lease import try_acquire, release
+from scheduler import SELL_CHECK_MINUTES
+import metrics
+
+ROLLUP_DAYS = int(os.getenv("ROLLUP_DAYS", "90"))  # 初回に遡って集計する日数
+ROLLUP_LEASE = "rollup"
+
+# 価格帯の境界（円）。最後は上限なし
+PRICE_BANDS = [0, 1000, 3000, 10000, 30000]
+# 売れるまでの分数のヒストグラムの上端（最後のビンは1440分超）
+MINUTE_BINS = [1, 2, 3, 5, 10, 15, 20, 30, 45, 60, 120, 240, 480, 1440]
+
+PERIODS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# 範囲の境界は秒単位で渡す。SQLiteの日時は文字列比較で、CURRENT_TIMESTAMP（created_at）は小数秒なしなので、
+# 既定の ".000000" 付きで渡すとちょうど境界の時刻の行がどちらの時間帯にも入らない
+_SECONDS = DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
+
+def price_band(price_yen: Optional[int]) -> str:
+    if price_yen is None:
+        return "unknown"
+    for low, high in zip(PRICE_BANDS, PRICE_BANDS[1:]):
+        if price_yen < high:
+            return f"{low}-{high - 1}"
+    return f"{PRICE_BANDS[-1]}+"
+
+
+def bucket_start(ts: datetime, period: str) -> datetime:
+    ts = ts.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if period == "day" else ts
+
+
+def refresh(now: Optional[datetime] = None) -> Dict:
+    """前回の最新バケットの1つ前以降を作り直す（同時に走るのは1プロセスだけ）"""
+    now = now or datetime.now()
+    db = SessionLocal()
+    started = time.monotonic()
+    try:
+        if not try_acquire(db, ROLLUP_LEASE, ttl=300):
+            return {"skipped": True}
+        with metrics.stage("rollup"):
+            since = _resume_point(db, now)
+            buckets = 0
+            # 1日ずつ（その日の since 以降の時間別 + 時間別から日別）
+            day = bucket_start(since, "day")
+            while day <= now:
+                buckets += _rebuild_day(db, day, max(since, day))
+                db.commit()
+                day += PERIODS["day"]
+        return {"buckets": buckets, "since": since.isoformat(), "elapsed": round(time.monotonic() - started, 2)}
+    except Exception as e:
+        print(f"集計エラー: {e}")
+        db.rollback()
+        return {"error": str(e)}
+    finally:
+        try:
+            release(db, ROLLUP_LEASE)
+        except Exception:
+            db.rollback()
+        db.close()
+
+
+def _resume_point(db, now: datetime) -> datetime:
+    """
+    作り直しの開始時刻（最新の時間別バケットの1つ前から。無ければROLLUP_DAYS日前）
+    sold_at はチェックで検出した時刻で、コミットはバッチの終わりなので、集計後に前の時間帯へ入る行がある
+    """
+    latest = db.scalar(select(func.max(SellRollup.bucket_start)).where(SellRollup.period == "hour"))
+    if latest is None:
+        return bucket_start(now - timedelta(days=ROLLUP_DAYS), "day")
+    return bucket_start(latest - max(PERIODS["hour"], timedelta(minutes=SELL_CHECK_MINUTES)), "hour")
+
+
+def _rebuild_day(db, day: datetime, since: datetime) -> int:
+    """day のうち since 以降の時間別バケットを作り直し、その日の時間別バケットから日別バケットを作る"""
+    start = max(since, day)
+    end = day + PERIODS["day"]
+    lower, upper = _at(start), _at(end)
+    groups = defaultdict(_empty)
+
+    for table in (Product, ProductArchive):
+        for created_at, category, price_yen in db.execute(
+            select(table.created_at, table.category, table.price_yen)
+            .where(table.created_at >= lower, table.created_at < upper)
+        ):
+            groups[(bucket_start(created_at, "hour"), category or "hobby", price_band(price_yen))]["listed"] += 1
+
+        for sold_at, category, price_yen, minutes in db.execute(
+            select(table.sold_at, table.category, table.price_yen, table.minutes_to_sell)
+            .where(table.status == "sold", table.minutes_to_sell != None,
+                   table.sold_at >= lower, table.sold_at < upper)
+        ):
+            groups[(bucket_start(sold_at, "hour"), category or "hobby", price_band(price_yen))]["minutes"].append(minutes)
+
+    db.execute(delete(SellRollup).where(
+        SellRollup.period == "hour", SellRollup.bucket_start >= start, SellRollup.bucket_start < end))
+    rows = [_to_row("hour", key, value) for key, value in groups.items()]
+    if rows:
+        db.execute(insert(SellRollup), rows)
+    return len(rows) + _merge_day(db, day)
+
+
+def _at(ts: datetime):
+    """秒単位の日時のバインド値（_SECONDS参照）"""
+    return literal(ts.replace(microsecond=0), _SECONDS)
+
+
+def _merge_day(db, day: datetime) -> int:
+    """その日の時間別バケットをカテゴリ・価格帯ごとに足し合わせて日別バケットを置き換える"""
+    merged: Dict = {}
+    for row in db.execute(select(SellRollup).where(
+        SellRollup.period == "hour", SellRollup.bucket_start >= day, SellRollup.bucket_start < day + PERIODS["day"],
+    )).scalars():
+        entry = merged.setdefault((row.category, row.price_band), {
+            "listed": 0, "sold": 0, "fast": 0, "minutes_sum": 0, "hist": [0] * (len(MINUTE_BINS) + 1),
+        })
+        entry["listed"] += row.listed_count or 0
+        entry["sold"] += row.sold_count or 0
+        entry["fast"] += row.fast_count or 0
+        entry["minutes_sum"] += row.minutes_sum or 0
+        if row.minutes_hist:
+            entry["hist"] = [a + b for a, b in zip(entry["hist"], json.loads(row.minutes_hist))]
+
+    db.execute(delete(SellRollup).where(SellRollup.period == "day", SellRollup.bucket_start == day))
+    rows = [
+        {
+            "period": "day",
+            "bucket_start": day,
+            "category": category,
+            "price_band": band,
+            "listed_count": entry["listed"],
+            "sold_count": entry["sold"],
+            "fast_count": entry["fast"],
+            "minutes_sum": entry["minutes_sum"],
+            "median_minutes": _hist_percentile(entry["hist"], 50),
+            "p90_minutes": _hist_percentile(entry["hist"], 90),
+            "minutes_hist": json.dumps(entry["hist"]),
+        }
+        for (category, band), entry in merged.items()
+    ]
+    if rows:
+        db.execute(insert(SellRollup), rows)
+    return len(rows)
+
+
+def _empty():
+    return {"listed": 0, "minutes": []}
+
+
+def _to_row(period: str, key, value) -> Dict:
+    start, category, band = key
+    minutes = sorted(value["minutes"])
+    return {
+        "period": period,
+        "bucket_start": start,
+        "category": category,
+        "price_band": band,
+        "listed_count": value["listed"],
+        "sold_count": len(minutes),
+        "fast_count": sum(1 for m in minutes if m <= SELL_CHECK_MINUTES),
+        "minutes_sum": sum(minutes),
+        "median_minutes": _percentile(minutes, 50),
+        "p90_minutes": _percentile(minutes, 90),
+        "minutes_hist": json.dumps(_histogram(minutes)),
+    }
+
+
+def _percentile(sorted_values: List[int], p: float) -> Optional[int]:
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _histogram(minutes: List[int]) -> List[int]:
+    hist = [0] * (len(MINUTE_BINS) + 1)
+    for m in minutes:
+        i = 0
+        while i < len(MINUTE_BINS) and m > MINUTE_BINS[i]:
+            i += 1
+        hist[i] += 1
+    return hist
+
+
+def _hist_percentile(hist: List[int], p: float) -> Optional[int]:
+    total = sum(hist)
+    if not total:
+        return None
+    rank = max(1, -(-total * p // 100))
+    seen = 0
+    for i, count in enumerate(hist):
+        seen += count
+        if seen >= rank:
+            # 最後のビン（1440分超）は下端で代用
+            return MINUTE_BINS[min(i, len(MINUTE_BINS) - 1)]
+    return None
+
+
+# ========== 読み出し ==========
+
+def analytics(db, period: str, since: datetime, until: Optional[datetime] = None,
+              category: Optional[str] = None, band: Optional[str] = None,
+              group_by: str = "bucket") -> List[Dict]:
+    """集計行を group_by 単位にまとめる（hour_of_day は時間別集計を時刻0〜23でまとめる）"""
+    if group_by == "hour_of_day":
+        period = "hour"
+    stmt = select(SellRollup).where(SellRollup.period == period, SellRollup.bucket_start >= since)
+    if until:
+        stmt = stmt.where(SellRollup.bucket_start < until)
+    if category:
+        stmt = stmt.where(SellRollup.category == category)
+    if band:
+        stmt = stmt.where(SellRollup.price_band == band)
+
+    merged: Dict = {}
+    for row in db.execute(stmt.order_by(SellRollup.bucket_start)).scalars():
+        if group_by == "bucket":
+            key = row.bucket_start.isoformat()
+        elif group_by == "hour_of_day":
+            key = row.bucket_start.hour
+        else:
+            key = getattr(row, group_by)
+        entry = merged.setdefault(key, {"rows": [], "hist": [0] * (len(MINUTE_BINS) + 1)})
+        entry["rows"].append(row)
+        if row.minutes_hist:
+            entry["hist"] = [a + b for a, b in zip(entry["hist"], json.loads(row.minutes_hist))]
+
+    return [_summarize(group_by, key, entry) for key, entry in sorted(merged.items())]
+
+
+def _summarize(group_by: str, key, entry: Dict) -> Dict:
+    rows = entry["rows"]
+    listed = sum(r.listed_count or 0 for r in rows)
+    sold = sum(r.sold_count or 0 for r in rows)
+    single = rows[0] if len(rows) == 1 else None
+    return {
+        group_by: key,
+        "listed": listed,
+        "sold": sold,
+        "fast": sum(r.fast_count or 0 for r in rows),
+        "sell_through": round(sold / listed, 3) if listed else None,
+        "avg_minutes": round(sum(r.minutes_sum or 0 for r in rows) / sold, 1) if sold else None,
+        "median_minutes": single.median_minutes if single else _hist_percentile(entry["hist"], 50),
+        "p90_minutes": single.p90_minutes if single else _hist_percentile(entry["hist"], 90),
+    }
@@ -0,0 +1,65 @@
+"""
+SOLDチェックのスケジューラ
+products.next_check_at を「次回チェック予定時刻」とする優先度キューとして扱う
+- 出品直後（SELL_CHECK_MINUTES以内）: CHECK_MIN_INTERVAL秒ごと
+- それ以降: 経過時間に応じて指数的に間隔を広げ、CHECK_MAX_INTERVAL秒で頭打ち
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, or_
+from models import Product
+
+SELL_CHECK_MINUTES = int(os.getenv("SELL_CHECK_MINUTES", "30"))
+CHECK_MIN_INTERVAL = int(os.getenv("CHECK_MIN_INTERVAL", "60"))
+CHECK_MAX_INTERVAL = int(os.getenv("CHECK_MAX_INTERVAL", "10800"))
+
+
+def next_check_delay(created_at: Optional[datetime], now: datetime) -> int:
+    """次回チェックまでの秒数（出品からの経過時間で決まる）"""
+    if created_at is None:
+        return CHECK_MIN_INTERVAL
+    age_minutes = (now - created_at.replace(tzinfo=None)).total_seconds() / 60
+    windows = int(age_minutes // SELL_CHECK_MINUTES)
+    if windows <= 0:
+        return CHECK_MIN_INTERVAL
+    # 即売れ判定の窓を1つ過ぎるごとに間隔を倍にする
+    delay = CHECK_MIN_INTERVAL * (2 ** min(windows, 32))
+    return min(delay, CHECK_MAX_INTERVAL)
+
+
+def next_check_at(created_at: Optional[datetime], now: datetime) -> datetime:
+    """次回チェック予定時刻"""
+    return now + timedelta(seconds=next_check_delay(created_at, now))
+
+
+def due_filter(now: datetime):
+    """チェック期限が来たactive商品の条件（next_check_atがNULLの商品は即時）"""
+    return [
+        Product.status == "active",
+        or_(Product.next_check_at == None, Product.next_check_at <= now),
+    ]
+
+
+def backlog(db, now: datetime):
+    """期限到来済みのactive商品数と、最も古いチェック期限（NULLは出品時刻で代用）"""
+    count, oldest = db.query(
+        func.count(Product.id), func.min(func.coalesce(Product.next_check_at, Product.created_at))
+    ).filter(*due_filter(now)).one()
+    if isinstance(oldest, str):
+        # SQLiteではcoalesceの結果が文字列で返る
+        oldest = datetime.fromisoformat(oldest)
+    return count, oldest
+
+
+def seconds_until_next_due(db, now: datetime, conditions=()) -> Optional[float]:
+    """次にチェック期限が来るまでの秒数（active商品が無ければNone）。conditions で対象を絞る（担当シャードなど）"""
+    row = db.query(Product.next_check_at).filter(
+        Product.status == "active", *conditions
+    ).order_by(Product.next_check_at.asc().nullsfirst()).first()
+    if row is None:
+        return None
+    if row[0] is None:
+        return 0.0
+    return max(0.0, (row[0].replace(tzinfo=None) - now).total_seconds())
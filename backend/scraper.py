@@ -2,45 +2,220 @@
 オフモール（ハードオフネットモール）スクレイパー
 複数カテゴリの新着商品スキャン + SOLD OUT状態チェック
 """
-import requests
+import hashlib
+import os
 from bs4 import BeautifulSoup
 import re
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
+import httpclient
+import metrics
+
+# 取得先（ベンチマーク時はローカルの擬似サーバー bench/fake_offmall.py を指す）
+OFFMALL_BASE_URL = os.getenv("OFFMALL_BASE_URL", "https://netmall.hardoff.co.jp").rstrip("/")
 
 CATEGORIES = {
     "hobby": {
         "name": "ホビー",
-        "url": "https://netmall.hardoff.co.jp/cate/040000000000000/",
+        "url": f"{OFFMALL_BASE_URL}/cate/040000000000000/",
     },
     "fishing": {
         "name": "釣具",
-        "url": "https://netmall.hardoff.co.jp/cate/00010019/",
+        "url": f"{OFFMALL_BASE_URL}/cate/00010019/",
     },
 }
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-}
+SCAN_MAX_PAGES = int(os.getenv("SCAN_MAX_PAGES", "5"))
+PAGE_PARAM = "p"
 
 
-def scan_category(category_key: str) -> List[Dict]:
-    """指定カテゴリの新着商品を取得"""
-    cat = CATEGORIES.get(category_key)
-    if not cat:
-        print(f"Unknown category: {category_key}")
-        return []
+def scan_category(category_key: str, page: int = 1, url: Optional[str] = None) -> List[Dict]:
+    """
+    指定カテゴリの新着商品を取得（pageは新着順の何ページ目か）
+    url: カテゴリ一覧ページのURL（省略時は既定の CATEGORIES から引く）
+    """
+    _, _, products = fetch_listing_page(category_key, page, url)
+    return products or []
 
-    url = cat["url"] + "?s=1"  # s=1: 新着順
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=30)
+
+def fetch_listing_page(category_key: str, page: int = 1, url: Optional[str] = None,
+                       known_hash: Optional[Callable[[str], Optional[str]]] = None):
+    """
+    一覧ページを取得して (ページURL, 本文ハッシュ, 商品リスト) を返す
+    known_hash(ページURL) が本文ハッシュと同じなら、パースせずに商品リストを None で返す（内容に変化なし）
+    取得エラー時は (ページURL, None, [])
+    """
+    if url is None:
+        cat = CATEGORIES.get(category_key)
+        if not cat:
+            print(f"Unknown category: {category_key}")
+            return None, None, []
+        url = cat["url"]
+
+    url += ("&" if "?" in url else "?") + "s=1"  # s=1: 新着順
+    if page > 1:
+        url += f"&{PAGE_PARAM}={page}"
+
+    def unchanged(digest: str) -> bool:
+        return known_hash is not None and known_hash(url) == digest
+
+    def parse(r):
         r.raise_for_status()
+        html = r.text
+        digest = page_hash(html)
+        if unchanged(digest):
+            metrics.LISTING_PAGES.labels("unchanged").inc()
+            return digest, None
+        metrics.LISTING_PAGES.labels("changed").inc()
+        return digest, _parse_product_list(html)
+
+    try:
+        digest, products = httpclient.conditional_get(url, parse, timeout=30)
     except Exception as e:
-        print(f"Scan error ({cat['name']}): {e}")
-        return []
+        print(f"Scan error ({category_key}): {e}")
+        return url, None, []
 
-    products = _parse_product_list(r.text)
+    # 304（前回と同じ本文）で、その内容が保存済みなら変化なし
+    if products is None or unchanged(digest):
+        return url, digest, None
+    # 304時はキャッシュ済みのリストが返るのでコピーしてから書き込む
+    products = [dict(p) for p in products]
     for p in products:
         p["category"] = category_key
-    return products
+    return url, digest, products
+
+
+def page_hash(html: str) -> str:
+    """一覧ページの本文ハッシュ（表示のたびに変わるscript/style/コメント/hidden inputと空白の違いは無視）"""
+    text = _SPACE_RE.sub(" ", _VOLATILE_RE.sub("", html or ""))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def scan_new_arrivals(category_key: str, high_water: Optional[int],
+                      max_pages: int = SCAN_MAX_PAGES, url: Optional[str] = None,
+                      known_hash: Optional[Callable[[str], Optional[str]]] = None,
+                      rescan_pages: int = 0, resume: Optional[Dict] = None) -> Tuple[List[Dict], Dict]:
+    """
+    前回見た最新商品ID（high_water）より新しい商品だけを集める。
+    新着順に1ページずつ進み、high_water以下の商品が出た時点で打ち切る。
+    high_waterが無い（初回）は1ページ目だけ取得する。
+    known_hash を渡すと、本文が前回保存時と同じページはパースせずにそこで打ち切る
+    （新着は1ページ目から増えるので、以降のページも変わっていない）
+
+    既読への到達・一覧の終わりのどちらかで止まったときだけ complete になり、high_water を進める。
+    max_pages 切れや途中のページの取得失敗で止まったときは high_water は前回のまま、
+    続きの位置 resume = {"page": 最後に読めたページ, "top": ここまでに見た最新商品ID} を返す。
+    次回は resume を渡すと、1ページ目から top に追いつくまで読んだ後、resume["page"] から
+    high_water に届くまで続きを読む（max_pages を分け合う。続きは最低2ページ読んで前に進める）。
+    続きを読み切ると top を新しい high_water にする。続きのページはハッシュで飛ばさない
+
+    打ち切り後のページにある既知の商品の値下げは、通常のスキャンでは見えない。rescan_pages を渡すと、
+    complete になった後も rescan_pages ページ目まで読み進めて既知の商品を known に集める
+    （変化なしのページは飛ばして次へ進む。取得失敗や一覧の終わりで止める）
+    戻り値: (新しい商品リスト, {"pages": 取得できたページ数, "found", "overlap", "complete", "high_water", "unchanged",
+             "resume": 続きの位置（complete なら None）, "rescanned": 打ち切り後に読んだページ数,
+             "known": 読んだページにあった既知の商品, "page_hashes": {URL: (ハッシュ, 商品数)}})
+    """
+    stats = {"pages": 0, "found": 0, "overlap": False, "complete": False, "high_water": high_water,
+             "unchanged": 0, "resume": resume, "rescanned": 0, "known": [], "page_hashes": {}}
+    products = []
+    seen_ids = set()
+    newest = resume["top"] if resume else high_water  # ここまでに見た最新商品ID
+
+    def take(page_url, digest, items, limit) -> bool:
+        """取得できたページの商品を新着と既知（limit以下）に分ける。既知があればTrue"""
+        nonlocal newest
+        stats["page_hashes"][page_url] = (digest, len(items))
+        reached = False
+        for p in items:
+            if p["product_id"] in seen_ids:
+                continue
+            seen_ids.add(p["product_id"])
+            num = product_id_number(p["product_id"])
+            if newest is None or num > newest:
+                newest = num
+            if limit is not None and num <= limit:
+                reached = True
+                if high_water is not None and num <= high_water:
+                    stats["overlap"] = True
+                stats["known"].append(p)
+                continue
+            products.append(p)
+        stats["found"] += len(items)
+        return reached
+
+    # 1ページ目から、前回までに見た最新（続きがあれば resume["top"]、無ければ high_water）に追いつくまで
+    budget = max(max_pages, 1)
+    limit = resume["top"] if resume else high_water
+    page = 0
+    last_read = None  # 1ページ目から続けて読めた最後のページ
+    caught_up = list_end = False
+    for page in range(1, budget + 1):
+        page_url, digest, items = fetch_listing_page(category_key, page, url, known_hash)
+        if digest is None:
+            break  # 取得失敗（complete にならない）
+        stats["pages"] += 1
+        if items is None:
+            stats["unchanged"] += 1
+            caught_up = True
+            break
+        if not items:
+            # 取得できて商品が無ければ一覧の終わり
+            caught_up = list_end = True
+            break
+        last_read = page
+        if take(page_url, digest, items, limit) or high_water is None:
+            caught_up = True
+            break
+    stats["complete"] = caught_up and (resume is None or list_end)
+
+    if caught_up and not stats["complete"]:
+        # 前回読み切れなかった続き（前回最後に読んだページから。新着で後ろにずれた分は読み直しになるだけ）
+        last_read = resume["page"]
+        for page in range(resume["page"], resume["page"] + max(budget - stats["pages"], 2)):
+            page_url, digest, items = fetch_listing_page(category_key, page, url)
+            if digest is None:
+                break
+            stats["pages"] += 1
+            if not items:
+                stats["complete"] = list_end = True
+                break
+            last_read = page
+            if take(page_url, digest, items, high_water):
+                stats["complete"] = True
+                break
+
+    if not stats["complete"]:
+        if last_read is not None:
+            stats["resume"] = {"page": last_read, "top": newest}
+    else:
+        stats["high_water"] = newest
+        stats["resume"] = None
+        if high_water is not None and not list_end:
+            for page in range(page + 1, rescan_pages + 1):
+                page_url, digest, items = fetch_listing_page(category_key, page, url, known_hash)
+                if digest is None or items == []:
+                    break
+                stats["pages"] += 1
+                stats["rescanned"] += 1
+                if items is None:
+                    stats["unchanged"] += 1
+                    continue
+                take(page_url, digest, items, high_water)
+    return products, stats
+
+
+def parse_price_yen(price: Optional[str]) -> Optional[int]:
+    """表示用の価格文字列（"1,980円"）を数値にする。読めなければNone"""
+    if not price:
+        return None
+    match = _PRICE_YEN_RE.search(price)
+    if not match:
+        return None
+    return int(match.group(0).replace(",", ""))
+
+
+def product_id_number(product_id: str) -> int:
+    """商品IDを数値化（新着順の比較用、数字でなければ-1）"""
+    return int(product_id) if product_id.isdigit() else -1
 
 
 def scan_hobby_new_arrivals() -> List[Dict]:
@@ -48,17 +223,94 @@ def scan_hobby_new_arrivals() -> List[Dict]:
     return scan_category("hobby")
 
 
-def _parse_product_list(html: str) -> List[Dict]:
-    """商品一覧ページをパースして商品リストを返す"""
+def _default_parser_engine() -> str:
+    """C実装のlxmlがあればそれを使い、無ければ標準のhtml.parser（BeautifulSoup）"""
+    try:
+        import lxml.html  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+PARSER_ENGINE = os.getenv("PARSER_ENGINE") or _default_parser_engine()
+
+_PRODUCT_HREF_RE = re.compile(r"/product/\d+/?")
+_PRODUCT_ID_RE = re.compile(r"/product/(\d+)")
+_PRICE_RE = re.compile(r"([\d,]+)\s*円")
+_LINK_NOISE_RE = re.compile(r"[\d,]+円|新着|ジャンク|ランク[A-Z]")
+_PRICE_YEN_RE = re.compile(r"\d[\d,]*")
+_TEXT_SPLIT_RE = re.compile(r"[\d,]+円|\d+件|新着|ジャンク品?|ランク[A-Z]")
+# 表示のたびに変わりうる部分（スクリプト内のトークン・計測タグ・hiddenのCSRFトークンなど）
+_VOLATILE_RE = re.compile(
+    r"<script\b.*?</script\s*>|<style\b.*?</style\s*>|<noscript\b.*?</noscript\s*>|<!--.*?-->"
+    r"|<input\b[^>]*type=[\"']?hidden[^>]*>",
+    re.S | re.I,
+)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _parse_product_list(html: str, engine: Optional[str] = None) -> List[Dict]:
+    """
+    商品一覧ページをパースして商品リストを返す
+    engine: "lxml"（lxml.htmlで直接パース）/ "html.parser"（BeautifulSoup）
+    どちらのエンジンでも同じ結果になる（bench/parser_bench.py で確認）
+    """
+    engine = engine or PARSER_ENGINE
+    with metrics.PARSE_SECONDS.labels(engine).time():
+        if engine == "lxml":
+            return _parse_with_lxml(html)
+        return _parse_with_soup(html)
+
+
+def _parse_with_soup(html: str) -> List[Dict]:
     soup = BeautifulSoup(html, "html.parser")
+    text_of = _cached_text(lambda el: el.get_text(separator=" ", strip=True))
+    links = soup.find_all("a", href=_PRODUCT_HREF_RE)
+    return _collect_products(links, lambda el: el.parent, text_of, lambda el: el.find("img"))
+
+
+def _parse_with_lxml(html: str) -> List[Dict]:
+    import lxml.html
+    from lxml import etree
+
+    if not html.strip():
+        return []
+    root = lxml.html.document_fromstring(html)
+    # get_text と同じくscript/style/コメントの中身はテキストに含めない（後続テキストは残す）
+    for el in list(root.iter("script", "style", "template", etree.Comment, etree.ProcessingInstruction)):
+        el.drop_tree()
+
+    def element_text(el) -> str:
+        return " ".join(t.strip() for t in el.itertext() if t.strip())
+
+    text_of = _cached_text(element_text)
+    links = [a for a in root.iter("a") if _PRODUCT_HREF_RE.search(a.get("href") or "")]
+    return _collect_products(links, lambda el: el.getparent(), text_of, lambda el: el.find(".//img"))
+
+
+def _cached_text(get_text):
+    """要素ごとにテキストを1回だけ作る（同じ親要素を商品ごとに作り直さない）"""
+    # lxmlの要素オブジェクトは参照が切れるとidが再利用されるので、要素ごと保持しておく
+    cache = {}
+
+    def text_of(element) -> str:
+        entry = cache.get(id(element))
+        if entry is None:
+            entry = (element, get_text(element))
+            cache[id(element)] = entry
+        return entry[1]
+
+    return text_of
+
+
+def _collect_products(links, parent_of, text_of, find_img) -> List[Dict]:
+    """商品リンクの列から商品dictを組み立てる（エンジン共通）"""
     products = []
     seen_ids = set()
 
-    product_links = soup.find_all("a", href=re.compile(r"/product/\d+/?"))
-
-    for link in product_links:
+    for link in links:
         href = link.get("href", "")
-        match = re.search(r"/product/(\d+)", href)
+        match = _PRODUCT_ID_RE.search(href)
         if not match:
             continue
 
@@ -67,37 +319,36 @@ def _parse_product_list(html: str) -> List[Dict]:
             continue
         seen_ids.add(product_id)
 
-        product_url = f"https://netmall.hardoff.co.jp/product/{product_id}/"
+        product_url = f"{OFFMALL_BASE_URL}/product/{product_id}/"
 
         # 親要素を遡って商品カードコンテナを探す
         container = link
         full_text = ""
         for _ in range(8):
-            parent = container.parent
+            parent = parent_of(container)
             if parent is None:
                 break
             container = parent
-            text = container.get_text(separator=" ", strip=True)
+            text = text_of(container)
             if "円" in text and len(text) > 30:
                 full_text = text
                 break
 
         # 価格を抽出
         price = ""
-        price_match = re.search(r"([\d,]+)\s*円", full_text)
+        price_match = _PRICE_RE.search(full_text)
         if price_match:
             price = price_match.group(1) + "円"
 
         # 商品名を抽出
         name = ""
-        link_text = link.get_text(separator=" ", strip=True)
-        link_text_clean = re.sub(r"[\d,]+円|新着|ジャンク|ランク[A-Z]", "", link_text).strip()
+        img = find_img(link)
+        link_text_clean = _LINK_NOISE_RE.sub("", text_of(link)).strip()
         if link_text_clean and len(link_text_clean) > 2:
             name = link_text_clean
 
         if not name:
-            img = link.find("img")
-            if img and img.get("alt"):
+            if img is not None and img.get("alt"):
                 name = img.get("alt").strip()
 
         if not name:
@@ -106,7 +357,7 @@ def _parse_product_list(html: str) -> List[Dict]:
                 name = title.strip()
 
         if not name and full_text:
-            parts = re.split(r"[\d,]+円|\d+件|新着|ジャンク品?|ランク[A-Z]", full_text)
+            parts = _TEXT_SPLIT_RE.split(full_text)
             parts = [p.strip() for p in parts if p.strip() and len(p.strip()) > 3]
             if parts:
                 name = max(parts, key=len)[:80]
@@ -116,8 +367,7 @@ def _parse_product_list(html: str) -> List[Dict]:
 
         # 画像URL
         image_url = ""
-        img = link.find("img")
-        if img:
+        if img is not None:
             image_url = img.get("src", "") or img.get("data-src", "")
 
         products.append({
@@ -131,35 +381,73 @@ def _parse_product_list(html: str) -> List[Dict]:
     return products
 
 
-def check_sold_out(product_url: str) -> bool:
-    """商品ページにアクセスしてSOLD OUTかどうかチェック"""
+# チェック結果の状態
+SOLD = "sold"            # 売り切れ
+AVAILABLE = "available"  # 販売中
+REMOVED = "removed"      # 商品ページが消えた（404/410）
+UNKNOWN = "unknown"      # 通信エラー・判定不能
+
+STOCK_CHUNK_SIZE = 8192
+DRAIN_LIMIT = int(os.getenv("DRAIN_LIMIT", "65536"))  # 読み捨てる残りの上限（バイト、圧縮のまま）
+# 在庫表示として信頼できる目印（見つかった時点で確定して読み込みを打ち切る）
+# 「売り切れ」「sold out」等の文言だけではナビ・おすすめ欄の表記と区別できないので判定に使わない
+_DEFINITE_MARKERS = [
+    (b"schema.org/outofstock", SOLD),
+    (b"schema.org/soldout", SOLD),
+    (b"schema.org/instock", AVAILABLE),
+    ("カートに入れる".encode("utf-8"), AVAILABLE),
+    ("カートに追加".encode("utf-8"), AVAILABLE),
+]
+_MARKER_OVERLAP = max(len(m) for m, _ in _DEFINITE_MARKERS) - 1
+
+
+def check_status(product_url: str) -> str:
+    """商品ページの在庫状態を返す（SOLD / AVAILABLE / REMOVED / UNKNOWN）"""
     try:
-        r = requests.get(product_url, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        text = r.text.lower()
-        return "sold" in text or "売り切れ" in text or "販売終了" in text
+        return httpclient.conditional_get(product_url, _detect_stock_state, timeout=15, stream=True)
     except Exception as e:
         print(f"Check error for {product_url}: {e}")
-        return False
-
-
-def extract_keywords(product_name: str) -> List[str]:
-    """商品名からキーワードを抽出"""
-    # 不要な文字を除去
-    cleaned = re.sub(r"[\[\]【】（）\(\)「」『』]", " ", product_name)
-    cleaned = re.sub(r"(ジャンク品?|ランク[A-Z]|中古|未開封|新品|送料無料)", "", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-
-    # 意味のあるキーワードを抽出（2文字以上の単語）
-    keywords = []
-    parts = cleaned.split()
-    for part in parts:
-        part = part.strip()
-        if len(part) >= 2 and not re.match(r"^[\d,]+円?$", part):
-            keywords.append(part)
-
-    # 最も特徴的なキーワード（最長のもの）を返す
-    if keywords:
-        keywords.sort(key=len, reverse=True)
-        return keywords[:3]
-    return []
+        return UNKNOWN
+
+
+def check_sold_out(product_url: str) -> bool:
+    """後方互換: 商品ページにアクセスしてSOLD OUTかどうかチェック"""
+    return check_status(product_url) == SOLD
+
+
+def _detect_stock_state(r) -> str:
+    """レスポンスをチャンク単位で読み、在庫の目印が見つかった時点で打ち切る"""
+    if r.status_code in (404, 410):
+        _drain(r)
+        return REMOVED
+    r.raise_for_status()
+
+    tail = b""
+    for chunk in r.iter_content(STOCK_CHUNK_SIZE):
+        # 前チャンク末尾を重ねてチャンク境界をまたぐ目印も拾う（ASCIIのみ小文字化）
+        window = tail + chunk.lower()
+        for marker, state in _DEFINITE_MARKERS:
+            if marker in window:
+                _drain(r)
+                return state
+        tail = window[-_MARKER_OVERLAP:]
+    # 確かな目印が無い（売り切れ表記だけ等）は判定不能として販売中のまま次回また確認する
+    return UNKNOWN
+
+
+def _drain(r):
+    """
+    残りを展開せずにDRAIN_LIMITまで読み捨てて接続をプールに戻す（keep-aliveを維持）。
+    それ以上残っていれば読まずに接続を閉じる（閉じた接続は再利用されず、次回張り直される）
+    """
+    try:
+        left = DRAIN_LIMIT
+        while left > 0:
+            data = r.raw.read(min(STOCK_CHUNK_SIZE, left), decode_content=False)
+            if not data:
+                return
+            left -= len(data)
+        if r.raw.read(1, decode_content=False):
+            r.raw.close()
+    except Exception:
+        r.raw.close()
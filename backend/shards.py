@@ -0,0 +1,122 @@
+"""
+SOLDチェックのシャード分割
+商品は product_id のハッシュで SHARD_COUNT 個のシャードに振り分け、products.shard に保存する
+各シャードは leases テーブルの "check-shard:N" で1プロセスだけが担当する
+- 各ワーカーは "check-node:<OWNER_ID>" で生存を知らせ、生存ノード数から自分の取り分を決める
+- 取り分に足りなければ空きシャード（所有者が落ちて期限切れのものを含む）を取り、多すぎれば手放す
+ノードを足せば担当シャードが分散し、チェック件数はほぼノード数に比例して増える
+shard が NULL の行（シャード導入前のプロセスが書いた行など）は NULL_SHARD_OWNER の担当がチェックする
+（起動時の init_db でも埋め直す）
+"""
+import math
+import os
+import threading
+import zlib
+from typing import Iterable, List, Set
+
+from sqlalchemy import or_
+from database import SessionLocal
+from models import Product
+from lease import LEASE_TTL, OWNER_ID, try_acquire, release, renew_held, live_leases
+
+SHARD_COUNT = 64  # 変えると既存行の products.shard と合わなくなるので固定
+CHECK_SHARDING = os.getenv("CHECK_SHARDING", "0").lower() in ("1", "true", "yes")
+
+NULL_SHARD_OWNER = 0  # shard が NULL の行を担当するシャード
+NODE_PREFIX = "check-node:"
+SHARD_PREFIX = "check-shard:"
+
+
+def shard_of(product_id: str) -> int:
+    """商品IDの振り分け先シャード（プロセスに依存しない安定したハッシュ）"""
+    return zlib.crc32(str(product_id).encode("utf-8")) % SHARD_COUNT
+
+
+def shard_filter(shards: Iterable[int]):
+    """担当シャードの商品の条件（NULL_SHARD_OWNER を持っていれば shard が NULL の行も含む）"""
+    shards = list(shards)
+    if NULL_SHARD_OWNER in shards:
+        return or_(Product.shard.in_(shards), Product.shard == None)
+    return Product.shard.in_(shards)
+
+
+def _shard_lease(shard: int) -> str:
+    return f"{SHARD_PREFIX}{shard}"
+
+
+class ShardManager:
+    """担当シャードのリースを取り続け、owned() で現在の担当を返す"""
+
+    def __init__(self, ttl: int = LEASE_TTL, owner: str = OWNER_ID):
+        self.ttl = ttl
+        self.owner = owner
+        self._owned: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def owned(self) -> List[int]:
+        with self._lock:
+            return sorted(self._owned)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        db = SessionLocal()
+        try:
+            for shard in self.owned():
+                release(db, _shard_lease(shard), self.owner)
+            release(db, NODE_PREFIX + self.owner, self.owner)
+        finally:
+            db.close()
+        with self._lock:
+            self._owned.clear()
+
+    def _loop(self):
+        interval = max(self.ttl / 3, 1)
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                self._rebalance(db)
+            except Exception as e:
+                print(f"シャード割り当てエラー: {e}")
+                db.rollback()
+            finally:
+                db.close()
+            self._stop.wait(interval)
+
+    def _rebalance(self, db):
+        try_acquire(db, NODE_PREFIX + self.owner, self.owner, self.ttl)
+        renew_held(db, [_shard_lease(s) for s in self.owned()], self.owner, self.ttl)
+
+        nodes = len(live_leases(db, NODE_PREFIX)) or 1
+        fair_share = math.ceil(SHARD_COUNT / nodes)
+        holders = live_leases(db, SHARD_PREFIX)
+        owned = {int(name[len(SHARD_PREFIX):]) for name, owner in holders.items() if owner == self.owner}
+
+        if len(owned) < fair_share:
+            # 空いているシャードを取る（期限切れ = 所有者が落ちたシャードも含む）
+            for shard in range(SHARD_COUNT):
+                if len(owned) >= fair_share:
+                    break
+                if _shard_lease(shard) in holders:
+                    continue
+                if try_acquire(db, _shard_lease(shard), self.owner, self.ttl):
+                    owned.add(shard)
+        elif len(owned) > fair_share:
+            # 新しいノードが来たら余分を手放す（相手が次の更新で拾う）
+            for shard in sorted(owned)[fair_share:]:
+                release(db, _shard_lease(shard), self.owner)
+                owned.discard(shard)
+
+        with self._lock:
+            changed = owned != self._owned
+            self._owned = owned
+        if changed:
+            print(f"担当シャード: {len(owned)}/{SHARD_COUNT} (ノード数 {nodes})")
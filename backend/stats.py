@@ -0,0 +1,73 @@
+"""
+ダッシュボード統計（/api/stats）
+1回の集計クエリ（条件付きSUM）で計算し、プロセス内で短時間キャッシュする
+スキャン・チェックのcommit後やキーワード更新時に refresh() で破棄し、購読中のダッシュボードへ変化分を配信する
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+from models import Product, Keyword
+from events import broker
+
+STATS_TTL = float(os.getenv("STATS_TTL", "30"))
+
+_lock = threading.Lock()
+_cache = {"value": None, "etag": None, "expires": 0.0, "day": None}
+
+
+def compute_stats(db) -> Dict:
+    """統計を1クエリで集計"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = today - timedelta(days=7)
+
+    def count_if(*conds):
+        return func.coalesce(func.sum(case((and_(*conds), 1), else_=0)), 0)
+
+    sold = [Product.status == "sold", Product.minutes_to_sell != None]
+    stmt = select(
+        count_if(Product.created_at >= today).label("today_scanned"),
+        count_if(*sold, Product.sold_at >= today).label("today_sold"),
+        count_if(*sold, Product.sold_at >= week_ago).label("week_sold"),
+        count_if(Product.status == "active").label("pending"),
+        select(func.count(Keyword.id)).scalar_subquery().label("keyword_count"),
+        select(func.count(Keyword.id)).where(Keyword.selected == True).scalar_subquery().label("selected_count"),
+    ).where(
+        # 集計対象になりうる行だけを読む（各条件はインデックスで引ける）
+        or_(Product.created_at >= today, Product.sold_at >= week_ago, Product.status == "active")
+    )
+    row = db.execute(stmt).mappings().one()
+    return {key: int(value or 0) for key, value in row.items()}
+
+
+def cached_stats(db) -> Tuple[Dict, str]:
+    """キャッシュ済みの統計とETagを返す（期限切れ・日付が変わったら再計算）"""
+    day = datetime.now().date()
+    with _lock:
+        if _cache["value"] is not None and _cache["expires"] > time.monotonic() and _cache["day"] == day:
+            return _cache["value"], _cache["etag"]
+
+        value = compute_stats(db)
+        body = json.dumps(value, sort_keys=True).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        _cache.update(value=value, etag=etag, expires=time.monotonic() + STATS_TTL, day=day)
+        return value, etag
+
+
+def invalidate():
+    """次回の取得で再計算させる"""
+    with _lock:
+        _cache["expires"] = 0.0
+
+
+def refresh(db):
+    """キャッシュを破棄し、購読中のダッシュボードがあれば変化した項目を配信"""
+    invalidate()
+    if broker.has_subscribers():
+        value, _ = cached_stats(db)
+        broker.publish_stats(value)
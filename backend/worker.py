@@ -1,166 +1,582 @@
 """
 バックグラウンドワーカー
 - スキャン: 新着商品をDBに保存（SCAN_INTERVAL秒ごと）
-- チェック: 既存商品のSOLD OUT状態を確認（CHECK_INTERVAL秒ごと）
+- チェック: 期限が来た商品のSOLD OUT状態を確認（新しい商品ほど高頻度、scheduler参照）
+
+単独プロセスとして `python -m worker` で起動できる。
+APIプロセス内（EMBEDDED_WORKERS）でも単独プロセスでも、
+DBリース "scheduler" を持つ1プロセスだけがスキャン・チェックを実行する。
+CHECK_SHARDING=1 ならチェックは全ワーカーで担当シャードを分け合って実行する（shards参照）。
 """
 import os
+import signal
 import time
 import threading
-from datetime import datetime
-from database import SessionLocal
-from models import Product, Keyword
-from scraper import scan_category, check_sold_out, extract_keywords, CATEGORIES
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from sqlalchemy import func, update
+from database import SessionLocal, init_db
+from models import Category, Product
+from ingest import ingest_products, reactivate_relisted, update_changed_products
+import stats
+from events import broker, fast_seller_event, keyword_event
+from lease import LeaderElector, held
+from jobs import jobs, claim_requests, sync_request
+from shards import CHECK_SHARDING, ShardManager, shard_filter
+from scraper import scan_new_arrivals, check_status, product_id_number, SCAN_MAX_PAGES, SOLD, REMOVED
+import categories
+from scheduler import SELL_CHECK_MINUTES, CHECK_MIN_INTERVAL, backlog, due_filter, next_check_at, seconds_until_next_due
+import metrics
+from retention import RETENTION_INTERVAL, run_retention
+import rollups
+import keyword_engine
+import fingerprints
+import product_events
+
+SCAN_INTERVAL = int(os.getenv("SCAN_INTERVAL", "600"))  # カテゴリごとのスキャン間隔の既定値
+CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "300"))  # チェックループの最大待機秒数
+CHECK_CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", "8"))
+CHECK_BATCH_SIZE = int(os.getenv("CHECK_BATCH_SIZE", "200"))  # 1回に読み込み・commitする件数
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "4"))  # 同時にスキャンするカテゴリ数
+SCAN_MIN_WAIT = 5  # スキャンループの最短待機秒数
+SCAN_RETRY_WAIT = int(os.getenv("SCAN_RETRY_WAIT", "60"))  # 一覧ページを取得できなかったカテゴリを再試行するまでの秒数
+# 打ち切り位置より奥のページの値下げを拾うため、この間隔ごとに PRICE_RESCAN_PAGES ページ目まで読み進める（0で無効）
+PRICE_RESCAN_INTERVAL = int(os.getenv("PRICE_RESCAN_INTERVAL", "21600"))
+PRICE_RESCAN_PAGES = int(os.getenv("PRICE_RESCAN_PAGES", "20"))
+JOB_POLL_INTERVAL = 2  # 手動実行の依頼（job_runs）を見に行く間隔（秒）
+JOB_SYNC_INTERVAL = 1  # 実行中の依頼に進捗を書き戻す間隔（秒）
+
+SCHEDULER_LEASE = "scheduler"
+
+_elector = None
+_shard_manager = None
+
+# カテゴリごとの既知の最新商品ID（新着スキャンをどこで打ち切るか）
+_high_water = {}
+# カテゴリごとの読み切れなかった新着スキャンの続き（{"page", "top"}、無ければNone）
+_resume = {}
+# 取得に失敗したカテゴリの再試行時刻（スキャン済みにしていないので、これが無いと毎ループ取りに行く）
+_retry_at = {}
+# カテゴリごとに奥のページまで読み直した時刻（プロセス起動後の最初のスキャンでも読み直す）
+_rescanned_at = {}
+
 
-SCAN_INTERVAL = int(os.getenv("SCAN_INTERVAL", "600"))
-CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "300"))
-SELL_CHECK_MINUTES = int(os.getenv("SELL_CHECK_MINUTES", "30"))
+def run_scan(progress=None, only_due=False):
+    """
+    有効なカテゴリの新着商品をスキャンしてDBに保存（progress(done, total) はカテゴリ単位）
+    only_due=True ならカテゴリごとのスキャン間隔が来たものだけ（バックグラウンドループ用）
+    """
+    with metrics.stage("scan"):
+        return _scan_pass(progress, only_due)
 
 
-def run_scan():
-    """全カテゴリの新着商品をスキャンしてDBに保存"""
+def _scan_pass(progress=None, only_due=False):
     db = SessionLocal()
+    started = time.monotonic()
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    total_scanned = 0
+    total_new = 0
+    category_stats = {}
+    failed = []  # 一覧ページを1枚も取得できなかったカテゴリ
+    targets = due_categories(datetime.now()) if only_due else categories.enabled()
     try:
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        total_scanned = 0
-        total_new = 0
-
-        for cat_key, cat_info in CATEGORIES.items():
-            print(f"[{now}] スキャン開始: {cat_info['name']}")
-            products = scan_category(cat_key)
-            new_count = 0
-
-            for p in products:
-                existing = db.query(Product).filter(
-                    Product.product_id == p["product_id"]
-                ).first()
-                if not existing:
-                    product = Product(
-                        product_id=p["product_id"],
-                        name=p["name"],
-                        price=p["price"],
-                        url=p["url"],
-                        image_url=p.get("image_url", ""),
-                        category=cat_key,
-                        status="active",
-                    )
-                    db.add(product)
-                    new_count += 1
-
-            print(f"[{now}] {cat_info['name']}: {len(products)}件取得, {new_count}件新規")
-            total_scanned += len(products)
-            total_new += new_count
-            time.sleep(2)  # カテゴリ間の間隔
-
-        db.commit()
-        print(f"[{now}] 全スキャン完了: {total_scanned}件取得, {total_new}件新規")
-        return {"scanned": total_scanned, "new": total_new}
+        fingerprints.load_pages(db)
+        if progress:
+            progress(0, len(targets))
+        # 取得・パースはカテゴリごとに並列（同じホストなのでレート制限は共通のトークンバケットで守られる）
+        # DBへの保存はこのスレッドで1カテゴリずつ
+        with ThreadPoolExecutor(max_workers=SCAN_CONCURRENCY) as pool:
+            futures = {}
+            for cat in targets:
+                print(f"[{now}] スキャン開始: {cat['name']}")
+                futures[pool.submit(
+                    scan_new_arrivals, cat["key"], _get_high_water(db, cat["key"]),
+                    cat["max_pages"] or SCAN_MAX_PAGES, cat["url"], fingerprints.known_page_hash,
+                    PRICE_RESCAN_PAGES if _rescan_due(cat["key"]) else 0, _get_resume(db, cat["key"]),
+                )] = cat
+
+            for future in as_completed(futures):
+                cat = futures[future]
+                cat_key = cat["key"]
+                if not _lease_held():
+                    # 他のプロセスに引き継がれた: 残りのカテゴリは保存せずに打ち切る（次のリーダーが読み直す）
+                    print(f"[{now}] スキャン中断: リース {SCHEDULER_LEASE} を失った")
+                    for other in futures:
+                        other.cancel()
+                    break
+                try:
+                    products, scan_stats = future.result()
+                    new_count = ingest_products(db, products, default_category=cat_key)
+                    # 既知の商品は価格・商品名が変わったものだけ更新（値下げもここで拾う）
+                    changes = update_changed_products(db, fingerprints.changed_products(db, scan_stats["known"]))
+                    relisted = reactivate_relisted(db, scan_stats["known"])
+                    fingerprints.save_pages(db, scan_stats["page_hashes"], datetime.now())
+                    if scan_stats["high_water"] is not None and (scan_stats["complete"] or scan_stats["resume"]):
+                        categories.save_high_water(db, cat_key, scan_stats["high_water"], scan_stats["resume"])
+                    if scan_stats["pages"]:
+                        categories.mark_scanned(db, cat_key, datetime.now())
+                    db.commit()
+                except Exception as e:
+                    print(f"スキャンエラー（{cat['name']}）: {e}")
+                    db.rollback()
+                    continue
+
+                if not scan_stats["pages"]:
+                    # 1ページも取得できなかった: スキャン済みにせず、SCAN_RETRY_WAIT秒後にもう一度
+                    _retry_at[cat_key] = datetime.now() + timedelta(seconds=SCAN_RETRY_WAIT)
+                    print(f"[{now}] {cat['name']}: 一覧ページを取得できなかった（{SCAN_RETRY_WAIT}秒後に再試行）")
+                    failed.append(cat_key)
+                    if progress:
+                        progress(len(category_stats) + len(failed))
+                    continue
+                _retry_at.pop(cat_key, None)
+                if scan_stats["rescanned"]:
+                    _rescanned_at[cat_key] = datetime.now()
+
+                # 保存できてから打ち切り位置・ページハッシュ・指紋を進める（失敗時は次回同じ範囲を読み直す）
+                if scan_stats["high_water"] is not None:
+                    _high_water[cat_key] = scan_stats["high_water"]
+                _resume[cat_key] = scan_stats["resume"]
+                fingerprints.remember(scan_stats["page_hashes"], products + scan_stats["known"])
+                if scan_stats["unchanged"] and not scan_stats["page_hashes"]:
+                    print(f"[{now}] {cat['name']}: 変化なし")
+                else:
+                    print(f"[{now}] {cat['name']}: {scan_stats['pages']}ページ, {scan_stats['found']}件取得, "
+                          f"{len(products)}件未読, {new_count}件新規, 価格等の変更{changes['changed']}件"
+                          f"（値下げ{changes['price_drops']}件）, 再出品{relisted['relisted']}件, 既読到達{'あり' if scan_stats['overlap'] else 'なし'}"
+                          f"{', 奥のページ読み直し%dページ' % scan_stats['rescanned'] if scan_stats['rescanned'] else ''}"
+                          f"{'' if scan_stats['complete'] else _resume_note(scan_stats['resume'])}")
+                category_stats[cat_key] = {
+                    "pages": scan_stats["pages"],
+                    "unchanged_pages": scan_stats["unchanged"],
+                    "found": scan_stats["found"],
+                    "new": new_count,
+                    "changed": changes["changed"],
+                    "price_drops": changes["price_drops"],
+                    "relisted": relisted["relisted"],
+                    "reappeared": relisted["reappeared"],
+                    "overlap": scan_stats["overlap"],
+                    "complete": scan_stats["complete"],
+                    "rescanned_pages": scan_stats["rescanned"],
+                }
+                total_scanned += scan_stats["found"]
+                total_new += new_count
+                if progress:
+                    progress(len(category_stats) + len(failed))
+
+        categories.invalidate()
+        if total_new or any(c["changed"] or c["relisted"] for c in category_stats.values()):
+            stats.refresh(db)
+        metrics.record_items("scan", total_scanned, time.monotonic() - started)
+        print(f"[{now}] スキャン完了: {len(category_stats)}カテゴリ, {total_scanned}件取得, {total_new}件新規")
+        return {"scanned": total_scanned, "new": total_new, "categories": category_stats, "failed": failed}
 
     except Exception as e:
         print(f"スキャンエラー: {e}")
         db.rollback()
-        return {"scanned": 0, "new": 0}
+        return {"scanned": total_scanned, "new": total_new, "categories": category_stats, "failed": failed}
     finally:
         db.close()
 
 
-def run_check():
-    """active状態の商品のSOLD OUTチェック"""
-    db = SessionLocal()
-    try:
-        now = datetime.now()
-        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] チェック開始...")
-
-        active_products = db.query(Product).filter(
-            Product.status == "active"
-        ).all()
-
-        sold_count = 0
-        for product in active_products:
-            is_sold = check_sold_out(product.url)
-            if is_sold:
-                product.status = "sold"
-                product.sold_at = now
-                # 出品から売り切れまでの分数を計算
-                if product.created_at:
-                    delta = now - product.created_at.replace(tzinfo=None)
-                    product.minutes_to_sell = int(delta.total_seconds() / 60)
-                else:
-                    product.minutes_to_sell = 0
+def due_categories(now: datetime):
+    """スキャン間隔が来た有効カテゴリ（優先度の高い順）"""
+    return [cat for cat in categories.enabled() if _scan_due_at(cat) <= now]
+
+
+def _scan_due_at(cat) -> datetime:
+    if cat["last_scanned_at"] is None:
+        due = datetime.min
+    else:
+        due = cat["last_scanned_at"] + timedelta(seconds=cat["scan_interval"] or SCAN_INTERVAL)
+    return max(due, _retry_at.get(cat["key"], datetime.min))
+
+
+def _scan_wait_seconds() -> float:
+    """次にスキャン間隔が来るカテゴリまでの秒数（カテゴリの追加・変更を拾うためCATEGORY_RELOADで頭打ち）"""
+    now = datetime.now()
+    waits = [(_scan_due_at(cat) - now).total_seconds() for cat in categories.enabled()]
+    wait = min(waits, default=categories.CATEGORY_RELOAD)
+    return min(categories.CATEGORY_RELOAD, max(SCAN_MIN_WAIT, wait))
+
+
+def _rescan_due(cat_key: str) -> bool:
+    """奥のページまで読み直す時期か（PRICE_RESCAN_INTERVAL ごと）"""
+    if PRICE_RESCAN_INTERVAL <= 0 or PRICE_RESCAN_PAGES <= 0:
+        return False
+    last = _rescanned_at.get(cat_key)
+    return last is None or datetime.now() - last >= timedelta(seconds=PRICE_RESCAN_INTERVAL)
+
 
-                # 即売れ判定（SELL_CHECK_MINUTES以内に売れた場合）
-                if product.minutes_to_sell and product.minutes_to_sell <= SELL_CHECK_MINUTES:
-                    _extract_and_save_keyword(db, product)
+def _resume_note(resume) -> str:
+    if resume is None:
+        return "（未読ページが残ったので次回も同じ範囲から読む）"
+    return f"（未読ページが残ったので次回は{resume['page']}ページ目から続きを読む）"
 
-                sold_count += 1
-            time.sleep(1)  # サーバーに負荷をかけない
 
-        db.commit()
-        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] チェック完了: {len(active_products)}件中 {sold_count}件SOLD OUT")
-        return {"checked": len(active_products), "sold": sold_count}
+def _get_resume(db, cat_key: str):
+    """読み切れなかった新着スキャンの続き（初回は categories.resume_page / resume_top から）"""
+    if cat_key not in _resume:
+        row = db.query(Category.resume_page, Category.resume_top).filter(Category.key == cat_key).first()
+        _resume[cat_key] = {"page": row[0], "top": row[1]} if row and row[0] is not None else None
+    return _resume[cat_key]
 
+
+def _get_high_water(db, cat_key: str):
+    """
+    カテゴリの既知の最新商品ID
+    初回は categories.high_water（最後まで読めたスキャンで保存した値）から、それも無ければ
+    カテゴリ内で最大の商品IDから復元する
+    """
+    if cat_key not in _high_water:
+        saved = db.query(Category.high_water).filter(Category.key == cat_key).scalar()
+        if saved is not None:
+            _high_water[cat_key] = saved
+            return saved
+        # 1回のスキャンの行は古い順にも入るので Product.id ではなく商品IDの数値で比べる
+        # （桁数 → 文字列の順で並べれば数値順。数字以外のIDは product_id_number が -1 にする）
+        rows = db.query(Product.product_id).filter(
+            Product.category == cat_key
+        ).order_by(func.length(Product.product_id).desc(), Product.product_id.desc()).limit(100).all()
+        if not rows:
+            return None
+        _high_water[cat_key] = max(product_id_number(row[0]) for row in rows)
+    return _high_water[cat_key]
+
+
+def run_check(progress=None, shards=None):
+    """チェック期限が来たactive商品のSOLD OUTチェック（CHECK_BATCH_SIZE件ずつ読み込み・保存）
+    progress(done, total) は1件チェックするごとに呼ぶ（totalは開始時点の期限到来件数）
+    shards を渡すと、その時点の担当シャード（shards() の戻り値）の商品だけをチェックする"""
+    with metrics.stage("check"):
+        result = _check_pass(progress, shards)
+    # 売れ行き集計を最新の時間帯まで進める（/api/analytics）
+    rollups.refresh()
+    return result
+
+
+def _check_pass(progress=None, shards=None):
+    db = SessionLocal()
+    now = datetime.now()
+    print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] チェック開始...")
+    started = time.monotonic()
+    totals = {"checked": 0, "sold": 0, "removed": 0}
+    try:
+        metrics.record_backlog(*backlog(db, now), now)
+        if progress:
+            progress(0, db.query(func.count(Product.id)).filter(*_check_filter(now, shards)).scalar())
+        # HTTPチェックはスレッドプールで並列実行（ホスト別レート制限はscraper側）
+        # 1バッチごとにまとめてUPDATE・commitするので、途中で落ちてもそこまでの結果は残る
+        with ThreadPoolExecutor(max_workers=CHECK_CONCURRENCY) as pool:
+            last_id = 0
+            while True:
+                if shards is None and not _lease_held():
+                    # シャード分割時は担当シャードで絞っているので、リースを見るのは全件チェックのときだけ
+                    print(f"チェック中断: リース {SCHEDULER_LEASE} を失った")
+                    break
+                rows = db.query(
+                    Product.id, Product.product_id, Product.url, Product.name, Product.price,
+                    Product.price_yen, Product.image_url, Product.category, Product.created_at,
+                ).filter(
+                    # 担当シャードはバッチごとに取り直す（手放したシャードはすぐ対象から外れる）
+                    *_check_filter(now, shards), Product.id > last_id
+                ).order_by(Product.id).limit(CHECK_BATCH_SIZE).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                try:
+                    result = _check_batch(db, pool, rows, _offset_progress(progress, totals["checked"]))
+                    db.commit()
+                    stats.refresh(db)
+                    if not CHECK_SHARDING:
+                        # シャード分割時は各ノードの結果をAPI側の中継（relay）がDBから配信する
+                        _publish_batch(result)
+                except Exception as e:
+                    print(f"チェックバッチエラー（id {rows[0].id}〜{last_id}）: {e}")
+                    db.rollback()
+                    continue
+                for key in totals:
+                    totals[key] += result[key]
+
+        finished = datetime.now()
+        metrics.record_backlog(*backlog(db, finished), finished)
     except Exception as e:
         print(f"チェックエラー: {e}")
         db.rollback()
-        return {"checked": 0, "sold": 0}
     finally:
         db.close()
 
+    elapsed = time.monotonic() - started
+    rate = totals["checked"] / elapsed if elapsed > 0 else 0.0
+    metrics.record_items("check", totals["checked"], elapsed)
+    print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] チェック完了: {totals['checked']}件中 {totals['sold']}件SOLD OUT, "
+          f"{totals['removed']}件削除 ({elapsed:.1f}秒, {rate:.2f}件/秒)")
+    return {**totals, "elapsed": round(elapsed, 1), "rate": round(rate, 2)}
 
-def _extract_and_save_keyword(db, product: Product):
-    """即売れ商品からキーワードを抽出してDBに保存"""
-    keywords = extract_keywords(product.name)
-    if not keywords:
-        return
 
-    # 最も特徴的なキーワード（最長）を保存
-    main_keyword = keywords[0]
+def _check_filter(now: datetime, shards=None):
+    conditions = due_filter(now)
+    if shards is not None:
+        conditions.append(shard_filter(shards()))
+    return conditions
+
 
-    # 既に同じキーワードがあればスキップ
-    existing = db.query(Keyword).filter(
-        Keyword.keyword == main_keyword
-    ).first()
-    if existing:
+def _offset_progress(progress, offset: int):
+    """バッチ内の件数を全体の件数に直して progress に渡す"""
+    if progress is None:
+        return None
+    return lambda done: progress(offset + done)
+
+
+def _check_batch(db, pool, rows, progress=None):
+    """1バッチ分をチェックし、結果を種類ごとに一括UPDATEする（commitは呼び出し側）"""
+    futures = {pool.submit(check_status, row.url): row for row in rows}
+    rescheduled = []
+    sold = []
+    removed = []
+    fast_sold = []
+    events = []
+    for done, future in enumerate(as_completed(futures), 1):
+        row = futures[future]
+        state = future.result()
+        if progress:
+            progress(done)
+        # 並列実行なのでパス開始時刻ではなく検出時刻を使う
+        detected_at = datetime.now()
+        if state == REMOVED:
+            # ページ自体が消えた商品は売れたかどうか不明なので即売れ集計には入れない
+            removed.append({"id": row.id, "status": "removed"})
+            events.append(product_events.event(row.id, product_events.REMOVED, detected_at, row.price_yen))
+            continue
+        if state != SOLD:
+            # 販売中・判定不能なら出品からの経過時間に応じて次回予定を決める
+            rescheduled.append({"id": row.id, "next_check_at": next_check_at(row.created_at, detected_at)})
+            continue
+
+        # 出品から売り切れまでの分数を計算
+        if row.created_at:
+            delta = detected_at - row.created_at.replace(tzinfo=None)
+            minutes_to_sell = int(delta.total_seconds() / 60)
+        else:
+            minutes_to_sell = 0
+        sold.append({"id": row.id, "status": "sold", "sold_at": detected_at, "minutes_to_sell": minutes_to_sell})
+        events.append(product_events.event(row.id, product_events.SOLD, detected_at, row.price_yen))
+
+        # 即売れ判定（SELL_CHECK_MINUTES以内に売れた場合）
+        if minutes_to_sell is not None and minutes_to_sell <= SELL_CHECK_MINUTES:
+            fast_sold.append(fast_seller_event(row, minutes_to_sell, detected_at))
+
+    # 書き込みはHTTPチェックが全部終わってから（SQLiteの書き込みロックを短くする）
+    new_keywords = [keyword_event(kw) for kw in keyword_engine.suggest(db, fast_sold)]
+    # 主キー指定の一括UPDATE（キーの組み合わせごとに1回のexecutemany）
+    for batch in (rescheduled, sold, removed):
+        if batch:
+            db.execute(update(Product), batch)
+    product_events.record(db, events)
+    return {
+        "checked": len(rows),
+        "sold": len(sold),
+        "removed": len(removed),
+        "fast_sellers": fast_sold,
+        "keywords": new_keywords,
+    }
+
+
+def _publish_batch(result: dict):
+    """commit済みのバッチで見つかった即売れ商品・新キーワードを配信"""
+    if not broker.has_subscribers():
         return
+    for item in result["fast_sellers"]:
+        broker.publish("fast_seller", item)
+    for item in result["keywords"]:
+        broker.publish("keyword", item)
+
 
-    kw = Keyword(
-        keyword=main_keyword,
-        selected=True,
-        source_product_name=product.name,
-        source_price=product.price,
-        minutes_to_sell=product.minutes_to_sell,
-    )
-    db.add(kw)
+def _check_wait_seconds(shards=None) -> float:
+    """次のチェック期限まで待つ秒数（CHECK_MIN_INTERVAL〜CHECK_INTERVALの範囲）。shards を渡せば担当シャードの分だけ見る"""
+    conditions = ()
+    if shards is not None:
+        owned = shards()
+        if not owned:
+            return CHECK_INTERVAL
+        conditions = (shard_filter(owned),)
+    db = SessionLocal()
+    try:
+        wait = seconds_until_next_due(db, datetime.now(), conditions)
+    except Exception as e:
+        print(f"チェック予定取得エラー: {e}")
+        wait = None
+    finally:
+        db.close()
+    if wait is None:
+        return CHECK_INTERVAL
+    return min(CHECK_INTERVAL, max(CHECK_MIN_INTERVAL, wait))
 
 
-def start_scan_worker():
-    """スキャンワーカーをバックグラウンドスレッドで開始"""
+def start_scan_worker(elector: LeaderElector = None):
+    """スキャンワーカーをバックグラウンドスレッドで開始（electorがあればリース保持中だけ実行）"""
     def loop():
-        print(f"スキャンワーカー開始: {SCAN_INTERVAL}秒間隔")
+        print(f"スキャンワーカー開始: カテゴリごとに既定{SCAN_INTERVAL}秒間隔")
         while True:
+            if elector is not None:
+                elector.wait_until_leader()
             try:
-                run_scan()
+                # 手動スキャンが実行中ならそれに合流して終わりを待つ
+                if due_categories(datetime.now()):
+                    jobs.run("scan", lambda progress: run_scan(progress, only_due=True))
             except Exception as e:
                 print(f"スキャンワーカーエラー: {e}")
-            time.sleep(SCAN_INTERVAL)
+            time.sleep(_scan_wait_seconds())
 
     thread = threading.Thread(target=loop, daemon=True)
     thread.start()
     return thread
 
 
-def start_check_worker():
-    """チェックワーカーをバックグラウンドスレッドで開始"""
+def start_check_worker(elector: LeaderElector = None, shard_manager: ShardManager = None):
+    """
+    チェックワーカーをバックグラウンドスレッドで開始
+    shard_managerがあれば担当シャードだけを全ノードで並行チェック、無ければelectorのリース保持中だけ全件チェック
+    """
     def loop():
-        print(f"チェックワーカー開始: {CHECK_INTERVAL}秒間隔")
+        print(f"チェックワーカー開始: {CHECK_MIN_INTERVAL}〜{CHECK_INTERVAL}秒間隔")
         # 初回は少し待つ（スキャンが先に走るように）
         time.sleep(30)
         while True:
+            if shard_manager is None and elector is not None:
+                elector.wait_until_leader()
             try:
-                run_check()
+                if shard_manager is None:
+                    jobs.run("check", run_check)
+                elif shard_manager.owned():
+                    jobs.run("check", lambda progress: run_check(progress, shards=shard_manager.owned))
             except Exception as e:
                 print(f"チェックワーカーエラー: {e}")
-            time.sleep(CHECK_INTERVAL)
+            time.sleep(_check_wait_seconds(shard_manager.owned if shard_manager is not None else None))
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_retention_worker(elector: LeaderElector = None):
+    """保持期間切れの商品をアーカイブへ移すループ（RETENTION_INTERVAL秒ごと、リーダーだけ）"""
+    def loop():
+        print(f"アーカイブワーカー開始: {RETENTION_INTERVAL}秒間隔")
+        while True:
+            if elector is not None:
+                elector.wait_until_leader()
+            try:
+                jobs.run("retention", lambda progress: run_retention(progress, should_continue=_lease_held))
+            except Exception as e:
+                print(f"アーカイブワーカーエラー: {e}")
+            time.sleep(RETENTION_INTERVAL)
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_job_request_worker(elector: LeaderElector):
+    """APIから依頼された手動スキャン・チェック（job_runs）を受け取って実行するループ（リーダーだけ）"""
+    def loop():
+        while True:
+            elector.wait_until_leader()
+            db = SessionLocal()
+            try:
+                claimed = claim_requests(db) if _lease_held() else {}
+            except Exception as e:
+                print(f"ジョブ依頼の取得エラー: {e}")
+                db.rollback()
+                claimed = {}
+            finally:
+                db.close()
+            for kind, ids in claimed.items():
+                threading.Thread(target=_run_requested, args=(kind, ids), daemon=True, name=f"request-{kind}").start()
+            time.sleep(JOB_POLL_INTERVAL)
 
     thread = threading.Thread(target=loop, daemon=True)
     thread.start()
     return thread
+
+
+def _lease_held() -> bool:
+    """
+    スケジューラのリースをまだ持っているか（パスの途中でカテゴリ・バッチごとに確認し、失っていれば打ち切る）
+    スケジューラ外（手動・ベンチマーク）の実行では常にTrue
+    """
+    if _elector is None:
+        return True
+    if not _elector.is_leader():
+        return False
+    db = SessionLocal()
+    try:
+        return held(db, SCHEDULER_LEASE)
+    except Exception as e:
+        print(f"リース確認エラー: {e}")
+        return _elector.is_leader()
+    finally:
+        db.close()
+
+
+def _run_requested(kind: str, ids):
+    """依頼を実行して進捗・結果を書き戻す（バックグラウンドのパスが実行中ならそれに合流）"""
+    if kind == "check" and _shard_manager is not None:
+        # シャード分割時は他ノードが担当するシャードに手を出さない
+        fn = lambda progress: run_check(progress, shards=_shard_manager.owned)
+    else:
+        fn = run_scan if kind == "scan" else run_check
+    job, _ = jobs.submit(kind, fn)
+    while not job.wait(JOB_SYNC_INTERVAL):
+        sync_request(ids, job)
+    sync_request(ids, job)
+
+
+def start_scheduler() -> LeaderElector:
+    """
+    スキャン・チェックワーカーを開始
+    スキャンはリーダーだけ、チェックはCHECK_SHARDINGなら全ノードでシャード分割、そうでなければリーダーだけ
+    """
+    global _elector, _shard_manager
+    elector = LeaderElector(SCHEDULER_LEASE)
+    elector.start()
+    _elector = elector
+    start_scan_worker(elector)
+    start_retention_worker(elector)
+    start_job_request_worker(elector)
+    if CHECK_SHARDING:
+        _shard_manager = ShardManager()
+        _shard_manager.start()
+    start_check_worker(elector, _shard_manager)
+    return elector
+
+
+def stop_scheduler(elector: LeaderElector):
+    """リースを手放す（次のプロセスがすぐ引き継げる）"""
+    global _elector
+    elector.stop()
+    _elector = None
+    if _shard_manager is not None:
+        _shard_manager.stop()
+
+
+def main():
+    """単独ワーカープロセスのエントリポイント（python -m worker）"""
+    init_db()
+    metrics.serve()
+    metrics.CHECK_BACKLOG_LIMIT.set(SELL_CHECK_MINUTES * 60)
+    elector = start_scheduler()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    while not stop.is_set():
+        stop.wait(1)
+
+    print("ワーカー停止")
+    stop_scheduler(elector)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+ベンチマーク用の擬似オフモール商品カタログ
+一覧ページ・商品ページのHTMLを決定的に生成する（同じseedなら同じHTML）
+"""
+import random
+from typing import Dict, List
+
+BRANDS = ["BANDAI", "タカラトミー", "KOTOBUKIYA", "SHIMANO", "DAIWA", "メガハウス", "グッドスマイル", "がまかつ"]
+WORDS = [
+    "HG 1/144", "ガンダム", "ザクII", "ポケモンカード", "ミニ四駆", "トミカ", "ねんどろいど", "figma",
+    "スピニングリール", "ベイトリール", "ルアー", "ロッド", "ステラ", "セルテート", "超合金", "プラモデル",
+    "フィギュア", "まとめ売り", "限定版", "未組立", "箱付き", "初版", "Vintage", "Ver.Ka",
+]
+CARD_STYLES = ["text", "split", "alt", "title", "lazy"]
+
+
+def make_catalog(size: int, seed: int = 0, start_id: int = 5000000) -> List[Dict]:
+    """新しい順（IDの大きい順）の商品リストを作る"""
+    rnd = random.Random(seed)
+    items = []
+    for i in range(size):
+        words = rnd.sample(WORDS, rnd.randint(2, 4))
+        name = f"{rnd.choice(BRANDS)} {' '.join(words)}"
+        items.append({
+            "product_id": str(start_id + size - i),
+            "name": name,
+            "price": rnd.choice([300, 550, 1100, 1980, 3300, 5500, 12800, 39800]),
+            "rank": rnd.choice("ABCD"),
+            "junk": rnd.random() < 0.15,
+            "new": rnd.random() < 0.3,
+            "style": CARD_STYLES[i % len(CARD_STYLES)],
+            "sold": False,
+        })
+    return items
+
+
+def _card(item: Dict, base: str) -> str:
+    pid = item["product_id"]
+    href = f"{base}/product/{pid}/"
+    img = f"https://imgs.example.invalid/{pid}.jpg"
+    price = f"{item['price']:,}円"
+    badges = ("<span class=\"badge\">新着</span>" if item["new"] else "") + \
+             ("<span class=\"badge\">ジャンク品</span>" if item["junk"] else "")
+    rank = f"<span class=\"rank\">ランク{item['rank']}</span>"
+    style = item["style"]
+
+    if style == "text":
+        link = f'<a href="{href}"><img src="{img}" alt="{item["name"]}"><p class="item-name">{item["name"]}</p></a>'
+        detail = ""
+    elif style == "split":
+        # 画像リンクと商品名リンクが別（同じIDのリンクが2つ）
+        link = f'<a href="{href}"><img src="{img}" alt="{item["name"]}"></a>'
+        detail = f'<a href="{href}" class="item-name">{item["name"]}</a>'
+    elif style == "alt":
+        link = f'<a href="{href}"><img src="{img}" alt="{item["name"]}"></a>'
+        detail = ""
+    elif style == "title":
+        link = f'<a href="{href}" title="{item["name"]}"><span class="icon"></span></a>'
+        detail = f'<p class="item-desc">{item["name"]}</p>'
+    else:
+        link = f'<a href="{href}"><img src="" data-src="{img}" alt=""><p>{item["name"]}</p></a>'
+        detail = ""
+
+    return (
+        f'<li class="itemcolmn_item"><div class="item-img">{link}</div>'
+        f'<div class="item-detail">{badges}{rank}{detail}'
+        f'<p class="item-price">{price}<span class="tax">（税込）</span></p></div></li>'
+    )
+
+
+def render_listing(items: List[Dict], base: str = "", page: int = 1, pages: int = 1) -> str:
+    """一覧ページ（新着順）のHTML"""
+    cards = "\n".join(_card(item, base) for item in items)
+    pager = " ".join(f'<a href="?s=1&p={p}">{p}</a>' for p in range(1, pages + 1))
+    return f"""<!DOCTYPE html>
+<html lang="ja"><head><meta charset="UTF-8"><title>ホビー | ハードオフネットモール</title>
+<script>window.dataLayer = window.dataLayer || []; var soldOutFilter = "sold out";</script>
+</head><body>
+<header><nav><a href="/">トップ</a> <a href="/cate/">カテゴリ</a> <a href="/soldout/">売り切れ商品を表示</a>
+<a href="/cart/">カート</a></nav></header>
+<main><h1>新着商品 {len(items)}件</h1>
+<ul class="itemcolmn">
+{cards}
+</ul>
+<div class="pager">{pager}</div>
+</main>
+<footer><p>Copyright HARD OFF CORPORATION. All rights reserved.</p></footer>
+</body></html>"""
+
+
+def render_product(item: Dict) -> str:
+    """商品ページのHTML（売り切れならカートボタンが無くSOLD OUT表示）"""
+    availability = "https://schema.org/OutOfStock" if item["sold"] else "https://schema.org/InStock"
+    button = '<p class="soldout">SOLD OUT</p>' if item["sold"] else '<button class="cart">カートに入れる</button>'
+    filler = "<p>" + ("商品の状態について。" * 40) + "</p>"
+    return f"""<!DOCTYPE html>
+<html lang="ja"><head><meta charset="UTF-8"><title>{item['name']}</title></head><body>
+<header><nav><a href="/soldout/">売り切れ商品を表示</a></nav></header>
+<main><h1>{item['name']}</h1>
+<p class="price">{item['price']:,}円</p>
+{filler * 6}
+<div itemscope itemtype="https://schema.org/Product">
+<link itemprop="availability" href="{availability}">
+{button}
+</div>
+{filler * 20}
+</main></body></html>"""
@@ -0,0 +1,191 @@
+"""
+ベンチマーク用のローカル擬似オフモール
+catalog.py で生成した一覧ページ・商品ページを返す（本番サイトにアクセスせずにスクレイパー・ワーカーを計測する）
+
+    python bench/fake_offmall.py --port 8081 --size 5000 --latency 80 --error-rate 0.02
+    OFFMALL_BASE_URL=http://127.0.0.1:8081 uvicorn main:app   # アプリ側をこちらに向ける
+
+- /cate/<コード>/?s=1&p=N : 新着順の一覧（カテゴリコードごとに別カタログ、ETag / If-None-Match 対応）
+- /product/<ID>/          : 商品ページ（sold_rate の割合はSOLD OUT、カタログに無いIDは404）
+- latency（ミリ秒、±50%のゆらぎ）と error_rate（503を返す割合）を指定できる
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from catalog import make_catalog, render_listing, render_product
+
+PAGE_SIZE = 60
+
+_LISTING_RE = re.compile(r"^/cate/([0-9A-Za-z]+)/?$")
+_PRODUCT_RE = re.compile(r"^/product/(\d+)/?$")
+
+
+class FakeOffmall:
+    """擬似サーバー本体（start() で別スレッド起動、base_url を OFFMALL_BASE_URL に渡す）"""
+
+    def __init__(self, size: int = 2000, latency_ms: float = 0.0, error_rate: float = 0.0,
+                 sold_rate: float = 0.2, page_size: int = PAGE_SIZE, seed: int = 0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.size = size
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.sold_rate = sold_rate
+        self.page_size = page_size
+        self.seed = seed
+        self.requests = Counter()  # "listing 200" などの種類別リクエスト数
+        self._catalogs: Dict[str, List[Dict]] = {}
+        self._products: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._rnd = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def catalog(self, code: str) -> List[Dict]:
+        """カテゴリコードのカタログ（新しい順）。コードごとにIDの範囲とseedをずらす"""
+        with self._lock:
+            items = self._catalogs.get(code)
+            if items is None:
+                offset = zlib.crc32(code.encode("utf-8")) % 1000
+                items = make_catalog(self.size, seed=self.seed + offset, start_id=5000000 + offset * 100000)
+                rnd = random.Random(self.seed + offset)
+                for item in items:
+                    item["sold"] = rnd.random() < self.sold_rate
+                    self._products[item["product_id"]] = item
+                self._catalogs[code] = items
+            return items
+
+    def add_arrivals(self, code: str, count: int, seed: int = 0) -> List[Dict]:
+        """カテゴリの一覧の先頭に新着をcount件追加して返す（まとめて出品された状況の再現用）"""
+        items = self.catalog(code)
+        with self._lock:
+            arrivals = make_catalog(count, seed=seed, start_id=int(items[0]["product_id"]) if items else 5000000)
+            for item in arrivals:
+                self._products[item["product_id"]] = item
+            items[:0] = arrivals
+            return arrivals
+
+    def product(self, product_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._products.get(product_id)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive（本番と同じく接続を使い回せるか計測する）
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                kind, body = fake._route(parts.path, parse_qs(parts.query))
+                fake._delay()
+                etag = None
+                if body is not None and fake._fail():
+                    status, body = 503, b"busy"
+                elif body is None:
+                    status, body = 404, b"not found"
+                else:
+                    status = 200
+                    body = body.encode("utf-8")
+                    etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                    if kind == "listing" and self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                with fake._lock:
+                    fake.requests[f"{kind} {status}"] += 1
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if etag and kind == "listing":
+                    self.send_header("ETag", etag)
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _route(self, path: str, query: Dict):
+        match = _LISTING_RE.match(path)
+        if match:
+            items = self.catalog(match.group(1))
+            pages = max(1, -(-len(items) // self.page_size))
+            page = int(query.get("p", ["1"])[0])
+            if page > pages:
+                return "listing", render_listing([], self.base_url, page, pages)
+            chunk = items[(page - 1) * self.page_size:page * self.page_size]
+            return "listing", render_listing(chunk, self.base_url, page, pages)
+        match = _PRODUCT_RE.match(path)
+        if match:
+            item = self.product(match.group(1))
+            return "product", render_product(item) if item else None
+        return "other", None
+
+    def _delay(self):
+        if self.latency_ms > 0:
+            with self._lock:
+                jitter = self._rnd.uniform(0.5, 1.5)
+            time.sleep(self.latency_ms * jitter / 1000)
+
+    def _fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rnd.random() < self.error_rate
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ローカル擬似オフモール")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--size", type=int, default=2000, help="カテゴリあたりの商品数")
+    ap.add_argument("--latency", type=float, default=0.0, help="平均応答遅延（ミリ秒）")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="503を返す割合")
+    ap.add_argument("--sold-rate", type=float, default=0.2, help="SOLD OUTの商品の割合")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    fake = FakeOffmall(size=args.size, latency_ms=args.latency, error_rate=args.error_rate,
+                       sold_rate=args.sold_rate, seed=args.seed, host=args.host, port=args.port)
+    print(f"擬似オフモール: {fake.base_url} (Ctrl+Cで終了)")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(dict(fake.requests))
+
+
+if __name__ == "__main__":
+    main()
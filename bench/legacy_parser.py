@@ -0,0 +1,91 @@
+"""
+パーサ高速化前の _parse_product_list（html.parser + 祖先ごとのget_text）
+parser_bench.py の速度比較・一致確認の基準として当時のまま残している
+"""
+import re
+from typing import List, Dict
+
+from bs4 import BeautifulSoup
+
+
+def _parse_product_list(html: str) -> List[Dict]:
+    """商品一覧ページをパースして商品リストを返す"""
+    soup = BeautifulSoup(html, "html.parser")
+    products = []
+    seen_ids = set()
+
+    product_links = soup.find_all("a", href=re.compile(r"/product/\d+/?"))
+
+    for link in product_links:
+        href = link.get("href", "")
+        match = re.search(r"/product/(\d+)", href)
+        if not match:
+            continue
+
+        product_id = match.group(1)
+        if product_id in seen_ids:
+            continue
+        seen_ids.add(product_id)
+
+        product_url = f"https://netmall.hardoff.co.jp/product/{product_id}/"
+
+        # 親要素を遡って商品カードコンテナを探す
+        container = link
+        full_text = ""
+        for _ in range(8):
+            parent = container.parent
+            if parent is None:
+                break
+            container = parent
+            text = container.get_text(separator=" ", strip=True)
+            if "円" in text and len(text) > 30:
+                full_text = text
+                break
+
+        # 価格を抽出
+        price = ""
+        price_match = re.search(r"([\d,]+)\s*円", full_text)
+        if price_match:
+            price = price_match.group(1) + "円"
+
+        # 商品名を抽出
+        name = ""
+        link_text = link.get_text(separator=" ", strip=True)
+        link_text_clean = re.sub(r"[\d,]+円|新着|ジャンク|ランク[A-Z]", "", link_text).strip()
+        if link_text_clean and len(link_text_clean) > 2:
+            name = link_text_clean
+
+        if not name:
+            img = link.find("img")
+            if img and img.get("alt"):
+                name = img.get("alt").strip()
+
+        if not name:
+            title = link.get("title", "")
+            if title:
+                name = title.strip()
+
+        if not name and full_text:
+            parts = re.split(r"[\d,]+円|\d+件|新着|ジャンク品?|ランク[A-Z]", full_text)
+            parts = [p.strip() for p in parts if p.strip() and len(p.strip()) > 3]
+            if parts:
+                name = max(parts, key=len)[:80]
+
+        if not name:
+            name = f"商品ID: {product_id}"
+
+        # 画像URL
+        image_url = ""
+        img = link.find("img")
+        if img:
+            image_url = img.get("src", "") or img.get("data-src", "")
+
+        products.append({
+            "product_id": product_id,
+            "name": name[:200],
+            "price": price,
+            "url": product_url,
+            "image_url": image_url,
+        })
+
+    return products
@@ -0,0 +1,95 @@
+"""
+一覧ページパーサの一致確認 + マイクロベンチマーク
+
+    python bench/parser_bench.py [--repeat 20] [--big 400]
+
+1. fixtures/*.html を各エンジンでパースし、*.expected.json（高速化前のパーサの出力）と完全一致するか確認
+2. 高速化前のパーサと現行パーサ（エンジン別）の1ページあたり処理時間を比較
+一致しないエンジンがあれば終了コード1
+
+fixtures の一覧ページは実サイトの保存ページではない（合成データ）:
+- listing_hobby / listing_fishing: catalog.py の render_listing で生成したページ
+- listing_edge_cases: 壊れたタグ・alt/titleだけのカード・ランキング枠などを手書きしたページ
+確認できるのは旧パーサとの一致だけで、実サイトのHTMLでの正しさは保証しない
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "backend"))
+
+from catalog import make_catalog, render_listing  # noqa: E402
+from legacy_parser import _parse_product_list as legacy_parse  # noqa: E402
+from scraper import _parse_product_list  # noqa: E402
+
+
+def available_engines():
+    engines = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        engines.append("lxml")
+    except ImportError:
+        pass
+    return engines
+
+
+def check_parity(engines) -> bool:
+    ok = True
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, "fixtures", "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        with open(path[:-5] + ".expected.json", encoding="utf-8") as f:
+            expected = json.load(f)
+        for engine in engines:
+            got = _parse_product_list(html, engine=engine)
+            same = got == expected
+            ok = ok and same
+            print(f"  {'OK ' if same else 'NG '} {os.path.basename(path):32s} {engine:12s} {len(got)}件")
+            if not same:
+                for e, g in zip(expected, got):
+                    if e != g:
+                        print(f"      expected {e}\n      got      {g}")
+                        break
+    return ok
+
+
+def timeit(fn, html, repeat) -> float:
+    fn(html)  # ウォームアップ
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(html)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--big", type=int, default=400, help="大きい一覧ページの商品数")
+    args = ap.parse_args()
+
+    engines = available_engines()
+    print("一致確認:")
+    ok = check_parity(engines)
+
+    pages = {
+        "fixture 60件": open(os.path.join(BENCH_DIR, "fixtures", "listing_hobby.html"), encoding="utf-8").read(),
+        f"生成 {args.big}件": render_listing(make_catalog(args.big, seed=7)),
+    }
+    print("\n1ページあたりの処理時間 (ms):")
+    for label, html in pages.items():
+        base = timeit(legacy_parse, html, args.repeat)
+        print(f"  {label:14s} 高速化前 {base:8.2f}")
+        for engine in engines:
+            t = timeit(lambda h: _parse_product_list(h, engine=engine), html, args.repeat)
+            print(f"  {label:14s} {engine:8s} {t:8.2f}  (x{base / t:.1f})")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
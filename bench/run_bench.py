@@ -0,0 +1,189 @@
+"""
+スクレイパー・ワーカーのエンドツーエンドベンチマーク（ローカル擬似オフモール使用）
+
+    python bench/run_bench.py [--size 2000] [--latency 50] [--error-rate 0.01] [--checks 1000] [--json out.json]
+
+擬似サーバー（fake_offmall.py）を起動し、OFFMALL_BASE_URL と一時SQLiteを設定してから
+以下を順に計測する:
+  parse       _parse_product_list（ネットワークなし）
+  scan        scan_category（一覧ページを1ページずつ）
+  check       check_sold_out（CHECK_CONCURRENCY並列）
+  run_scan    worker.run_scan（全カテゴリ、DB保存込み）
+  run_check   worker.run_check（--checks件、一括UPDATE込み）
+各段階で 件数/秒・HTTPレイテンシ p50/p99・DBクエリ数/件・tracemallocのピークメモリ を出す
+ホスト別レート制限は --rate（既定は実質無制限）で、本番相当にするなら --rate 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_offmall import FakeOffmall  # noqa: E402
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """HTTPレイテンシ（レスポンスヘッダ受信まで）とDBクエリ数を集める"""
+
+    def __init__(self, session, engine):
+        from sqlalchemy import event
+        self.latencies = []
+        self.requests = 0
+        self.queries = 0
+        session.hooks["response"].append(self._on_response)
+        event.listen(engine, "before_cursor_execute", self._on_query)
+
+    def _on_response(self, r, *args, **kwargs):
+        self.requests += 1
+        self.latencies.append(r.elapsed.total_seconds() * 1000)
+
+    def _on_query(self, *args, **kwargs):
+        self.queries += 1
+
+    def reset(self):
+        self.latencies = []
+        self.requests = 0
+        self.queries = 0
+
+
+def measure(name: str, recorder: Recorder, fn):
+    """fn() -> 処理件数 を実行し、1段階分の結果dictを返す"""
+    recorder.reset()
+    tracemalloc.start()
+    started = time.perf_counter()
+    items = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "stage": name,
+        "items": items,
+        "elapsed": round(elapsed, 3),
+        "per_sec": round(items / elapsed, 1) if elapsed > 0 else 0.0,
+        "http_requests": recorder.requests,
+        "p50_ms": round(percentile(recorder.latencies, 50), 1),
+        "p99_ms": round(percentile(recorder.latencies, 99), 1),
+        "queries_per_item": round(recorder.queries / items, 2) if items else 0.0,
+        "peak_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def print_report(results):
+    print(f"\n{'stage':10s} {'items':>7s} {'items/s':>9s} {'p50ms':>7s} {'p99ms':>7s} {'req':>6s} {'q/item':>7s} {'peakMB':>7s}")
+    for r in results:
+        print(f"{r['stage']:10s} {r['items']:7d} {r['per_sec']:9.1f} {r['p50_ms']:7.1f} {r['p99_ms']:7.1f} "
+              f"{r['http_requests']:6d} {r['queries_per_item']:7.2f} {r['peak_mb']:7.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=2000, help="カテゴリあたりの商品数")
+    ap.add_argument("--latency", type=float, default=20.0, help="擬似サーバーの平均応答遅延（ミリ秒）")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--sold-rate", type=float, default=0.2)
+    ap.add_argument("--pages", type=int, default=10, help="scan段階で読む一覧ページ数")
+    ap.add_argument("--checks", type=int, default=1000, help="check / run_check段階の商品数")
+    ap.add_argument("--rate", type=float, default=10000, help="ホスト別レート制限（毎秒）")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--json", help="結果をJSONで保存するパス")
+    args = ap.parse_args()
+
+    fake = FakeOffmall(size=args.size, latency_ms=args.latency, error_rate=args.error_rate,
+                       sold_rate=args.sold_rate)
+    base_url = fake.start()
+    workdir = tempfile.mkdtemp(prefix="offmall-bench-")
+
+    # backendの設定はimport時に環境変数から読まれるので、importより先に設定する
+    os.environ.update({
+        "OFFMALL_BASE_URL": base_url,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "HOST_RATE_LIMIT": str(args.rate),
+        "HOST_BURST": str(max(1, int(args.rate))),
+        "CHECK_CONCURRENCY": str(args.concurrency),
+    })
+    import httpclient
+    import worker
+    from database import SessionLocal, engine, init_db
+    from ingest import ingest_products
+    from scraper import CATEGORIES, _parse_product_list, scan_category, check_sold_out
+    from catalog import render_listing
+
+    init_db()
+    recorder = Recorder(httpclient.session, engine)
+    codes = {key: cat["url"].rstrip("/").rsplit("/", 1)[-1] for key, cat in CATEGORIES.items()}
+    first_key = next(iter(CATEGORIES))
+    items = fake.catalog(codes[first_key])
+    print(f"擬似オフモール {base_url}  商品数 {args.size}/カテゴリ  遅延 {args.latency}ms  "
+          f"エラー率 {args.error_rate}  DB {workdir}")
+
+    results = []
+
+    html_pages = [render_listing(items[i:i + 60], base_url) for i in range(0, min(len(items), args.pages * 60), 60)]
+
+    def parse():
+        # HTTPを伴わないのでレイテンシ欄は1ページのパース時間
+        for html in html_pages:
+            started = time.perf_counter()
+            _parse_product_list(html)
+            recorder.latencies.append((time.perf_counter() - started) * 1000)
+        return len(html_pages)
+    results.append(measure("parse", recorder, parse))
+
+    def scan():
+        return sum(1 for page in range(1, args.pages + 1) if scan_category(first_key, page))
+    results.append(measure("scan", recorder, scan))
+
+    urls = [f"{base_url}/product/{item['product_id']}/" for item in items[:args.checks]]
+
+    def check():
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            return len(list(pool.map(check_sold_out, urls)))
+    results.append(measure("check", recorder, check))
+
+    def run_scan():
+        result = worker.run_scan()
+        return result["scanned"]
+    results.append(measure("run_scan", recorder, run_scan))
+
+    # run_check用にカタログの商品を（期限到来状態で）登録しておく
+    db = SessionLocal()
+    ingest_products(db, [{
+        "product_id": item["product_id"],
+        "name": item["name"],
+        "price": f"{item['price']:,}円",
+        "url": f"{base_url}/product/{item['product_id']}/",
+        "category": first_key,
+    } for item in items[:args.checks]], default_category=first_key)
+    db.commit()
+    db.close()
+
+    def run_check():
+        result = worker.run_check()
+        return result["checked"]
+    results.append(measure("run_check", recorder, run_check))
+
+    fake.stop()
+    print_report(results)
+    print(f"\n擬似サーバーへのリクエスト: {dict(sorted(fake.requests.items()))}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
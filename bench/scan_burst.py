@@ -0,0 +1,93 @@
+"""
+新着スキャンの取りこぼし確認（ローカル擬似オフモール使用）
+
+    python bench/scan_burst.py [--burst 400] [--max-pages 5] [--trickle 30] [--passes 10]
+
+1カテゴリだけ有効にして worker.run_scan で high_water を作った後、
+max_pages×60件を超える新着をまとめて追加し、その後もパスごとに --trickle 件ずつ新着を足しながら
+run_scan を繰り返す。追加した商品が全部取り込まれ、続きの位置（resume_page）が消えて
+high_water が最新の商品IDまで進めば成功（終了コード0）。--passes 回で終わらなければ1
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_offmall import FakeOffmall  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--burst", type=int, default=400, help="まとめて追加する新着の件数")
+    ap.add_argument("--max-pages", type=int, default=5, help="カテゴリの max_pages")
+    ap.add_argument("--trickle", type=int, default=30, help="以降のパスごとに追加する新着の件数")
+    ap.add_argument("--passes", type=int, default=10, help="追いつくまでに許すパス数")
+    args = ap.parse_args()
+
+    fake = FakeOffmall(size=1000, sold_rate=0.0)
+    base_url = fake.start()
+    workdir = tempfile.mkdtemp(prefix="offmall-burst-")
+    os.environ.update({
+        "OFFMALL_BASE_URL": base_url,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'burst.db')}",
+        "HOST_RATE_LIMIT": "10000",
+        "HOST_BURST": "10000",
+        "PRICE_RESCAN_INTERVAL": "0",
+    })
+    import categories
+    import worker
+    from database import SessionLocal, init_db
+    from models import Category, Product
+    from scraper import CATEGORIES
+
+    init_db()
+    key = next(iter(CATEGORIES))
+    code = CATEGORIES[key]["url"].rstrip("/").rsplit("/", 1)[-1]
+    db = SessionLocal()
+    db.query(Category).filter(Category.key != key).update({"enabled": False})
+    db.query(Category).filter(Category.key == key).update({"max_pages": args.max_pages})
+    db.commit()
+    categories.invalidate()
+
+    def ingested(ids) -> int:
+        return db.query(Product).filter(Product.product_id.in_(ids)).count()
+
+    worker.run_scan()  # 初回: 1ページ目だけ読んで high_water を作る
+    expected = [item["product_id"] for item in fake.add_arrivals(code, args.burst, seed=1)]
+    print(f"擬似オフモール {base_url}  新着 {args.burst}件を追加（max_pages {args.max_pages}）")
+
+    ok = False
+    for n in range(1, args.passes + 1):
+        result = worker.run_scan()
+        db.expire_all()
+        row = db.query(Category).filter(Category.key == key).one()
+        stats = result["categories"].get(key, {})
+        got = ingested(expected)
+        print(f"  パス{n}: {stats.get('pages')}ページ, complete {stats.get('complete')}, "
+              f"取り込み {got}/{len(expected)}, high_water {row.high_water}, resume_page {row.resume_page}")
+        newest = int(fake.catalog(code)[0]["product_id"])
+        if got == len(expected) and row.resume_page is None and row.high_water == newest:
+            ok = True
+            break
+        if args.trickle:
+            expected += [item["product_id"] for item in fake.add_arrivals(code, args.trickle, seed=n + 1)]
+
+    # 追いついた後は1ページ目が変わっていなければ何も読まない（ページハッシュでの打ち切り）
+    if ok:
+        stats = worker.run_scan()["categories"].get(key, {})
+        print(f"  追加なし: {stats.get('pages')}ページ, 変化なし {stats.get('unchanged_pages')}ページ")
+        ok = stats.get("pages") == 1 and stats.get("unchanged_pages") == 1
+
+    db.close()
+    fake.stop()
+    print("OK" if ok else "NG: 新着を取りこぼした、または追いつけなかった")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@
 let currentDays = 7;
 let currentCategory = "";
 let keywords = [];
+let keywordCursor = null;
+let fastSellerCursor = null;
+const JOB_POLL_MS = 2000;  // 手動スキャン/チェックの進捗確認間隔
 
 // ========== タブ切り替え ==========
 
@@ -24,21 +27,31 @@ function switchTab(tab) {
 
 // ========== 統計 ==========
 
+const STAT_ELEMENTS = {
+    today_scanned: "todayScanned",
+    today_sold: "todaySold",
+    week_sold: "weekSold",
+    pending: "pending",
+    keyword_count: "keywordCount",
+    selected_count: "selectedCount",
+};
+
 async function loadStats() {
     try {
         const r = await fetch("/api/stats");
-        const data = await r.json();
-        document.getElementById("todayScanned").textContent = data.today_scanned;
-        document.getElementById("todaySold").textContent = data.today_sold;
-        document.getElementById("weekSold").textContent = data.week_sold;
-        document.getElementById("pending").textContent = data.pending;
-        document.getElementById("keywordCount").textContent = data.keyword_count;
-        document.getElementById("selectedCount").textContent = data.selected_count;
+        applyStats(await r.json());
     } catch (e) {
         console.error("Stats error:", e);
     }
 }
 
+// 受け取った項目だけ書き換える（SSEでは変化した項目だけが届く）
+function applyStats(data) {
+    for (const [key, id] of Object.entries(STAT_ELEMENTS)) {
+        if (key in data) document.getElementById(id).textContent = data[key];
+    }
+}
+
 // ========== キーワード一覧 ==========
 
 async function loadKeywords() {
@@ -46,41 +59,61 @@ async function loadKeywords() {
     try {
         const r = await fetch("/api/keywords");
         keywords = await r.json();
+        keywordCursor = r.headers.get("X-Next-Cursor");
+        renderLoadMore("keywordMore", keywordCursor, "loadMoreKeywords()");
 
         if (keywords.length === 0) {
             container.innerHTML = '<div class="empty-state">まだキーワードがありません。即売れ商品が見つかると自動抽出されます。</div>';
             return;
         }
 
-        container.innerHTML = keywords.map(k => `
-            <div class="kw-row" id="kw-${k.id}">
-                <label class="kw-checkbox">
-                    <input type="checkbox" ${k.selected ? "checked" : ""}
-                           onchange="toggleKeyword(${k.id}, this.checked)">
-                </label>
-                <div class="kw-main">
-                    <div class="kw-keyword" id="kw-text-${k.id}">${escapeHtml(k.keyword)}</div>
-                    ${k.exclude ? `<div class="kw-exclude">除外: ${escapeHtml(k.exclude)}</div>` : ""}
-                    <div class="kw-source">
-                        ${k.source_product_name !== "手動追加" ? `
-                            <span class="kw-time">${k.minutes_to_sell}分売れ</span>
-                            <span class="kw-price">${escapeHtml(k.source_price || "")}</span>
-                            <span class="kw-name">${escapeHtml((k.source_product_name || "").substring(0, 40))}</span>
-                        ` : `<span class="kw-manual">手動追加</span>`}
-                    </div>
-                </div>
-                <div class="kw-actions">
-                    <button class="btn-icon" onclick="editKeyword(${k.id})" title="編集">&#9998;</button>
-                    <button class="btn-icon btn-icon-danger" onclick="deleteKeyword(${k.id})" title="削除">&times;</button>
-                </div>
-            </div>
-        `).join("");
+        container.innerHTML = keywords.map(renderKeywordRow).join("");
     } catch (e) {
         container.innerHTML = '<div class="empty-state">読み込みエラー</div>';
         console.error("Keywords error:", e);
     }
 }
 
+async function loadMoreKeywords() {
+    if (!keywordCursor) return;
+    try {
+        const r = await fetch(`/api/keywords?cursor=${encodeURIComponent(keywordCursor)}`);
+        const more = await r.json();
+        keywords = keywords.concat(more);
+        keywordCursor = r.headers.get("X-Next-Cursor");
+        renderLoadMore("keywordMore", keywordCursor, "loadMoreKeywords()");
+        document.getElementById("keywordList").insertAdjacentHTML("beforeend", more.map(renderKeywordRow).join(""));
+    } catch (e) {
+        console.error("Keywords error:", e);
+    }
+}
+
+function renderKeywordRow(k) {
+    return `
+        <div class="kw-row" id="kw-${k.id}">
+            <label class="kw-checkbox">
+                <input type="checkbox" ${k.selected ? "checked" : ""}
+                       onchange="toggleKeyword(${k.id}, this.checked)">
+            </label>
+            <div class="kw-main">
+                <div class="kw-keyword" id="kw-text-${k.id}">${escapeHtml(k.keyword)}</div>
+                ${k.exclude ? `<div class="kw-exclude">除外: ${escapeHtml(k.exclude)}</div>` : ""}
+                <div class="kw-source">
+                    ${k.source_product_name !== "手動追加" ? `
+                        <span class="kw-time">${k.minutes_to_sell}分売れ</span>
+                        <span class="kw-price">${escapeHtml(k.source_price || "")}</span>
+                        <span class="kw-name">${escapeHtml((k.source_product_name || "").substring(0, 40))}</span>
+                    ` : `<span class="kw-manual">手動追加</span>`}
+                </div>
+            </div>
+            <div class="kw-actions">
+                <button class="btn-icon" onclick="editKeyword(${k.id})" title="編集">&#9998;</button>
+                <button class="btn-icon btn-icon-danger" onclick="deleteKeyword(${k.id})" title="削除">&times;</button>
+            </div>
+        </div>
+    `;
+}
+
 // ========== キーワード操作 ==========
 
 async function toggleKeyword(id, selected) {
@@ -186,31 +219,17 @@ async function loadFastSellers() {
     container.innerHTML = '<div class="loading">読み込み中...</div>';
 
     try {
-        let url = `/api/fast-sellers?days=${currentDays}&limit=100`;
-        if (currentCategory) url += `&category=${currentCategory}`;
-        const r = await fetch(url);
+        const r = await fetch(fastSellersUrl());
         const items = await r.json();
+        fastSellerCursor = r.headers.get("X-Next-Cursor");
+        renderLoadMore("fastSellerMore", fastSellerCursor, "loadMoreFastSellers()");
 
         if (items.length === 0) {
             container.innerHTML = '<div class="empty-state">まだ即売れ商品がありません。データ収集中...</div>';
             return;
         }
 
-        container.innerHTML = items.map(item => `
-            <div class="product-card">
-                <a href="${item.url}" target="_blank" rel="noopener">
-                    ${item.image_url ? `<img class="product-card-img" src="${item.image_url}" alt="" loading="lazy" onerror="this.style.display='none'">` : ""}
-                    <div class="product-card-body">
-                        <div class="product-card-name">${escapeHtml(item.name)}</div>
-                        <div class="product-card-price">${escapeHtml(item.price || "価格不明")}</div>
-                        <div class="product-card-meta">
-                            <span class="category-badge category-${item.category || 'hobby'}">${escapeHtml(item.category_name || 'ホビー')}</span>
-                            <span class="product-card-time">${item.minutes_to_sell}分で売り切れ</span>
-                        </div>
-                    </div>
-                </a>
-            </div>
-        `).join("");
+        container.innerHTML = items.map(renderProductCard).join("");
 
     } catch (e) {
         container.innerHTML = '<div class="empty-state">読み込みエラー</div>';
@@ -218,11 +237,64 @@ async function loadFastSellers() {
     }
 }
 
+function fastSellersUrl(cursor) {
+    let url = `/api/fast-sellers?days=${currentDays}&limit=100`;
+    if (currentCategory) url += `&category=${currentCategory}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return url;
+}
+
+async function loadMoreFastSellers() {
+    if (!fastSellerCursor) return;
+    try {
+        const r = await fetch(fastSellersUrl(fastSellerCursor));
+        const items = await r.json();
+        fastSellerCursor = r.headers.get("X-Next-Cursor");
+        renderLoadMore("fastSellerMore", fastSellerCursor, "loadMoreFastSellers()");
+        document.getElementById("fastSellerList").insertAdjacentHTML("beforeend", items.map(renderProductCard).join(""));
+    } catch (e) {
+        console.error("FastSellers error:", e);
+    }
+}
+
+function renderProductCard(item) {
+    return `
+        <div class="product-card" data-minutes="${item.minutes_to_sell}">
+            <a href="${item.url}" target="_blank" rel="noopener">
+                ${item.image_url ? `<img class="product-card-img" src="${item.image_url}" alt="" loading="lazy" onerror="this.style.display='none'">` : ""}
+                <div class="product-card-body">
+                    <div class="product-card-name">${escapeHtml(item.name)}</div>
+                    <div class="product-card-price">${escapeHtml(item.price || "価格不明")}</div>
+                    <div class="product-card-meta">
+                        <span class="category-badge category-${item.category || 'hobby'}">${escapeHtml(item.category_name || 'ホビー')}</span>
+                        <span class="product-card-time">${item.minutes_to_sell}分で売り切れ</span>
+                    </div>
+                </div>
+            </a>
+        </div>
+    `;
+}
+
 function changeDays(days) {
     currentDays = days;
     loadFastSellers();
 }
 
+// 監視カテゴリから絞り込みボタンを作る（「すべて」は固定）
+async function loadCategories() {
+    try {
+        const res = await fetch("/api/categories");
+        const cats = await res.json();
+        const container = document.getElementById("catFilters");
+        container.querySelectorAll(".cat-filter[data-cat]:not([data-cat=''])").forEach(b => b.remove());
+        container.insertAdjacentHTML("beforeend", cats.map(c => `
+            <button class="cat-filter${c.key === currentCategory ? " active" : ""}" data-cat="${escapeHtml(c.key)}"
+                onclick="changeCategory(this.dataset.cat)">${escapeHtml(c.name)}</button>`).join(""));
+    } catch (e) {
+        console.error("Categories error:", e);
+    }
+}
+
 function changeCategory(cat) {
     currentCategory = cat;
     document.querySelectorAll(".cat-filter").forEach(b => b.classList.remove("active"));
@@ -233,54 +305,117 @@ function changeCategory(cat) {
 // ========== 手動スキャン/チェック ==========
 
 async function runScan() {
-    const btn = event.target;
-    btn.disabled = true;
-    btn.textContent = "スキャン中...";
+    await runJob(event.target, "/api/scan", "スキャン", "手動スキャン", () => loadStats());
+}
 
-    try {
-        await fetch("/api/scan", { method: "POST" });
+async function runCheck() {
+    await runJob(event.target, "/api/check", "チェック", "手動チェック", () => {
         loadStats();
-    } catch (e) {
-        console.error("Scan error:", e);
-    } finally {
-        btn.disabled = false;
-        btn.textContent = "手動スキャン";
-    }
+        loadKeywords();
+    });
 }
 
-async function runCheck() {
-    const btn = event.target;
+// ジョブを起動し、終わるまで進捗をボタンに表示する（実行中なら同じジョブに合流）
+async function runJob(btn, url, label, idleText, onDone) {
     btn.disabled = true;
-    btn.textContent = "チェック中...";
+    btn.textContent = `${label}中...`;
 
     try {
-        await fetch("/api/check", { method: "POST" });
-        loadStats();
-        loadKeywords();
+        let job = await (await fetch(url, { method: "POST" })).json();
+        while (job.status === "queued" || job.status === "running") {
+            btn.textContent = jobProgressText(label, job);
+            await new Promise(r => setTimeout(r, JOB_POLL_MS));
+            const res = await fetch(`/api/jobs/${job.id}`);
+            if (!res.ok) break;
+            job = await res.json();
+        }
+        if (job.status === "failed") console.error(`${label} error:`, job.error);
+        onDone();
     } catch (e) {
-        console.error("Check error:", e);
+        console.error(`${label} error:`, e);
     } finally {
         btn.disabled = false;
-        btn.textContent = "手動チェック";
+        btn.textContent = idleText;
     }
 }
 
+function jobProgressText(label, job) {
+    if (job.total == null) return `${label}中...`;
+    const eta = job.eta_seconds != null ? ` 残り${Math.ceil(job.eta_seconds)}秒` : "";
+    return `${label}中 ${job.done}/${job.total}${eta}`;
+}
+
 // ========== ユーティリティ ==========
 
+// 続きがあれば「もっと見る」ボタンを出す
+function renderLoadMore(id, cursor, onclick) {
+    document.getElementById(id).innerHTML = cursor
+        ? `<button class="btn btn-small" onclick="${onclick}">もっと見る</button>`
+        : "";
+}
+
 function escapeHtml(str) {
     if (!str) return "";
     return str.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;");
 }
 
+// ========== プッシュ通知（SSE） ==========
+
+function subscribeEvents() {
+    if (!window.EventSource) return false;
+
+    const source = new EventSource("/api/events");
+    // 再接続時は切断中の取りこぼし分をまとめて取り直す
+    let connected = false;
+    source.onopen = () => {
+        if (connected) {
+            loadStats();
+            loadKeywords();
+        }
+        connected = true;
+    };
+    source.addEventListener("stats", e => applyStats(JSON.parse(e.data)));
+    source.addEventListener("keyword", e => prependKeyword(JSON.parse(e.data)));
+    source.addEventListener("fast_seller", e => insertFastSeller(JSON.parse(e.data)));
+    return true;
+}
+
+function prependKeyword(k) {
+    if (keywords.some(existing => existing.id === k.id)) return;
+    keywords.unshift(k);
+    const container = document.getElementById("keywordList");
+    if (keywords.length === 1) container.innerHTML = "";
+    container.insertAdjacentHTML("afterbegin", renderKeywordRow(k));
+}
+
+// 表示中の即売れ一覧に、売れるまでの分数順を保って差し込む
+function insertFastSeller(item) {
+    if (document.getElementById("sellersTab").style.display === "none") return;
+    if (currentCategory && item.category !== currentCategory) return;
+
+    const container = document.getElementById("fastSellerList");
+    if (!container.querySelector(".product-card")) container.innerHTML = "";
+    const next = Array.from(container.querySelectorAll(".product-card"))
+        .find(card => Number(card.dataset.minutes) > item.minutes_to_sell);
+    if (next) {
+        next.insertAdjacentHTML("beforebegin", renderProductCard(item));
+    } else {
+        container.insertAdjacentHTML("beforeend", renderProductCard(item));
+    }
+}
+
 // ========== 初期化 ==========
 
 document.addEventListener("DOMContentLoaded", () => {
     loadStats();
     loadKeywords();
-
-    // 1分ごとに自動更新
-    setInterval(() => {
-        loadStats();
-        loadKeywords();
-    }, 60000);
+    loadCategories();
+
+    // SSEが使えないブラウザだけ1分ごとのポーリングで更新
+    if (!subscribeEvents()) {
+        setInterval(() => {
+            loadStats();
+            loadKeywords();
+        }, 60000);
+    }
 });